@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, jsonify
 from google.cloud import bigquery
+from bigquery_metrics_service import instrument_bigquery_client
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
@@ -33,7 +34,7 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 
 # Initialize BigQuery client
 try:
-    bq_client = bigquery.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT'))
+    bq_client = instrument_bigquery_client(bigquery.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT')))
 except Exception as e:
     print(f"Warning: Could not initialize BigQuery client: {e}")
     bq_client = None
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, stream_with_context
 import os
 from dotenv import load_dotenv
 import pandas as pd
@@ -11,18 +11,31 @@ import uuid
 from PIL import Image
 from io import BytesIO
 from functools import lru_cache, wraps
+from collections import OrderedDict
+import threading
 import time
 from epa_service import EPAAirQualityService
 from epa_aqs_service import EPAAQSService
 from location_service_comprehensive import ComprehensiveLocationService
 from google_weather_service import GoogleWeatherService
 from google_pollen_service import GooglePollenService
+from report_store_service import CommunityReportStore
+from report_export_service import STREAMING_FORMATS, DEFAULT_PAGE_SIZE, iter_row_batches, stream_export
+from export_job_service import ExportJobManager, EXPORT_JOB_FORMATS, PDF_MAX_ROWS
+from epa_pm25_cache_service import get_epa_cache
+from report_vector_index_service import get_report_vector_index
+from report_dedup_service import get_report_deduplicator
+from bigquery_metrics_service import instrument_bigquery_client, load_byte_caps_from_env, query_metrics
+from model_routing_service import generative_model, route_metrics as model_route_metrics
 from google.cloud import storage, bigquery, texttospeech, translate_v2 as translate
 import google.generativeai as genai
 import base64
 import firebase_admin
 from firebase_admin import credentials, auth
 
+# Load environment variables (before the agent package is imported: agents pick their models at import)
+load_dotenv()
+
 # PSA Video Integration
 try:
     from multi_tool_agent_bquery_tools.async_video_manager import VideoGenerationManager
@@ -31,9 +44,6 @@ except ImportError as e:
     print(f"[INFO] PSA Video features not available: {e}")
     PSA_VIDEO_AVAILABLE = False
 
-# Load environment variables
-load_dotenv()
-
 # Initialize Firebase Admin SDK
 FIREBASE_AVAILABLE = False
 try:
@@ -123,17 +133,46 @@ except Exception as e:
 
 # Initialize BigQuery client
 try:
-    bq_client = bigquery.Client(project=GCP_PROJECT_ID)
+    bq_client = instrument_bigquery_client(bigquery.Client(project=GCP_PROJECT_ID))
+    load_byte_caps_from_env()
     print(f"[OK] BigQuery client initialized for project: {GCP_PROJECT_ID}")
 except Exception as e:
     print(f"[WARNING] BigQuery initialization failed: {e}")
     bq_client = None
 
+# Initialize community report store (latest-version table). Compaction (DDL + MERGE) runs in
+# one place only: Cloud Scheduler calling /api/officials/compact-reports, or the single
+# instance started with REPORT_COMPACTION_ENABLED=true; every other instance only reads.
+report_store = None
+if os.getenv('BIGQUERY_DATASET') and os.getenv('BIGQUERY_TABLE_REPORTS'):
+    report_store = CommunityReportStore(
+        bq_client,
+        os.getenv('GOOGLE_CLOUD_PROJECT', GCP_PROJECT_ID),
+        os.getenv('BIGQUERY_DATASET'),
+        os.getenv('BIGQUERY_TABLE_REPORTS')
+    )
+    if bq_client and os.getenv('REPORT_COMPACTION_ENABLED', 'false').lower() == 'true':
+        if report_store.ensure_current_table():
+            compaction_interval = int(os.getenv('REPORT_COMPACTION_INTERVAL', '900'))
+            if compaction_interval > 0:
+                report_store.start_periodic_compaction(compaction_interval)
+    elif bq_client:
+        report_store.attach()
+
+# Initialize export job manager (async PDF/XLSX exports on a bounded worker pool)
+EXPORT_SYNC_TIMEOUT = int(os.getenv('EXPORT_SYNC_TIMEOUT', '240'))  # GET /api/export-reports wait before 202
+export_job_manager = ExportJobManager(
+    max_workers=int(os.getenv('EXPORT_JOB_WORKERS', '2')),
+    storage_dir=os.path.join('data', 'exports'),
+    bucket=bucket if GCS_AVAILABLE and os.getenv('EXPORT_STORAGE', 'gcs') == 'gcs' else None,
+    artifact_ttl=int(os.getenv('EXPORT_ARTIFACT_TTL', '3600'))
+)
+
 # Initialize Gemini AI model
 try:
     if GEMINI_API_KEY:
-        model = genai.GenerativeModel('gemini-2.5-pro')
-        print("[OK] Gemini AI model initialized")
+        model = generative_model('chat_fallback')
+        print(f"[OK] Gemini AI model initialized ({model.model_name})")
     else:
         model = None
         print("[WARNING] No Gemini API key, AI features will be limited")
@@ -199,6 +238,16 @@ try:
     print("[IMPORT] call_agent imported successfully")
     from multi_tool_agent_bquery_tools.agent import call_agent_stream as call_adk_agent_stream
     print("[IMPORT] call_agent_stream imported successfully")
+    from multi_tool_agent_bquery_tools.agent_runtime import stream_metrics as agent_stream_metrics
+    from multi_tool_agent_bquery_tools.agent_runtime import setup_metrics as agent_setup_metrics
+    from multi_tool_agent_bquery_tools.tool_cache import tool_cache_stats, invalidate_tool_cache
+    from multi_tool_agent_bquery_tools.embedding_cache import embedding_cache_stats
+    from multi_tool_agent_bquery_tools.tools.semantic_query_tool import search_reports as search_community_reports
+    from multi_tool_agent_bquery_tools.tools.hotspot_tool import fetch_hotspots
+    from multi_tool_agent_bquery_tools.agent import response_cache as agent_response_cache
+    from multi_tool_agent_bquery_tools.agent import session_manager as agent_session_manager
+    from multi_tool_agent_bquery_tools.agent import history_compactor as agent_history_compactor
+    from multi_tool_agent_bquery_tools.agent import agent_tracer
     ADK_AGENT_AVAILABLE = True
     print("[OK] ADK Agent loaded successfully!")
 except Exception as e:
@@ -208,6 +257,14 @@ except Exception as e:
     ADK_AGENT_AVAILABLE = False
     call_adk_agent = None
     call_adk_agent_stream = None
+    agent_stream_metrics = None
+    agent_setup_metrics = None
+    tool_cache_stats = invalidate_tool_cache = None
+    embedding_cache_stats = None
+    search_community_reports = fetch_hotspots = None
+    agent_response_cache = None
+    agent_session_manager = agent_history_compactor = None
+    agent_tracer = None
 
 # ===== FILE UPLOAD & AI ANALYSIS HELPERS =====
 
@@ -267,7 +324,7 @@ def analyze_text_with_gemini(description, severity, timeframe, report_type):
         return None
     
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')  # Updated model name
+        model = generative_model('report_text_analysis')
         
         prompt = f"""You are an AI assistant helping public health officials analyze environmental and health reports.
 
@@ -342,7 +399,7 @@ def analyze_attachments_with_gemini(attachment_urls):
         print(f"[AI] Image loaded: {image.size} pixels, format: {image.format}")
         
         # Use Gemini Vision to analyze the image
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = generative_model('report_image_analysis')
         
         prompt = """You are an environmental and public health expert analyzing a submitted image.
 
@@ -392,6 +449,9 @@ def assign_auto_status(ai_tags, ai_confidence):
 # ===== END FILE UPLOAD & AI HELPERS =====
 
 
+# Last day covered by the public EPA historical PM2.5 dataset
+EPA_HISTORICAL_CUTOFF = datetime(2021, 11, 8).date()
+
 class AirQualityAgent:
     """Google SDK Agent for Air Quality Analysis with BigQuery + Gemini AI"""
     
@@ -401,6 +461,32 @@ class AirQualityAgent:
     
     def query_air_quality_data(self, state=None, days=7):
         """Query air quality data from public BigQuery EPA dataset"""
+        # The historical dataset is frozen - answer from the local Parquet copy when it has the data
+        epa_cache = get_epa_cache()
+        if epa_cache:
+            try:
+                rows = epa_cache.query(
+                    state=state,
+                    start_date=EPA_HISTORICAL_CUTOFF - timedelta(days=days),
+                    require_aqi=True,
+                    limit=1000
+                )
+                if rows == []:
+                    print("[EPA CACHE] No data found, using demo data")
+                    return self._generate_demo_data(state, days)
+                if rows:
+                    return [{
+                        'date': row['date_local'],
+                        'state_name': row['state_name'],
+                        'county_name': row['county_name'],
+                        'aqi': int(row['aqi']),
+                        'parameter_name': row['parameter_name'],
+                        'site_name': row['local_site_name'],
+                        'pm25_mean': row['arithmetic_mean']
+                    } for row in rows]
+            except Exception as e:
+                print(f"[EPA CACHE] Query failed, using BigQuery: {e}")
+        
         if not self.bq_client:
             print("[BQ] No BigQuery client, using demo data")
             return self._generate_demo_data(state, days)
@@ -1206,6 +1292,13 @@ def health_recommendations():
             'error': str(e)
         }), 500
 
+def get_chat_client_id():
+    """Stable per-browser id used to key ADK agent sessions (only from the signed session cookie,
+    never from the request body, so one client cannot pick up another's conversation)"""
+    if 'chat_client_id' not in session:
+        session['chat_client_id'] = uuid.uuid4().hex
+    return session['chat_client_id']
+
 @app.route('/api/agent-chat', methods=['POST'])
 def agent_chat():
     """API endpoint for ADK agent chat with fallback to Gemini AI"""
@@ -1348,12 +1441,8 @@ def agent_chat():
         if ADK_AGENT_AVAILABLE and model:
             try:
                 print(f"[AGENT-CHAT] Using ADK agent for question: {question}")
-                # Enhance question with location context if not already mentioned
-                enhanced_question = question
-                if location_context and location_context.lower() not in question.lower():
-                    enhanced_question = f"For {location_context}: {question}"
-                
-                print(f"[AGENT-CHAT] Enhanced question: {enhanced_question}")
+                # Location reaches the agent through session state (global instruction), so the
+                # question is sent as typed and location-independent questions can share cached answers
                 
                 # Prepare location context for ADK agent
                 location_context_dict = None
@@ -1367,10 +1456,11 @@ def agent_chat():
                 
                 # Call ADK agent with context and persona
                 response = call_adk_agent(
-                    enhanced_question, 
+                    question, 
                     location_context=location_context_dict, 
                     time_frame=time_frame,
-                    persona=persona_type if persona_type else "Community Resident"
+                    persona=persona_type if persona_type else "Community Resident",
+                    client_id=get_chat_client_id()
                 )
                 print(f"[AGENT-CHAT] ADK response received: {response[:100]}...")
                 
@@ -1552,6 +1642,9 @@ Question: {question}"""
         }), 500
 
 
+# Seconds without agent events before an SSE keep-alive comment is sent
+AGENT_STREAM_HEARTBEAT = float(os.getenv('AGENT_STREAM_HEARTBEAT', '10'))
+
 @app.route('/api/agent-chat-stream', methods=['POST'])
 def agent_chat_stream():
     """API endpoint for streaming ADK agent events in real-time"""
@@ -1575,15 +1668,24 @@ def agent_chat_stream():
                 'error': 'No question provided'
             }), 400
         
+        # Resolved here: the Flask session is not available inside the streaming generator
+        client_id = get_chat_client_id()
+        
         def generate():
             """Generator function for Server-Sent Events"""
             try:
-                # Stream events from the agent
+                # Stream events (token deltas as they are generated) from the agent
                 for event_data in call_adk_agent_stream(
                     query=question,
                     location_context=location_context,
-                    persona=persona_type
+                    persona=persona_type,
+                    client_id=client_id,
+                    heartbeat=AGENT_STREAM_HEARTBEAT
                 ):
+                    if event_data is None:
+                        # Keep proxies/load balancers from closing the connection during long tool calls
+                        yield ": heartbeat\n\n"
+                        continue
                     # Format as Server-Sent Event
                     yield f"data: {json.dumps(event_data)}\n\n"
             except Exception as e:
@@ -1832,55 +1934,124 @@ def officials_dashboard():
     """Public Health Officials dashboard - requires authentication"""
     return render_template('officials_dashboard.html')
 
+# ===== COMMUNITY REPORTS QUERY HELPERS =====
+
+# Request arg -> BigQuery column for the equality filters shared by the
+# community reports endpoints
+REPORT_FILTER_COLUMNS = [
+    ('state', 'state'),
+    ('city', 'city'),
+    ('county', 'county'),
+    ('zipcode', 'zip_code'),
+    ('report_type', 'report_type'),
+    ('severity', 'severity'),
+    ('status', 'status'),
+    ('timeframe', 'timeframe'),
+]
+
+# Columns returned by /api/community-reports
+COMMUNITY_REPORT_COLUMNS = [
+    'report_id', 'report_type', 'timestamp', 'address', 'zip_code', 'city', 'state',
+    'county', 'severity', 'specific_type', 'description', 'people_affected', 'timeframe',
+    'contact_name', 'contact_email', 'contact_phone', 'is_anonymous', 'status', 'notes',
+    'latitude', 'longitude', 'ai_overall_summary', 'ai_media_summary', 'ai_tags',
+    'ai_confidence', 'ai_analyzed_at', 'attachment_urls', 'reviewed_by', 'reviewed_at',
+    'exclude_from_analysis', 'exclusion_reason', 'manual_tags', 'media_urls',
+]
+
+# First page of /api/community-reports per filter set (cursor pages are not cached)
+REPORTS_PAGE_CACHE = OrderedDict()  # cache_key -> (response, cached_at), least recently used first
+REPORTS_PAGE_CACHE_DURATION = 60  # seconds - short, and cleared on submit/update
+# Filter values are free-form, so the number of keys is bounded by LRU eviction
+REPORTS_PAGE_CACHE_MAX_ENTRIES = int(os.getenv('REPORTS_PAGE_CACHE_MAX_ENTRIES', '256'))
+REPORTS_PAGE_CACHE_LOCK = threading.Lock()
+
+def build_report_filters(args):
+    """Build parameterized WHERE conditions and query parameters from request filters"""
+    conditions = ""
+    query_params = []
+    for arg_name, column in REPORT_FILTER_COLUMNS:
+        value = args.get(arg_name, '')
+        if value:
+            conditions += f" AND {column} = @{arg_name}"
+            query_params.append(bigquery.ScalarQueryParameter(arg_name, "STRING", value))
+    
+    start_date = args.get('start_date', '')
+    end_date = args.get('end_date', '')
+    if start_date:
+        conditions += " AND timestamp >= TIMESTAMP(@start_date)"
+        query_params.append(bigquery.ScalarQueryParameter("start_date", "STRING", start_date))
+    if end_date:
+        conditions += " AND timestamp <= TIMESTAMP(@end_date)"
+        query_params.append(bigquery.ScalarQueryParameter("end_date", "STRING", end_date))
+    
+    return conditions, query_params
+
+def encode_report_cursor(timestamp, report_id):
+    """Encode the (timestamp, report_id) keyset position as an opaque URL-safe token"""
+    payload = json.dumps({'ts': timestamp.isoformat(), 'id': report_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_report_cursor(cursor):
+    """Decode a cursor token back into (timestamp ISO string, report_id)"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    return payload['ts'], payload['id']
+
+def get_cached_reports_page(cache_key):
+    """Return a cached first-page response if still fresh"""
+    with REPORTS_PAGE_CACHE_LOCK:
+        if cache_key in REPORTS_PAGE_CACHE:
+            cached_data, timestamp = REPORTS_PAGE_CACHE[cache_key]
+            if time.time() - timestamp < REPORTS_PAGE_CACHE_DURATION:
+                REPORTS_PAGE_CACHE.move_to_end(cache_key)
+                return cached_data
+            del REPORTS_PAGE_CACHE[cache_key]
+    return None
+
+def cache_reports_page(cache_key, response):
+    """Cache a first-page response, evicting the least recently used pages past the size cap"""
+    with REPORTS_PAGE_CACHE_LOCK:
+        REPORTS_PAGE_CACHE[cache_key] = (response, time.time())
+        REPORTS_PAGE_CACHE.move_to_end(cache_key)
+        while len(REPORTS_PAGE_CACHE) > REPORTS_PAGE_CACHE_MAX_ENTRIES:
+            REPORTS_PAGE_CACHE.popitem(last=False)
+
+def invalidate_report_caches():
+    """Drop cached report pages and reusable export files after a report is submitted or updated"""
+    with REPORTS_PAGE_CACHE_LOCK:
+        cleared = bool(REPORTS_PAGE_CACHE)
+        REPORTS_PAGE_CACHE.clear()
+    if cleared:
+        print("[CACHE] Community reports page cache invalidated")
+    export_job_manager.invalidate()
+
 @app.route('/api/community-reports', methods=['GET'])
 def get_community_reports():
-    """API endpoint to fetch community reports from BigQuery with filters"""
+    """API endpoint to fetch community reports from BigQuery with filters.
+
+    Pages with a keyset cursor on (timestamp, report_id): pass the `next_cursor`
+    from one response as `cursor` to fetch the following page. `offset` is still
+    accepted for older clients.
+    """
     from google.cloud import bigquery
     
     try:
         # Get filter parameters
         state = request.args.get('state', '')
         city = request.args.get('city', '')
-        county = request.args.get('county', '')
         zipcode = request.args.get('zipcode', '')
-        report_type = request.args.get('report_type', '')
-        severity = request.args.get('severity', '')
-        status = request.args.get('status', '')
-        start_date = request.args.get('start_date', '')
-        end_date = request.args.get('end_date', '')
-        timeframe = request.args.get('timeframe', '')
         limit = int(request.args.get('limit', 1000))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor', '')
         
         # Build BigQuery query
         project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
         dataset_id = os.getenv('BIGQUERY_DATASET')
         table_id = os.getenv('BIGQUERY_TABLE_REPORTS')
 
-        # ===== NEW: Build reusable filter string =====
-        filter_conditions = ""
-        if state:
-            filter_conditions += f" AND state = '{state}'"
-        if city:
-            filter_conditions += f" AND city = '{city}'"
-        if county:
-            filter_conditions += f" AND county = '{county}'"
-        if zipcode:
-            filter_conditions += f" AND zip_code = '{zipcode}'"
-        if report_type:
-            filter_conditions += f" AND report_type = '{report_type}'"
-        if severity:
-            filter_conditions += f" AND severity = '{severity}'"
-        if status:
-            filter_conditions += f" AND status = '{status}'"
-        if start_date:
-            filter_conditions += f" AND timestamp >= TIMESTAMP('{start_date}')"
-        if end_date:
-            filter_conditions += f" AND timestamp <= TIMESTAMP('{end_date}')"
-        if timeframe:
-            filter_conditions += f" AND timeframe = '{timeframe}'"
-        # ===== END NEW =====
-
+        # Reusable parameterized filter string (shared by page and stats queries)
+        filter_conditions, filter_params = build_report_filters(request.args)
         
         if not all([project_id, dataset_id, table_id]):
             print("[ERROR] Missing BigQuery configuration in environment variables")
@@ -1889,83 +2060,63 @@ def get_community_reports():
                 'error': 'BigQuery configuration not found'
             }), 500
         
+        # First page (no cursor, no offset) is cacheable per filter set
+        is_first_page = not cursor and offset == 0
+        cache_key = None
+        if is_first_page:
+            filter_key = tuple(sorted(
+                (k, v) for k, v in request.args.items() if k not in ('limit', 'offset', 'cursor') and v
+            ))
+            cache_key = (filter_key, limit)
+            cached_response = get_cached_reports_page(cache_key)
+            if cached_response is not None:
+                print(f"[CACHE HIT] Returning cached first page of community reports")
+                return jsonify(cached_response)
+        
+        # Latest version of each report: compacted table + recent delta when available
+        store = report_store or CommunityReportStore(None, project_id, dataset_id, table_id)
+        store.refresh()
+        store_params = store.query_parameters()
+        
+        query_params = list(filter_params) + store_params
+        cursor_condition = ""
+        if cursor:
+            try:
+                cursor_ts, cursor_id = decode_report_cursor(cursor)
+            except Exception:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+            cursor_condition = """
+            AND (timestamp < TIMESTAMP(@cursor_ts)
+                 OR (timestamp = TIMESTAMP(@cursor_ts) AND report_id < @cursor_id))"""
+            query_params.append(bigquery.ScalarQueryParameter("cursor_ts", "STRING", cursor_ts))
+            query_params.append(bigquery.ScalarQueryParameter("cursor_id", "STRING", cursor_id))
+        
         query = f"""
-        WITH LatestReports AS (
-            SELECT 
-                report_id,
-                report_type,
-                timestamp,
-                address,
-                zip_code,
-                city,
-                state,
-                county,
-                severity,
-                specific_type,
-                description,
-                people_affected,
-                timeframe,
-                contact_name,
-                contact_email,
-                contact_phone,
-                is_anonymous,
-                status,
-                notes,
-                latitude,
-                longitude,
-                ai_overall_summary,
-                ai_media_summary,
-                ai_tags,
-                ai_confidence,
-                ai_analyzed_at,
-                attachment_urls,
-                reviewed_by,
-                reviewed_at,
-                exclude_from_analysis,
-                exclusion_reason,
-                manual_tags,
-                media_urls,
-                ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) as rn
-            FROM `{project_id}.{dataset_id}.{table_id}`
-        )
-        SELECT * EXCEPT(rn)
+        WITH {store.latest_reports_cte(COMMUNITY_REPORT_COLUMNS)}
+        SELECT *
         FROM LatestReports
-        WHERE rn = 1 {filter_conditions} # <-- USE THE FILTER STRING
+        WHERE 1=1 {filter_conditions} {cursor_condition}
+        ORDER BY timestamp DESC, report_id DESC
         """
         
-        # Add filter conditions
-        if state:
-            query += f" AND state = '{state}'"
-        if city:
-            query += f" AND city = '{city}'"
-        if county:
-            query += f" AND county = '{county}'"
-        if zipcode:
-            query += f" AND zip_code = '{zipcode}'"
-        if report_type:
-            query += f" AND report_type = '{report_type}'"
-        if severity:
-            query += f" AND severity = '{severity}'"
-        if status:
-            query += f" AND status = '{status}'"
-        if start_date:
-            query += f" AND timestamp >= TIMESTAMP('{start_date}')"
-        if end_date:
-            query += f" AND timestamp <= TIMESTAMP('{end_date}')"
-        if timeframe:
-            query += f" AND timeframe = '{timeframe}'"
-        
-        # Add ordering and pagination
-        query += " ORDER BY timestamp DESC"
-        query += f" LIMIT {limit} OFFSET {offset}"
-        
-        print(f"[QUERY] Fetching community reports (limit={limit}, offset={offset})")
+        # Fetch one extra row to know whether another page exists
+        query += f" LIMIT {limit + 1}"
+        if offset and not cursor:
+            query += f" OFFSET {offset}"
+        
+        print(f"[QUERY] Fetching community reports (limit={limit}, offset={offset}, cursor={'yes' if cursor else 'no'})")
         print(f"[QUERY] Filters: state={state}, city={city}, zipcode={zipcode}")
         
         # Execute query
-        client = bigquery.Client(project=project_id)
-        query_job = client.query(query)
-        results = query_job.result()
+        client = instrument_bigquery_client(bigquery.Client(project=project_id))
+        query_job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_params))
+        results = list(query_job.result())
+        
+        has_more = len(results) > limit
+        results = results[:limit]
+        next_cursor = None
+        if has_more and results:
+            next_cursor = encode_report_cursor(results[-1].timestamp, results[-1].report_id)
         
         # Convert results to list of dictionaries
         reports = []
@@ -2006,55 +2157,68 @@ def get_community_reports():
             }
             reports.append(report)
         
-# Get total count and dashboard statistics
-        stats_query = f"""
-        WITH FilteredData AS (
+        # Dashboard statistics only accompany the first page (or legacy offset
+        # requests); cursor pages reuse the totals the client already has
+        stats = None
+        total_count = None
+        if not cursor:
+            stats_query = f"""
+            WITH {store.latest_reports_cte(COMMUNITY_REPORT_COLUMNS)},
+            FilteredData AS (
+                SELECT
+                    timestamp,
+                    severity,
+                    status
+                FROM LatestReports
+                WHERE 1=1 {filter_conditions} # <-- REUSE THE FILTER STRING
+            )
             SELECT
-                timestamp,
-                severity,
-                status
-            FROM `{project_id}.{dataset_id}.{table_id}`
-            WHERE 1=1 {filter_conditions} # <-- REUSE THE FILTER STRING
-        )
-        SELECT
-            COUNT(*) as total_reports,
-            
-            COUNTIF(timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)) as new_cases_this_week,
-            
-            COUNTIF(timestamp < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY) 
-                    AND timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 14 DAY)) as new_cases_last_week,
-            
-            COUNTIF(status IN ('Pending', 'Under Review', 'Valid - Action Required', 'pending', 'reviewed') 
-                    AND severity IN ('high', 'critical')) as active_high_priority_alerts,
-            
-            COUNTIF(status = 'Pending' OR status = 'pending') as pending_review
+                COUNT(*) as total_reports,
+                
+                COUNTIF(timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)) as new_cases_this_week,
+                
+                COUNTIF(timestamp < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY) 
+                        AND timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 14 DAY)) as new_cases_last_week,
+                
+                COUNTIF(status IN ('Pending', 'Under Review', 'Valid - Action Required', 'pending', 'reviewed') 
+                        AND severity IN ('high', 'critical')) as active_high_priority_alerts,
+                
+                COUNTIF(status = 'Pending' OR status = 'pending') as pending_review
+                
+            FROM FilteredData
+            """
             
-        FROM FilteredData
-        """
-        
-        stats_job = client.query(stats_query)
-        stats_result = list(stats_job.result())[0]
-        
-        # Package stats into a dictionary
-        stats = {
-            'total_reports': stats_result.total_reports,
-            'new_cases_this_week': stats_result.new_cases_this_week,
-            'new_cases_last_week': stats_result.new_cases_last_week,
-            'active_high_priority_alerts': stats_result.active_high_priority_alerts,
-            'pending_review': stats_result.pending_review
-        }
-        total_count = stats['total_reports']
+            stats_job = client.query(stats_query, job_config=bigquery.QueryJobConfig(
+                query_parameters=list(filter_params) + store_params))
+            stats_result = list(stats_job.result())[0]
+            
+            # Package stats into a dictionary
+            stats = {
+                'total_reports': stats_result.total_reports,
+                'new_cases_this_week': stats_result.new_cases_this_week,
+                'new_cases_last_week': stats_result.new_cases_last_week,
+                'active_high_priority_alerts': stats_result.active_high_priority_alerts,
+                'pending_review': stats_result.pending_review
+            }
+            total_count = stats['total_reports']
         
-        print(f"[SUCCESS] Retrieved {len(reports)} reports (total: {total_count})")
+        print(f"[SUCCESS] Retrieved {len(reports)} reports (total: {total_count}, has_more: {has_more})")
         
-        return jsonify({
+        response = {
             'success': True,
             'reports': reports,
-            'stats':stats,
+            'stats': stats,
             'total': total_count,
             'limit': limit,
-            'offset': offset
-        })
+            'offset': offset,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+        
+        if cache_key is not None:
+            cache_reports_page(cache_key, response)
+        
+        return jsonify(response)
         
     except Exception as e:
         print(f"[ERROR] Failed to fetch community reports: {str(e)}")
@@ -2065,60 +2229,249 @@ def get_community_reports():
             'error': str(e)
         }), 500
 
+def build_export_query(args, limit=None):
+    """Build the parameterized export query (latest version of each report, newest first)"""
+    project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+    dataset_id = os.getenv('BIGQUERY_DATASET')
+    table_id = os.getenv('BIGQUERY_TABLE_REPORTS')
+    store = report_store or CommunityReportStore(None, project_id, dataset_id, table_id)
+    store.refresh()
+    
+    filter_conditions, filter_params = build_report_filters(args)
+    query = f"""
+    WITH {store.latest_reports_cte()}
+    SELECT *
+    FROM LatestReports
+    WHERE 1=1 {filter_conditions}
+    ORDER BY timestamp DESC
+    """
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    
+    return query, bigquery.QueryJobConfig(query_parameters=list(filter_params) + store.query_parameters())
+
+def demo_export_rows():
+    """Sample rows used for exports when BigQuery is unavailable"""
+    demo_data = []
+    base_date = datetime.now()
+    
+    for i in range(20):
+        demo_data.append({
+            'id': f'demo-{i+1}',
+            'timestamp': (base_date - timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            'state': 'California',
+            'city': ['Los Angeles', 'San Francisco', 'San Diego'][i % 3],
+            'county': ['Los Angeles County', 'San Francisco County', 'San Diego County'][i % 3],
+            'zip_code': ['90001', '94102', '92101'][i % 3],
+            'report_type': ['Air Quality', 'Water Safety', 'Disease Outbreak'][i % 3],
+            'severity': ['High', 'Medium', 'Low'][i % 3],
+            'status': ['Pending', 'Reviewed', 'Resolved'][i % 3],
+            'description': f'Demo report #{i+1} - This is sample data for testing',
+            'reporter_name': f'Demo User {i+1}',
+            'reporter_email': f'demo{i+1}@example.com',
+            'reporter_phone': '555-0100'
+        })
+    
+    return demo_data
+
+def stream_reports_export(format):
+    """Stream CSV/JSONL exports straight from BigQuery pages - constant memory, no row cap"""
+    batches = None
+    columns = None
+    
+    if bq_client:
+        try:
+            query, job_config = build_export_query(request.args)
+            row_iterator = bq_client.query(query, job_config=job_config).result(page_size=DEFAULT_PAGE_SIZE)
+            columns = [field.name for field in row_iterator.schema]
+            batches = iter_row_batches(row_iterator)
+            print(f"[EXPORT] Streaming {row_iterator.total_rows} records as {format.upper()}")
+        except Exception as bq_error:
+            print(f"[EXPORT] BigQuery error: {bq_error}, using demo data")
+            batches = None
+    
+    if batches is None:
+        print("[EXPORT] Using demo data for export")
+        batches = iter([demo_export_rows()])
+    
+    # Compress on the fly when the client accepts gzip (browsers decompress transparently)
+    gzip_enabled = 'gzip' in request.headers.get('Accept-Encoding', '').lower() \
+        and request.args.get('gzip', 'true').lower() != 'false'
+    
+    filename = f"community_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept-Encoding'
+    }
+    if gzip_enabled:
+        headers['Content-Encoding'] = 'gzip'
+    
+    return app.response_class(
+        stream_export(batches, format, gzip_enabled=gzip_enabled, columns=columns),
+        mimetype=STREAMING_FORMATS[format],
+        headers=headers
+    )
+
+def make_export_fetcher(format, args):
+    """Build the row source for an export job (runs on a worker thread after the request ends)"""
+    args = dict(args)
+    limit = PDF_MAX_ROWS if format == 'pdf' else None
+    
+    def fetch_rows():
+        if bq_client:
+            try:
+                query, job_config = build_export_query(args, limit=limit)
+                row_iterator = bq_client.query(query, job_config=job_config).result(page_size=DEFAULT_PAGE_SIZE)
+                return row_iterator.total_rows, [field.name for field in row_iterator.schema], iter_row_batches(row_iterator)
+            except Exception as bq_error:
+                print(f"[EXPORT] BigQuery error: {bq_error}, using demo data")
+        
+        rows = demo_export_rows()
+        return len(rows), list(rows[0].keys()), iter([rows])
+    
+    return fetch_rows
+
+def export_job_response(job, reused=False):
+    """Public view of an export job with its polling/download URLs"""
+    job_id = job['job_id']
+    response = {
+        'success': job['status'] != 'failed',
+        'job_id': job_id,
+        'format': job['format'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'rows_done': job['rows_done'],
+        'total_rows': job['total_rows'],
+        'error': job['error'],
+        'reused': reused,
+        'status_url': url_for('get_export_job', job_id=job_id),
+        'events_url': url_for('export_job_events', job_id=job_id)
+    }
+    if job['status'] == 'completed':
+        response['download_url'] = url_for('download_export_job', job_id=job_id)
+    return response
+
+@app.route('/api/export-jobs', methods=['POST'])
+def submit_export_job():
+    """Queue a PDF/XLSX export; identical format + filters reuse the existing job"""
+    try:
+        data = request.get_json(silent=True) or {}
+        format = (data.get('format') or request.args.get('format', '')).lower()
+        if format == 'xls':
+            format = 'xlsx'
+        if format not in EXPORT_JOB_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f'Unsupported export job format: {format}'
+            }), 400
+        
+        filters = data.get('filters')
+        if filters is None:
+            filters = {k: v for k, v in request.args.items() if k != 'format'}
+        
+        job, reused = export_job_manager.submit(format, filters, make_export_fetcher(format, filters))
+        return jsonify(export_job_response(job, reused)), 202
+    except Exception as e:
+        print(f"[ERROR] Failed to submit export job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/export-jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Poll an export job's status and progress"""
+    job = export_job_manager.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    return jsonify(export_job_response(job))
+
+@app.route('/api/export-jobs/<job_id>/events', methods=['GET'])
+def export_job_events(job_id):
+    """Stream an export job's progress as Server-Sent Events until it finishes"""
+    if not export_job_manager.get_job(job_id):
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    
+    def generate():
+        for job in export_job_manager.iter_progress(job_id):
+            if job is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield f"data: {json.dumps(export_job_response(job))}\n\n"
+    
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/export-jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Download the finished file of an export job"""
+    job = export_job_manager.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    if job['status'] != 'completed':
+        return jsonify(export_job_response(job)), 409
+    
+    try:
+        artifact = export_job_manager.open_artifact(job)
+    except Exception as e:
+        print(f"[ERROR] Export artifact unavailable for {job_id}: {e}")
+        return jsonify({'success': False, 'error': 'Export file is no longer available'}), 410
+    
+    return send_file(
+        artifact,
+        mimetype=EXPORT_JOB_FORMATS[job['format']],
+        as_attachment=True,
+        download_name=job['filename']
+    )
+
 @app.route('/api/export-reports/<format>', methods=['GET'])
 def export_reports(format):
-    """Export community reports in various formats (CSV, XLS, PDF, PNG)"""
+    """Export community reports in various formats (CSV, JSONL, XLS, PDF, PNG)"""
     import pandas as pd
     from io import BytesIO
     from flask import send_file
     
     try:
-        # Get same filters as regular reports endpoint
-        state = request.args.get('state', '')
-        city = request.args.get('city', '')
-        county = request.args.get('county', '')
-        zipcode = request.args.get('zipcode', '')
-        report_type = request.args.get('report_type', '')
-        severity = request.args.get('severity', '')
-        status = request.args.get('status', '')
-        
         print(f"[EXPORT] Exporting reports as {format.upper()}")
         
+        # CSV and JSONL are streamed as rows arrive instead of built in memory
+        if format in STREAMING_FORMATS:
+            return stream_reports_export(format)
+        
+        # PDF and Excel are rendered by the export job pool (sharing identical jobs) and returned
+        # as a file once done; POST /api/export-jobs is the non-blocking variant with progress
+        if format == 'xls':
+            format = 'xlsx'
+        if format in EXPORT_JOB_FORMATS:
+            job, reused = export_job_manager.submit(format, dict(request.args), make_export_fetcher(format, request.args))
+            job = export_job_manager.wait(job['job_id'], timeout=EXPORT_SYNC_TIMEOUT)
+            if not job:
+                return jsonify({'success': False, 'error': 'Export job not found'}), 500
+            if job['status'] == 'completed':
+                return download_export_job(job['job_id'])
+            if job['status'] == 'failed':
+                return jsonify(export_job_response(job)), 500
+            # Still rendering after EXPORT_SYNC_TIMEOUT: hand the client the job to poll instead
+            return jsonify(export_job_response(job, reused)), 202
+        
         # Try to get data from BigQuery, fallback to demo data
         df = None
         
         if bq_client:
             try:
-                # Build query (same as above but without pagination)
-                project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
-                dataset_id = os.getenv('BIGQUERY_DATASET')
-                table_id = os.getenv('BIGQUERY_TABLE_REPORTS')
-                
-                query = f"""
-                SELECT *
-                FROM `{project_id}.{dataset_id}.{table_id}`
-                WHERE 1=1
-                """
-                
-                if state:
-                    query += f" AND state = '{state}'"
-                if city:
-                    query += f" AND city = '{city}'"
-                if county:
-                    query += f" AND county = '{county}'"
-                if zipcode:
-                    query += f" AND zip_code = '{zipcode}'"
-                if report_type:
-                    query += f" AND report_type = '{report_type}'"
-                if severity:
-                    query += f" AND severity = '{severity}'"
-                if status:
-                    query += f" AND status = '{status}'"
-                
-                query += " ORDER BY timestamp DESC LIMIT 10000"  # Max export limit
+                # Same filters as the regular reports endpoint; the PNG table shows 20 rows
+                query, job_config = build_export_query(request.args, limit=20)
                 
                 # Execute query
-                df = bq_client.query(query).to_dataframe()
+                df = bq_client.query(query, job_config=job_config).to_dataframe()
                 print(f"[EXPORT] Retrieved {len(df)} records from BigQuery")
             except Exception as bq_error:
                 print(f"[EXPORT] BigQuery error: {bq_error}, using demo data")
@@ -2127,28 +2480,7 @@ def export_reports(format):
         # If BigQuery failed or unavailable, use demo data
         if df is None or df.empty:
             print("[EXPORT] Using demo data for export")
-            from datetime import datetime, timedelta
-            demo_data = []
-            base_date = datetime.now()
-            
-            for i in range(20):
-                demo_data.append({
-                    'id': f'demo-{i+1}',
-                    'timestamp': (base_date - timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'),
-                    'state': 'California',
-                    'city': ['Los Angeles', 'San Francisco', 'San Diego'][i % 3],
-                    'county': ['Los Angeles County', 'San Francisco County', 'San Diego County'][i % 3],
-                    'zip_code': ['90001', '94102', '92101'][i % 3],
-                    'report_type': ['Air Quality', 'Water Safety', 'Disease Outbreak'][i % 3],
-                    'severity': ['High', 'Medium', 'Low'][i % 3],
-                    'status': ['Pending', 'Reviewed', 'Resolved'][i % 3],
-                    'description': f'Demo report #{i+1} - This is sample data for testing',
-                    'reporter_name': f'Demo User {i+1}',
-                    'reporter_email': f'demo{i+1}@example.com',
-                    'reporter_phone': '555-0100'
-                })
-            
-            df = pd.DataFrame(demo_data)
+            df = pd.DataFrame(demo_export_rows())
         
         if df.empty:
             return jsonify({
@@ -2169,212 +2501,7 @@ def export_reports(format):
         filename = f"community_reports_{timestamp}"
         
         # Export based on format
-        if format == 'csv':
-            output = BytesIO()
-            df.to_csv(output, index=False, encoding='utf-8')
-            output.seek(0)
-            return send_file(
-                output,
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'{filename}.csv'
-            )
-        
-        elif format == 'xlsx' or format == 'xls':
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Community Reports')
-            output.seek(0)
-            return send_file(
-                output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=f'{filename}.xlsx'
-            )
-        
-        elif format == 'pdf':
-            # For PDF, create a professional formatted report
-            from reportlab.lib.pagesizes import letter, landscape, A4
-            from reportlab.lib import colors
-            from reportlab.lib.units import inch
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.enums import TA_CENTER, TA_LEFT
-            
-            output = BytesIO()
-            # Use A4 landscape for better width
-            doc = SimpleDocTemplate(
-                output, 
-                pagesize=landscape(A4),
-                rightMargin=0.5*inch,
-                leftMargin=0.5*inch,
-                topMargin=0.75*inch,
-                bottomMargin=0.5*inch
-            )
-            elements = []
-            
-            # Create custom styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                textColor=colors.HexColor('#1a3a52'),
-                spaceAfter=12,
-                alignment=TA_CENTER,
-                fontName='Helvetica-Bold'
-            )
-            
-            subtitle_style = ParagraphStyle(
-                'Subtitle',
-                parent=styles['Normal'],
-                fontSize=10,
-                textColor=colors.grey,
-                spaceAfter=20,
-                alignment=TA_CENTER
-            )
-            
-            # Add header
-            title = Paragraph(
-                f"<b>Community Health Reports</b>", 
-                title_style
-            )
-            elements.append(title)
-            
-            # Add metadata
-            report_info = Paragraph(
-                f"Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')} | Total Reports: {len(df)}",
-                subtitle_style
-            )
-            elements.append(report_info)
-            elements.append(Spacer(1, 0.3 * inch))
-            
-            # Select key columns for better readability
-            key_columns = []
-            preferred_cols = ['timestamp', 'state', 'city', 'county', 'zip_code', 
-                            'report_type', 'severity', 'status', 'description']
-            
-            # Only include columns that exist in the dataframe
-            for col in preferred_cols:
-                if col in df.columns:
-                    key_columns.append(col)
-            
-            # If no preferred columns found, use first 8 columns
-            if not key_columns:
-                key_columns = list(df.columns[:8])
-            
-            # Prepare display dataframe - Show ALL rows
-            display_df = df[key_columns]
-            
-            # Prepare table data with better formatting - use Paragraph for text wrapping
-            from reportlab.platypus import Paragraph
-            from reportlab.lib.styles import getSampleStyleSheet
-            styles = getSampleStyleSheet()
-            cell_style = styles['Normal']
-            cell_style.fontSize = 7
-            cell_style.leading = 9
-            
-            table_data = [[col.replace('_', ' ').title() for col in key_columns]]
-            
-            for _, row in display_df.iterrows():
-                row_data = []
-                for col in key_columns:
-                    # Handle array/list columns and null values safely
-                    try:
-                        val = row[col]
-                        if isinstance(val, (list, pd.Series)):
-                            value = str(val) if len(val) > 0 else '-'
-                        elif pd.isna(val):
-                            value = '-'
-                        else:
-                            value = str(val)
-                    except:
-                        value = '-'
-                    
-                    # Use Paragraph for text wrapping instead of truncation
-                    if col == 'description':
-                        # Allow longer descriptions to wrap
-                        cell_value = Paragraph(value[:200], cell_style)
-                    else:
-                        # Other columns can also wrap if needed
-                        cell_value = Paragraph(value[:80], cell_style)
-                    
-                    row_data.append(cell_value)
-                table_data.append(row_data)
-            
-            # Calculate dynamic column widths - make them wider
-            num_cols = len(key_columns)
-            available_width = 10.5  # inches for A4 landscape with margins
-            
-            # Custom widths for specific columns - increased sizes
-            col_widths = []
-            for col in key_columns:
-                if col in ['description']:
-                    col_widths.append(3.0 * inch)  # Wider for descriptions
-                elif col in ['timestamp']:
-                    col_widths.append(1.4 * inch)
-                elif col in ['state', 'city', 'county']:
-                    col_widths.append(1.0 * inch)  # Wider
-                elif col in ['zip_code']:
-                    col_widths.append(0.7 * inch)
-                elif col in ['severity', 'status', 'report_type']:
-                    col_widths.append(0.8 * inch)
-                else:
-                    col_widths.append(1.1 * inch)
-            
-            # Create table with improved styling - allow rows to expand for wrapped text
-            table = Table(table_data, colWidths=col_widths, repeatRows=1)
-            table.setStyle(TableStyle([
-                # Header styling
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 10),
-                
-                # Body styling - with TOP alignment for wrapped text
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 1), (-1, -1), 'TOP'),  # Top align for wrapped text
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('TOPPADDING', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                
-                # Grid and borders
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#10b981')),
-                
-                # Alternating row colors for better readability
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
-            ]))
-            
-            elements.append(table)
-            
-            # Add footer with total count
-            elements.append(Spacer(1, 0.2 * inch))
-            footer_note = Paragraph(
-                f"<i>End of Report - Total {len(df)} reports displayed</i>",
-                subtitle_style
-            )
-            elements.append(footer_note)
-            
-            doc.build(elements)
-            output.seek(0)
-            
-            return send_file(
-                output,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=f'{filename}.pdf'
-            )
-        
-        elif format == 'png':
+        if format == 'png':
             # For PNG, create a matplotlib table image with ALL columns
             import matplotlib.pyplot as plt
             import matplotlib
@@ -2505,7 +2632,7 @@ def generate_alert_summary():
             })
         
         # Generate AI summary using Gemini
-        model = genai.GenerativeModel('gemini-2.5-pro')
+        model = generative_model('alert_summary')
         prompt = f"""You are a public health official. Analyze these recent community health reports and create a concise, actionable public health alert summary.
 
 Recent Reports ({len(reports_summary)} total):
@@ -2865,7 +2992,7 @@ def generate_report_summary():
             return jsonify({'success': False, 'error': 'API key not configured'}), 500
             
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-pro')
+        model = generative_model('executive_summary')
         
         # Create prompt
         prompt = f"""Generate a comprehensive executive summary for a public health dashboard report covering {start_date} to {end_date}. 
@@ -2962,7 +3089,7 @@ def generate_report():
                     api_key = os.getenv('GEMINI_API_KEY')
                     if api_key:
                         genai.configure(api_key=api_key)
-                        model = genai.GenerativeModel('gemini-2.5-pro')
+                        model = generative_model('executive_summary')
                         
                         prompt = f"""Generate a comprehensive executive summary for a public health dashboard report covering {data.get('startDate')} to {data.get('endDate')}. 
 
@@ -3527,6 +3654,23 @@ def submit_report():
                     file.save(filepath)
                     media_urls.append(f"/uploads/{report_id}/{filename}")
         
+        # ===== NEAR-DUPLICATE CHECK =====
+        # Floods of near-identical reports (smoke plume, water main break) share one cluster
+        # and reuse the first report's AI analysis instead of calling Gemini again
+        dedup = None
+        deduplicator = get_report_deduplicator()
+        if deduplicator:
+            try:
+                dedup = deduplicator.assign(report_id, data.get('description', ''), data.get('state'),
+                                            timestamp, data.get('reportType'), data.get('severity'))
+                if dedup['is_duplicate']:
+                    print(f"[DEDUP] Report {report_id} is a near-duplicate of {dedup['duplicate_of']} "
+                          f"(cluster {dedup['cluster_id']}, similarity {dedup['similarity']}, size {dedup['cluster_size']})")
+            except Exception as e:
+                print(f"[DEDUP] Check failed: {e}")
+        # Only full text analyses are reused (the chat agent's report tool shares just a summary)
+        shared_analysis = dedup['enrichment'] if dedup and dedup['enrichment'] and 'tags' in dedup['enrichment'] else None
+
         # ===== AI ANALYSIS =====
         ai_result = None
         ai_media_summary = None
@@ -3536,7 +3680,14 @@ def submit_report():
         auto_status = 'pending'
         
         # Analyze text with Gemini AI
-        if GEMINI_API_KEY:
+        if shared_analysis:
+            ai_result = shared_analysis
+            ai_overall_summary = ai_result.get('summary', '')
+            ai_tags_list = ai_result.get('tags', [])
+            ai_confidence = ai_result.get('confidence', 0.0)
+            auto_status = assign_auto_status(ai_tags_list, ai_confidence)
+            print(f"[AI] Reusing text analysis of cluster {dedup['cluster_id']} (Gemini call skipped)")
+        elif GEMINI_API_KEY:
             try:
                 print(f"[AI] Analyzing report text with Gemini...")
                 ai_result = analyze_text_with_gemini(
@@ -3561,8 +3712,12 @@ def submit_report():
             except Exception as e:
                 print(f"[AI ERROR] Text analysis failed: {e}")
         
-        # Analyze attachments with Gemini Vision
-        if GEMINI_API_KEY and attachment_urls:
+        # Analyze attachments with Gemini Vision (photos differ per report, so reuse is opt-in)
+        if shared_analysis and shared_analysis.get('media_summary') and attachment_urls and \
+                os.getenv('REPORT_DEDUP_SHARE_MEDIA_ANALYSIS', 'false').lower() == 'true':
+            ai_media_summary = shared_analysis['media_summary']
+            print(f"[AI] Reusing media analysis of cluster {dedup['cluster_id']} (Gemini call skipped)")
+        elif GEMINI_API_KEY and attachment_urls:
             try:
                 print(f"[AI] Analyzing {len(attachment_urls)} attachment(s) with Gemini Vision...")
                 ai_media_summary = analyze_attachments_with_gemini(
@@ -3573,6 +3728,9 @@ def submit_report():
             except Exception as e:
                 print(f"[AI ERROR] Media analysis failed: {e}")
         
+        if dedup and ai_result and not shared_analysis:
+            deduplicator.set_enrichment(dedup['cluster_id'], dict(ai_result, media_summary=ai_media_summary))
+
         # Prepare data for BigQuery
         row_data = {
             'report_id': report_id,
@@ -3655,10 +3813,12 @@ def submit_report():
                 
                 if project_id and dataset_id and project_id != 'your-actual-project-id':
                     # Initialize BigQuery client
-                    client = bigquery.Client(project=project_id)
+                    client = instrument_bigquery_client(bigquery.Client(project=project_id))
                     table_ref = f"{project_id}.{dataset_id}.{table_id}"
                     
                     # Insert row
+                    if report_store:
+                        report_store.stamp(row_data)
                     errors = client.insert_rows_json(table_ref, [row_data])
                     
                     if errors:
@@ -3678,6 +3838,7 @@ def submit_report():
                 save_to_csv(row_data)
         
         print(f"[REPORT] New report saved: {report_id}")
+        invalidate_report_caches()
         print(f"[REPORT] Type: {row_data['report_type']}, Severity: {row_data['severity']}")
         print(f"[REPORT] Location: {row_data['city']}, {row_data['state']} {row_data['zip_code']}")
         print(f"[REPORT] Media files: {media_count}")
@@ -3692,6 +3853,7 @@ def submit_report():
             'report_id': report_id,
             'message': 'Report submitted successfully',
             'attachment_urls': attachment_urls,
+            'duplicate': {k: v for k, v in dedup.items() if k != 'enrichment'} if dedup else None,
             'ai_analysis': {
                 'summary': ai_overall_summary,
                 'tags': ai_tags_list,
@@ -3750,7 +3912,7 @@ def update_report():
         if not project_id or not dataset_id or project_id == 'your-actual-project-id':
             return jsonify({'success': False, 'error': 'BigQuery not configured'}), 500
         
-        client = bigquery.Client(project=project_id)
+        client = instrument_bigquery_client(bigquery.Client(project=project_id))
         table_ref = f"{project_id}.{dataset_id}.{table_id}"
         
         # INSERT a new row with updated data instead of UPDATE (to avoid streaming buffer issue)
@@ -3810,7 +3972,11 @@ def update_report():
                 # Keep None as is
                 pass
         
-        # Insert the updated row
+        # Insert the updated row (with its own insertion time, not the previous version's)
+        if report_store:
+            report_store.stamp(current_row)
+        elif 'inserted_at' in current_row:
+            current_row['inserted_at'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
         errors = client.insert_rows_json(table_ref, [current_row])
         
         if errors:
@@ -3818,6 +3984,7 @@ def update_report():
             return jsonify({'success': False, 'error': f'Failed to update: {errors}'}), 500
         
         print(f"[UPDATE SUCCESS] Report {report_id} updated via insert")
+        invalidate_report_caches()
         print(f"[UPDATE] Status: {status}, Reviewed by: {reviewed_by}, Excluded: {exclude_from_analysis}")
         
         return jsonify({
@@ -3835,6 +4002,18 @@ def update_report():
             'error': str(e)
         }), 500
 
+@app.route('/api/officials/compact-reports', methods=['POST'])
+def compact_reports():
+    """Merge new report versions into the current reports table (for Cloud Scheduler or manual runs)"""
+    if not report_store or not bq_client:
+        return jsonify({'success': False, 'error': 'BigQuery not configured'}), 500
+    
+    result = report_store.compact()
+    if result.get('error'):
+        return jsonify({'success': False, 'error': result['error'], 'compaction': result}), 500
+    
+    return jsonify({'success': True, 'compaction': result})
+
 def save_to_csv(row_data):
     """Fallback: Save report to CSV file"""
     import csv
@@ -5408,6 +5587,180 @@ def health_check():
         }
     }), 200
 
+@app.route('/api/metrics/bigquery', methods=['GET'])
+def bigquery_metrics():
+    """Rolling BigQuery cost/latency aggregates per endpoint or tool"""
+    return jsonify({'success': True, 'metrics': query_metrics.snapshot()})
+
+@app.route('/api/metrics/agent-stream', methods=['GET'])
+def agent_stream_metrics_endpoint():
+    """Time-to-first-token and tokens/sec of recent streamed agent replies, plus per-request setup time"""
+    if not agent_stream_metrics:
+        return jsonify({'success': False, 'error': 'ADK Agent not available'}), 503
+    return jsonify({
+        'success': True,
+        'metrics': agent_stream_metrics.snapshot(),
+        'setup': agent_setup_metrics.snapshot(),
+    })
+
+@app.route('/api/metrics/models', methods=['GET'])
+def model_route_metrics_endpoint():
+    """Model per route (agent or endpoint) with per-call and end-to-end latency, tokens and estimated cost"""
+    return jsonify({'success': True, 'metrics': model_route_metrics.snapshot()})
+
+@app.route('/api/metrics/models/reset', methods=['POST'])
+def reset_model_route_metrics():
+    """Clear the per-route model aggregates"""
+    model_route_metrics.reset()
+    return jsonify({'success': True})
+
+@app.route('/api/metrics/bigquery/reset', methods=['POST'])
+def reset_bigquery_metrics():
+    """Clear the BigQuery aggregates (byte caps are kept)"""
+    query_metrics.reset()
+    return jsonify({'success': True})
+
+@app.route('/api/metrics/agent-sessions', methods=['GET'])
+def agent_session_metrics():
+    """Active chat sessions and conversation history compaction"""
+    if not agent_session_manager:
+        return jsonify({'success': False, 'error': 'ADK Agent not available'}), 503
+    return jsonify({
+        'success': True,
+        'sessions': agent_session_manager.stats(),
+        'compaction': agent_history_compactor.stats() if agent_history_compactor else None,
+    })
+
+@app.route('/api/metrics/agent-traces', methods=['GET'])
+def agent_traces():
+    """Recent agent turns with span counts and their slowest model/tool call (?slowest=1 orders by duration)"""
+    if not agent_tracer:
+        return jsonify({'success': False, 'error': 'Agent tracing not enabled'}), 503
+    limit = request.args.get('limit', 50, type=int)
+    slowest = request.args.get('slowest', 'false').lower() in ('1', 'true')
+    return jsonify({'success': True, 'traces': agent_tracer.recent(limit=limit, slowest=slowest)})
+
+@app.route('/api/metrics/agent-traces/histograms', methods=['GET'])
+def agent_trace_histograms():
+    """Latency histograms per turn, agent, model call and tool"""
+    if not agent_tracer:
+        return jsonify({'success': False, 'error': 'Agent tracing not enabled'}), 503
+    return jsonify({'success': True, 'histograms': agent_tracer.histograms()})
+
+@app.route('/api/metrics/agent-traces/export', methods=['GET'])
+def export_agent_traces():
+    """Chrome trace JSON (chrome://tracing, Perfetto) of one turn (?trace_id=) or all recent turns"""
+    if not agent_tracer:
+        return jsonify({'success': False, 'error': 'Agent tracing not enabled'}), 503
+    trace_id = request.args.get('trace_id')
+    trace = agent_tracer.chrome_trace(trace_id)
+    if trace is None:
+        return jsonify({'success': False, 'error': f'Trace {trace_id} not found'}), 404
+    response = jsonify(trace)
+    response.headers['Content-Disposition'] = f"attachment; filename=agent_trace_{trace_id or 'recent'}.json"
+    return response
+
+@app.route('/api/officials/search-reports', methods=['GET'])
+def officials_search_reports():
+    """Hybrid keyword + semantic report search, filtered before ranking
+    (?q=, ?state=, ?county=, ?severity=, ?report_type=, ?days=, ?top_k=10)"""
+    if not search_community_reports:
+        return jsonify({'success': False, 'error': 'Report search not available'}), 503
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'q is required'}), 400
+    started_at = time.time()
+    rows, error = search_community_reports(
+        query,
+        top_k=min(request.args.get('top_k', 10, type=int), 100),
+        state=request.args.get('state'),
+        county=request.args.get('county'),
+        severity=request.args.get('severity'),
+        report_type=request.args.get('report_type'),
+        days=request.args.get('days', type=int),
+    )
+    if error:
+        return jsonify({'success': False, 'error': error}), 502
+    return jsonify({'success': True, 'reports': rows, 'count': len(rows),
+                    'elapsed_ms': round((time.time() - started_at) * 1000, 1)})
+
+@app.route('/api/officials/hotspots', methods=['GET'])
+def officials_hotspots():
+    """Community report spikes vs each area's baseline, from the worker's in-memory detector
+    (?state=, ?county=, ?report_type=, ?resolution=hour|day, ?all=1, ?limit=20)"""
+    if not fetch_hotspots:
+        return jsonify({'success': False, 'error': 'Hotspot detection not available'}), 503
+    data, error = fetch_hotspots(
+        state=request.args.get('state'),
+        county=request.args.get('county'),
+        report_type=request.args.get('report_type'),
+        resolution=request.args.get('resolution'),
+        include_all=request.args.get('all') in ('1', 'true'),
+        limit=request.args.get('limit', 20, type=int),
+    )
+    if error:
+        return jsonify({'success': False, 'error': error}), 503
+    return jsonify(data)
+
+@app.route('/api/report-clusters', methods=['GET'])
+def report_clusters():
+    """Recent clusters of near-duplicate report submissions (?state=, ?min_size=2)"""
+    deduplicator = get_report_deduplicator()
+    if not deduplicator:
+        return jsonify({'success': False, 'error': 'Report deduplication not enabled'}), 503
+    return jsonify({
+        'success': True,
+        'clusters': deduplicator.clusters(state=request.args.get('state'),
+                                          min_size=request.args.get('min_size', 2, type=int),
+                                          limit=request.args.get('limit', 50, type=int)),
+        'stats': deduplicator.stats(),
+    })
+
+@app.route('/api/metrics/report-index', methods=['GET'])
+def report_index_metrics():
+    """Size, search mode and latency of the local report embedding index used by semantic search"""
+    index = get_report_vector_index()
+    if not index:
+        return jsonify({'success': False, 'error': 'Report vector index not enabled'}), 503
+    return jsonify({'success': True, 'metrics': index.stats()})
+
+@app.route('/api/metrics/tool-cache', methods=['GET'])
+def tool_cache_metrics():
+    """Hit rate and size of the memoized ADK data tools"""
+    if not tool_cache_stats:
+        return jsonify({'success': False, 'error': 'ADK Agent not available'}), 503
+    return jsonify({'success': True, 'tools': tool_cache_stats()})
+
+@app.route('/api/metrics/tool-cache/invalidate', methods=['POST'])
+def invalidate_tool_cache_endpoint():
+    """Drop memoized results, e.g. after a manual data load (body: {"tool": name}, default all)"""
+    if not invalidate_tool_cache:
+        return jsonify({'success': False, 'error': 'ADK Agent not available'}), 503
+    tool = (request.get_json(silent=True) or {}).get('tool')
+    return jsonify({'success': True, 'invalidated': invalidate_tool_cache(tool)})
+
+@app.route('/api/metrics/embedding-cache', methods=['GET'])
+def embedding_cache_metrics():
+    """Embedding cache hits per tier and Gemini embedding API calls avoided"""
+    if not embedding_cache_stats:
+        return jsonify({'success': False, 'error': 'ADK Agent not available'}), 503
+    return jsonify({'success': True, 'metrics': embedding_cache_stats()})
+
+@app.route('/api/metrics/response-cache', methods=['GET'])
+def response_cache_metrics():
+    """Semantic response cache hit rate, latency and model calls saved"""
+    if not agent_response_cache:
+        return jsonify({'success': False, 'error': 'Response cache not enabled'}), 503
+    return jsonify({'success': True, 'metrics': agent_response_cache.stats()})
+
+@app.route('/api/metrics/response-cache/clear', methods=['POST'])
+def clear_response_cache():
+    """Forget all cached agent answers (e.g. after prompt or menu changes)"""
+    if not agent_response_cache:
+        return jsonify({'success': False, 'error': 'Response cache not enabled'}), 503
+    agent_response_cache.clear()
+    return jsonify({'success': True})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     print(f"[OK] Starting Flask app on port {port}")
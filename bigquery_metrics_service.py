@@ -0,0 +1,283 @@
+"""
+BigQuery Metrics Service - cost and latency instrumentation for BigQuery queries
+
+`InstrumentedBigQueryClient` wraps a `google.cloud.bigquery.Client`; every
+`query()` call is tagged with its call site (the Flask endpoint when running
+inside a request, otherwise the calling module.function, or an explicit
+`tag=`) and, once the job finishes, its bytes processed/billed, cache hit,
+slot time and wall time are added to rolling per-tag aggregates.
+
+A call site can also be given a byte cap: the query is dry-run first and
+rejected with `QueryByteCapExceeded` before any bytes are billed.
+"""
+import copy
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+try:
+    from flask import has_request_context, request
+    FLASK_AVAILABLE = True
+except ImportError:
+    FLASK_AVAILABLE = False
+
+RECENT_QUERIES = 50
+LATENCY_WINDOW = 200
+
+
+class QueryByteCapExceeded(Exception):
+    """Raised when a dry run shows a query would scan more than its call site's cap"""
+
+    def __init__(self, tag: str, bytes_processed: int, max_bytes: int):
+        self.tag = tag
+        self.bytes_processed = bytes_processed
+        self.max_bytes = max_bytes
+        super().__init__(
+            f"Query from '{tag}' would process {bytes_processed:,} bytes (cap {max_bytes:,})"
+        )
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class QueryMetrics:
+    """Thread-safe rolling aggregates of BigQuery job statistics per call site"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tags: Dict[str, dict] = {}
+        self._recent = deque(maxlen=RECENT_QUERIES)
+        self.byte_caps: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def _tag_stats(self, tag: str) -> dict:
+        stats = self._tags.get(tag)
+        if stats is None:
+            stats = self._tags[tag] = {
+                'queries': 0,
+                'errors': 0,
+                'rejected': 0,
+                'cache_hits': 0,
+                'bytes_processed': 0,
+                'bytes_billed': 0,
+                'slot_millis': 0,
+                'elapsed_total': 0.0,
+                'elapsed_max': 0.0,
+                'latencies': deque(maxlen=LATENCY_WINDOW),
+            }
+        return stats
+
+    def record(self, tag: str, job, elapsed: float, error: Optional[Exception] = None):
+        """Add one finished (or failed) query job to the aggregates"""
+        bytes_processed = getattr(job, 'total_bytes_processed', None) or 0
+        bytes_billed = getattr(job, 'total_bytes_billed', None) or 0
+        slot_millis = getattr(job, 'slot_millis', None) or 0
+        cache_hit = bool(getattr(job, 'cache_hit', False))
+
+        with self._lock:
+            stats = self._tag_stats(tag)
+            stats['queries'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['cache_hits'] += 1 if cache_hit else 0
+            stats['bytes_processed'] += bytes_processed
+            stats['bytes_billed'] += bytes_billed
+            stats['slot_millis'] += slot_millis
+            stats['elapsed_total'] += elapsed
+            stats['elapsed_max'] = max(stats['elapsed_max'], elapsed)
+            stats['latencies'].append(elapsed)
+            self._recent.append({
+                'tag': tag,
+                'job_id': getattr(job, 'job_id', None),
+                'bytes_processed': bytes_processed,
+                'bytes_billed': bytes_billed,
+                'slot_millis': slot_millis,
+                'cache_hit': cache_hit,
+                'elapsed': round(elapsed, 3),
+                'error': str(error) if error else None,
+                'finished_at': time.time(),
+            })
+
+        print(f"[BQ METRICS] {tag}: {bytes_processed:,} bytes, cache_hit={cache_hit}, "
+              f"slot_ms={slot_millis}, {elapsed:.2f}s{' ERROR' if error else ''}")
+
+    def record_rejection(self, tag: str):
+        with self._lock:
+            self._tag_stats(tag)['rejected'] += 1
+
+    def snapshot(self) -> dict:
+        """Aggregates per tag (sorted by bytes processed) plus the most recent queries"""
+        with self._lock:
+            tags = {}
+            for tag, stats in self._tags.items():
+                latencies = list(stats['latencies'])
+                completed = stats['queries'] or 1
+                tags[tag] = {
+                    'queries': stats['queries'],
+                    'errors': stats['errors'],
+                    'rejected': stats['rejected'],
+                    'cache_hit_rate': round(stats['cache_hits'] / completed, 3),
+                    'bytes_processed': stats['bytes_processed'],
+                    'bytes_billed': stats['bytes_billed'],
+                    'slot_millis': stats['slot_millis'],
+                    'elapsed_avg': round(stats['elapsed_total'] / completed, 3),
+                    'elapsed_p50': _percentile(latencies, 50),
+                    'elapsed_p95': _percentile(latencies, 95),
+                    'elapsed_max': round(stats['elapsed_max'], 3),
+                    'byte_cap': self.byte_caps.get(tag),
+                }
+            recent = list(self._recent)
+
+        ordered = dict(sorted(tags.items(), key=lambda item: item[1]['bytes_processed'], reverse=True))
+        return {
+            'since': self.started_at,
+            'totals': {
+                'queries': sum(t['queries'] for t in ordered.values()),
+                'bytes_processed': sum(t['bytes_processed'] for t in ordered.values()),
+                'bytes_billed': sum(t['bytes_billed'] for t in ordered.values()),
+                'slot_millis': sum(t['slot_millis'] for t in ordered.values()),
+            },
+            'by_call_site': ordered,
+            'recent': recent,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._tags.clear()
+            self._recent.clear()
+            self.started_at = time.time()
+
+
+query_metrics = QueryMetrics()
+
+
+def set_byte_cap(tag: str, max_bytes: Optional[int]):
+    """Dry-run queries from `tag` and reject them above `max_bytes` (None removes the cap)"""
+    if max_bytes is None:
+        query_metrics.byte_caps.pop(tag, None)
+    else:
+        query_metrics.byte_caps[tag] = int(max_bytes)
+
+
+def load_byte_caps_from_env(value: Optional[str] = None):
+    """Read caps from BQ_BYTE_CAPS, e.g. 'get_community_reports=1000000000,default=50000000000'"""
+    value = value if value is not None else os.getenv('BQ_BYTE_CAPS', '')
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        tag, _, max_bytes = entry.partition('=')
+        try:
+            set_byte_cap(tag.strip(), int(float(max_bytes)))
+        except ValueError:
+            print(f"[BQ METRICS] Ignoring invalid byte cap '{entry}'")
+
+
+def _call_site(depth: int = 2) -> str:
+    """Flask endpoint of the current request, else module.function of the caller"""
+    if FLASK_AVAILABLE and has_request_context() and request.endpoint:
+        return request.endpoint
+    frame = sys._getframe(depth)
+    module = frame.f_globals.get('__name__', '?').rsplit('.', 1)[-1]
+    return f"{module}.{frame.f_code.co_name}"
+
+
+class InstrumentedQueryJob:
+    """QueryJob proxy that records job statistics the first time results are fetched"""
+
+    def __init__(self, job, tag: str, started_at: float):
+        self._job = job
+        self._tag = tag
+        self._started_at = started_at
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._job, name)
+
+    def _finish(self, fetch, *args, **kwargs):
+        try:
+            result = fetch(*args, **kwargs)
+        except Exception as e:
+            self._record(e)
+            raise
+        self._record()
+        return result
+
+    def _record(self, error: Optional[Exception] = None):
+        if not self._recorded:
+            self._recorded = True
+            query_metrics.record(self._tag, self._job, time.time() - self._started_at, error)
+
+    def result(self, *args, **kwargs):
+        return self._finish(self._job.result, *args, **kwargs)
+
+    def to_dataframe(self, *args, **kwargs):
+        return self._finish(self._job.to_dataframe, *args, **kwargs)
+
+    def to_arrow(self, *args, **kwargs):
+        return self._finish(self._job.to_arrow, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.result())
+
+
+class InstrumentedBigQueryClient:
+    """bigquery.Client proxy whose query() calls are tagged, measured and optionally byte-capped"""
+
+    def __init__(self, client, tag: Optional[str] = None):
+        self._client = client
+        self.tag = tag
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def query(self, query, job_config=None, *args, tag: Optional[str] = None,
+              max_bytes: Optional[int] = None, **kwargs):
+        """
+        Same as bigquery.Client.query, plus:
+
+        Args:
+            tag: Call-site name for the metrics (default: the client's tag, then the
+                Flask endpoint or caller function)
+            max_bytes: Dry-run first and raise QueryByteCapExceeded above this many bytes
+                (default: the cap registered for the tag, then the 'default' cap)
+        """
+        tag = tag or self.tag or _call_site()
+        if max_bytes is None:
+            max_bytes = query_metrics.byte_caps.get(tag, query_metrics.byte_caps.get('default'))
+
+        if max_bytes is not None and not getattr(job_config, 'dry_run', False):
+            self._check_byte_cap(query, job_config, tag, max_bytes)
+
+        started_at = time.time()
+        try:
+            job = self._client.query(query, job_config, *args, **kwargs)
+        except Exception as e:
+            query_metrics.record(tag, None, time.time() - started_at, e)
+            raise
+        return InstrumentedQueryJob(job, tag, started_at)
+
+    def _check_byte_cap(self, query, job_config, tag: str, max_bytes: int):
+        from google.cloud import bigquery
+
+        dry_run_config = copy.deepcopy(job_config) if job_config else bigquery.QueryJobConfig()
+        dry_run_config.dry_run = True
+        dry_run_config.use_query_cache = False
+        dry_run = self._client.query(query, job_config=dry_run_config)
+        bytes_processed = dry_run.total_bytes_processed or 0
+        if bytes_processed > max_bytes:
+            query_metrics.record_rejection(tag)
+            print(f"[BQ METRICS] Rejected query from {tag}: {bytes_processed:,} bytes > cap {max_bytes:,}")
+            raise QueryByteCapExceeded(tag, bytes_processed, max_bytes)
+
+
+def instrument_bigquery_client(client, tag: Optional[str] = None):
+    """Wrap a bigquery.Client (idempotent; None passes through); `tag` names all its queries"""
+    if client is None or isinstance(client, InstrumentedBigQueryClient):
+        return client
+    return InstrumentedBigQueryClient(client, tag)
+
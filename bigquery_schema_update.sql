@@ -23,6 +23,10 @@ ADD COLUMN IF NOT EXISTS exclude_from_analysis BOOL OPTIONS(description='Flag to
 ADD COLUMN IF NOT EXISTS exclusion_reason STRING OPTIONS(description='Reason for exclusion: Duplicate Report, Spam/Inappropriate, Test Data, Insufficient Information, Out of Jurisdiction, Other'),
 ADD COLUMN IF NOT EXISTS manual_tags STRING OPTIONS(description='JSON array of manually added tags by reviewers');
 
+-- Add insertion time (stamped by the Pub/Sub worker; the embedding backfill watermarks on it)
+ALTER TABLE `qwiklabs-gcp-00-4a7d408c735c.CrowdsourceData.CrowdSourceData`
+ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMP OPTIONS(description='When the row was written to BigQuery (report timestamp is when it was submitted)');
+
 -- Verify the schema update
 SELECT 
   column_name, 
@@ -41,6 +45,7 @@ WHERE table_name = 'CrowdSourceData'
     'exclusion_reason',
     'manual_tags',
     'ai_overall_summary',
-    'ai_media_summary'
+    'ai_media_summary',
+    'inserted_at'
   )
 ORDER BY column_name;
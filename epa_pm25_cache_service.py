@@ -0,0 +1,308 @@
+"""
+EPA PM2.5 Cache Service - local columnar copy of the EPA historical PM2.5 daily summary
+
+`bigquery-public-data.epa_historical_air_quality.pm25_frm_daily_summary` is frozen
+(the newest rows are from 2021-11-08, see `handle_relative_dates`), yet every
+historical air quality question used to run a fresh BigQuery job against it.
+
+This service extracts the table once into a local Parquet dataset partitioned
+by state and year (hive layout: `state_name=<state>/year=<year>/*.parquet`),
+with rows sorted by county and date inside each file so row-group statistics
+prune county/date filters. A small JSON manifest records which states, years,
+counties and date ranges were extracted; queries the manifest cannot answer
+return None so callers fall back to BigQuery.
+
+Build (or rebuild) the cache with:
+    python epa_pm25_cache_service.py [--states California Texas] [--start-year 2015]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+# Optional: pyarrow provides the Parquet store and the in-process query engine
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = pc = ds = None
+    PYARROW_AVAILABLE = False
+
+SOURCE_TABLE = "bigquery-public-data.epa_historical_air_quality.pm25_frm_daily_summary"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'epa_pm25')
+MANIFEST_FILE = 'manifest.json'
+ROWS_PER_GROUP = 16384
+
+CACHED_COLUMNS = [
+    'date_local',
+    'state_name',
+    'county_name',
+    'city_name',
+    'site_num',
+    'local_site_name',
+    'parameter_name',
+    'aqi',
+    'arithmetic_mean',
+]
+
+
+def _to_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class EPAPM25Cache:
+    """Read/build access to the local Parquet copy of the EPA PM2.5 daily summary"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or os.getenv('EPA_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.manifest = None
+        self._dataset = None
+        self._state_names = {}  # lower-case name -> name as stored
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def partitioning(self):
+        return ds.partitioning(
+            pa.schema([('state_name', pa.string()), ('year', pa.int16())]),
+            flavor='hive'
+        )
+
+    def _load(self):
+        """Open the manifest and dataset if a cache has been built"""
+        manifest_path = os.path.join(self.cache_dir, MANIFEST_FILE)
+        if not PYARROW_AVAILABLE or not os.path.exists(manifest_path):
+            return
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            dataset = ds.dataset(self.cache_dir, format='parquet', partitioning=self.partitioning,
+                                 exclude_invalid_files=True)
+            with self._lock:
+                self.manifest = manifest
+                self._dataset = dataset
+                self._state_names = {name.lower(): name for name in manifest.get('states', {})}
+            print(f"[EPA CACHE] Loaded {len(self._state_names)} state(s), "
+                  f"{manifest.get('total_rows', 0)} rows from {self.cache_dir}")
+        except Exception as e:
+            print(f"[EPA CACHE] Failed to load cache, using BigQuery: {e}")
+            self.manifest = None
+            self._dataset = None
+
+    @property
+    def is_available(self) -> bool:
+        return self._dataset is not None
+
+    def _resolve_states(self, state: Optional[str]) -> Optional[List[str]]:
+        """Map a requested state to the cached partition names; None when not cached"""
+        if state is None:
+            return list(self.manifest['states']) if self.manifest.get('complete') else None
+        name = self._state_names.get(state.strip().lower())
+        return [name] if name else None
+
+    def covers(self, state: Optional[str] = None, start_date=None) -> bool:
+        """True when the cache holds every source row for this state from start_date onwards"""
+        if not self.is_available:
+            return False
+        states = self._resolve_states(state)
+        if states is None:
+            return False
+        start_date = _to_date(start_date)
+        if start_date is None:
+            return self.manifest.get('start_year') is None
+        extracted_from = self.manifest.get('start_year')
+        return extracted_from is None or start_date.year >= extracted_from
+
+    def query(self, state: Optional[str] = None, county: Optional[str] = None, city: Optional[str] = None,
+              start_date=None, end_date=None, require_aqi: bool = False, require_mean: bool = False,
+              columns: Optional[List[str]] = None, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Run a filtered query against the local store, newest rows first.
+
+        Returns None when the cache does not cover the request (callers should
+        query BigQuery instead); an empty list means the source has no matching rows.
+        """
+        if not self.covers(state, start_date):
+            return None
+
+        start_date = _to_date(start_date)
+        end_date = _to_date(end_date)
+        states = self._resolve_states(state)
+
+        # County index: skip the scan entirely when no extracted year has the county
+        if county:
+            years = self._years_with_county(states, county, start_date, end_date)
+            if not years:
+                return []
+        else:
+            years = None
+
+        started_at = time.time()
+        expr = ds.field('state_name').isin(states)
+        if years is not None:
+            expr &= ds.field('year').isin(pa.array(years, type=pa.int16()))
+        if start_date:
+            expr &= ds.field('year') >= start_date.year
+            expr &= ds.field('date_local') >= pa.scalar(start_date, type=pa.date32())
+        if end_date:
+            expr &= ds.field('year') <= end_date.year
+            expr &= ds.field('date_local') <= pa.scalar(end_date, type=pa.date32())
+        if county:
+            expr &= ds.field('county_name') == county
+        if city:
+            expr &= ds.field('city_name') == city
+        if require_aqi:
+            expr &= ds.field('aqi').is_valid()
+        if require_mean:
+            expr &= ds.field('arithmetic_mean').is_valid()
+
+        table = self._dataset.to_table(columns=columns or CACHED_COLUMNS, filter=expr)
+        if table.num_rows and 'date_local' in table.column_names:
+            table = table.sort_by([('date_local', 'descending')])
+        if limit is not None:
+            table = table.slice(0, limit)
+
+        rows = table.to_pylist()
+        print(f"[EPA CACHE] {len(rows)} row(s) for {state or 'all states'}"
+              f"{'/' + county if county else ''} in {(time.time() - started_at) * 1000:.1f}ms")
+        return rows
+
+    def _years_with_county(self, states: List[str], county: str, start_date, end_date) -> List[int]:
+        years = set()
+        for name in states:
+            for year, info in self.manifest['states'][name].get('years', {}).items():
+                year = int(year)
+                if start_date and year < start_date.year or end_date and year > end_date.year:
+                    continue
+                if county in info.get('counties', []):
+                    years.add(year)
+        return sorted(years)
+
+    def build(self, bq_client, states: Optional[List[str]] = None, start_year: Optional[int] = None) -> dict:
+        """
+        Extract the source table from BigQuery into the local store, one state at a time.
+
+        Args:
+            bq_client: google.cloud.bigquery.Client used for the extraction
+            states: Only extract these states (default: all states, marks the cache complete)
+            start_year: Only extract rows from this year onwards (default: all years)
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required to build the EPA PM2.5 cache")
+        from google.cloud import bigquery
+
+        if not states:
+            states = [row.state_name for row in bq_client.query(
+                f"SELECT DISTINCT state_name FROM `{SOURCE_TABLE}` ORDER BY state_name"
+            ).result()]
+            complete = True
+        else:
+            complete = False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        previous = self.manifest or {}
+        manifest = {
+            'source_table': SOURCE_TABLE,
+            'built_at': datetime.utcnow().isoformat(),
+            'start_year': start_year,
+            'complete': complete,
+            'total_rows': 0,
+            'states': {},
+        }
+        if not complete and previous.get('start_year') == start_year:
+            # Partial rebuild: keep the other states that were already extracted
+            manifest['complete'] = previous.get('complete', False)
+            manifest['states'] = {k: v for k, v in previous.get('states', {}).items() if k not in states}
+            manifest['total_rows'] = sum(v.get('rows', 0) for v in manifest['states'].values())
+
+        column_list = ", ".join(CACHED_COLUMNS)
+        for state in states:
+            started_at = time.time()
+            query = f"""
+            SELECT {column_list}
+            FROM `{SOURCE_TABLE}`
+            WHERE state_name = @state
+            {'AND EXTRACT(YEAR FROM date_local) >= @start_year' if start_year else ''}
+            """
+            params = [bigquery.ScalarQueryParameter('state', 'STRING', state)]
+            if start_year:
+                params.append(bigquery.ScalarQueryParameter('start_year', 'INT64', start_year))
+            table = bq_client.query(
+                query, job_config=bigquery.QueryJobConfig(query_parameters=params)
+            ).result().to_arrow()
+
+            if table.num_rows:
+                table = table.append_column('year', pc.year(table['date_local']).cast(pa.int16()))
+                table = table.sort_by([('county_name', 'ascending'), ('date_local', 'ascending')])
+                ds.write_dataset(
+                    table,
+                    self.cache_dir,
+                    format='parquet',
+                    partitioning=self.partitioning,
+                    existing_data_behavior='delete_matching',
+                    max_rows_per_group=ROWS_PER_GROUP,
+                )
+
+            manifest['states'][state] = self._summarize(table)
+            manifest['total_rows'] += table.num_rows
+            print(f"[EPA CACHE] Extracted {table.num_rows} rows for {state} in {time.time() - started_at:.1f}s")
+
+        with open(os.path.join(self.cache_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        self._load()
+        return manifest
+
+    @staticmethod
+    def _summarize(table) -> dict:
+        """Per-year row counts, counties and date range for the manifest"""
+        summary = {'rows': table.num_rows, 'min_date': None, 'max_date': None, 'years': {}}
+        if not table.num_rows:
+            return summary
+        summary['min_date'] = pc.min(table['date_local']).as_py().isoformat()
+        summary['max_date'] = pc.max(table['date_local']).as_py().isoformat()
+        for year in pc.unique(table['year']).to_pylist():
+            year_table = table.filter(pc.equal(table['year'], year))
+            counties = pc.unique(year_table['county_name'].drop_null()).to_pylist()
+            summary['years'][str(year)] = {'rows': year_table.num_rows, 'counties': sorted(counties)}
+        return summary
+
+
+_epa_cache = None
+_epa_cache_lock = threading.Lock()
+
+
+def get_epa_cache() -> Optional[EPAPM25Cache]:
+    """Shared cache instance; None when pyarrow is missing or the cache is disabled"""
+    global _epa_cache
+    if not PYARROW_AVAILABLE or os.getenv('EPA_CACHE_ENABLED', 'true').lower() == 'false':
+        return None
+    with _epa_cache_lock:
+        if _epa_cache is None:
+            _epa_cache = EPAPM25Cache()
+    return _epa_cache
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from google.cloud import bigquery
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Build the local EPA PM2.5 Parquet cache')
+    parser.add_argument('--states', nargs='*', help='States to extract (default: all)')
+    parser.add_argument('--start-year', type=int, help='Only extract rows from this year onwards')
+    parser.add_argument('--cache-dir', help=f'Output directory (default: {DEFAULT_CACHE_DIR})')
+    args = parser.parse_args()
+
+    cache = EPAPM25Cache(args.cache_dir)
+    result = cache.build(bigquery.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT')),
+                         states=args.states, start_year=args.start_year)
+    print(f"[EPA CACHE] Done: {result['total_rows']} rows, {len(result['states'])} state(s)")
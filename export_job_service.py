@@ -0,0 +1,451 @@
+"""
+Export Job Service - asynchronous PDF/XLSX exports of community reports
+
+PDF and Excel files are rendered on a small bounded worker pool instead of on
+the request thread. Submitting an export returns a job id right away; clients
+poll (or stream) the job's progress and download the file once it is ready.
+Finished files are kept locally or in GCS, and a request with the same format
+and filters reuses the finished (or still running) job.
+
+Job records live in process memory. With GCS storage each record is also written
+to `exports/jobs/<job_id>.json` when it is queued and when it finishes, so any
+instance can answer status and download requests for it (a running job's progress
+is only live on the instance rendering it). With local storage, status and
+downloads only work on the instance that ran the job: use a single instance or GCS.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+EXPORT_JOB_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+# PDF output is meant to be read; beyond this many rows use CSV/JSONL/XLSX
+PDF_MAX_ROWS = 10000
+PDF_TABLE_CHUNK = 250  # rows per reportlab Table (keeps page splitting linear)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+
+# A fetch function returns (total_rows, columns, iterator of row-dict batches)
+FetchRows = Callable[[], Tuple[int, List[str], Iterable[List[Dict]]]]
+
+
+def _cell_value(value):
+    """Make a BigQuery value safe for a spreadsheet/PDF cell"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        # Excel cannot store timezone-aware datetimes
+        return value.replace(tzinfo=None)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, default=str) if value else None
+    return value
+
+
+def render_xlsx(path: str, total_rows: int, columns: List[str], batches: Iterable[List[Dict]],
+                progress: Callable[[int], None]):
+    """Write rows to an .xlsx file with openpyxl's write-only (streaming) workbook"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Community Reports')
+    sheet.append(columns)
+
+    rows_done = 0
+    for batch in batches:
+        for row in batch:
+            sheet.append([_cell_value(row.get(col)) for col in columns])
+        rows_done += len(batch)
+        progress(rows_done)
+
+    workbook.save(path)
+
+
+def render_pdf(path: str, total_rows: int, columns: List[str], batches: Iterable[List[Dict]],
+               progress: Callable[[int], None]):
+    """Render rows as a landscape A4 PDF report (same layout as the original synchronous export)"""
+    from reportlab.lib.pagesizes import landscape, A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
+    doc = SimpleDocTemplate(
+        path,
+        pagesize=landscape(A4),
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.75*inch,
+        bottomMargin=0.5*inch
+    )
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#1a3a52'),
+        spaceAfter=12,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.grey,
+        spaceAfter=20,
+        alignment=TA_CENTER
+    )
+    cell_style = ParagraphStyle('Cell', parent=styles['Normal'], fontSize=7, leading=9)
+
+    # Select key columns for better readability
+    preferred_cols = ['timestamp', 'state', 'city', 'county', 'zip_code',
+                      'report_type', 'severity', 'status', 'description']
+    key_columns = [col for col in preferred_cols if col in columns] or list(columns[:8])
+
+    col_widths = []
+    for col in key_columns:
+        if col == 'description':
+            col_widths.append(3.0 * inch)
+        elif col == 'timestamp':
+            col_widths.append(1.4 * inch)
+        elif col in ['state', 'city', 'county']:
+            col_widths.append(1.0 * inch)
+        elif col == 'zip_code':
+            col_widths.append(0.7 * inch)
+        elif col in ['severity', 'status', 'report_type']:
+            col_widths.append(0.8 * inch)
+        else:
+            col_widths.append(1.1 * inch)
+
+    table_style = TableStyle([
+        # Header styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+
+        # Body styling - with TOP alignment for wrapped text
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 7),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+
+        # Grid and borders
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#10b981')),
+
+        # Alternating row colors for better readability
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
+    ])
+    header_row = [col.replace('_', ' ').title() for col in key_columns]
+
+    shown_rows = min(total_rows, PDF_MAX_ROWS)
+    elements = [
+        Paragraph("<b>Community Health Reports</b>", title_style),
+        Paragraph(
+            f"Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')} | Total Reports: {shown_rows}",
+            subtitle_style
+        ),
+        Spacer(1, 0.3 * inch),
+    ]
+
+    # One long Table makes reportlab's page splitting quadratic, so the rows are
+    # emitted as a series of smaller tables that each repeat the header
+    chunk = []
+    rows_done = 0
+
+    def flush_chunk():
+        if chunk:
+            table = Table([header_row] + chunk, colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            elements.append(table)
+            chunk.clear()
+
+    for batch in batches:
+        for row in batch:
+            if rows_done >= PDF_MAX_ROWS:
+                break
+            row_data = []
+            for col in key_columns:
+                val = row.get(col)
+                if val is None or (isinstance(val, (list, tuple)) and not val):
+                    value = '-'
+                elif isinstance(val, (datetime, date)):
+                    value = val.strftime('%Y-%m-%d %H:%M:%S') if isinstance(val, datetime) else val.isoformat()
+                else:
+                    value = str(val)
+                limit = 200 if col == 'description' else 80
+                row_data.append(Paragraph(value[:limit], cell_style))
+            chunk.append(row_data)
+            rows_done += 1
+            if len(chunk) >= PDF_TABLE_CHUNK:
+                flush_chunk()
+        progress(rows_done)
+        if rows_done >= PDF_MAX_ROWS:
+            break
+    flush_chunk()
+
+    elements.append(Spacer(1, 0.2 * inch))
+    elements.append(Paragraph(f"<i>End of Report - Total {rows_done} reports displayed</i>", subtitle_style))
+    doc.build(elements)
+
+
+RENDERERS = {
+    'xlsx': render_xlsx,
+    'pdf': render_pdf,
+}
+
+
+class ExportJobManager:
+    """Runs export jobs on a bounded thread pool and tracks their progress and artifacts"""
+
+    def __init__(self, max_workers: int = 2, storage_dir: str = 'data/exports', bucket=None,
+                 artifact_ttl: int = 3600):
+        """
+        Args:
+            max_workers: Concurrent export renders
+            storage_dir: Local directory for finished files (and scratch space for GCS uploads)
+            bucket: Optional GCS bucket; when set, finished files are stored under exports/
+            artifact_ttl: Seconds a finished file may be reused for identical requests
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export-job')
+        self.storage_dir = storage_dir
+        self.bucket = bucket
+        self.artifact_ttl = artifact_ttl
+        self.jobs: Dict[str, Dict] = {}
+        self.jobs_by_key: Dict[str, str] = {}
+        self.data_generation = 0  # bumped when reports change so stale artifacts are not reused
+        self._lock = threading.Lock()
+        os.makedirs(self.storage_dir, exist_ok=True)
+        print(f"[EXPORT_JOBS] Initialized ({max_workers} workers, storage: {'gcs' if bucket else 'local'})")
+
+    def _dedup_key(self, format: str, filters: Dict) -> str:
+        normalized = {k: v for k, v in sorted(filters.items()) if v}
+        payload = json.dumps({'format': format, 'filters': normalized, 'generation': self.data_generation},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _is_reusable(self, job: Dict) -> bool:
+        if job['status'] == 'failed':
+            return False
+        if job['status'] == 'completed':
+            return time.time() - job['finished_at'] < self.artifact_ttl
+        return True  # queued/running - attach to the in-flight job
+
+    def invalidate(self):
+        """Stop reusing finished exports (call after reports are submitted or updated)"""
+        with self._lock:
+            self.data_generation += 1
+            self.jobs_by_key.clear()
+
+    def submit(self, format: str, filters: Dict, fetch_rows: FetchRows) -> Tuple[Dict, bool]:
+        """
+        Queue an export, or return the existing job for identical format + filters.
+
+        Returns:
+            (job, reused) - a snapshot of the job record and whether it was reused
+        """
+        if format not in RENDERERS:
+            raise ValueError(f"Unsupported export job format: {format}")
+
+        self.cleanup_expired()
+        with self._lock:
+            key = self._dedup_key(format, filters)
+            existing_id = self.jobs_by_key.get(key)
+            if existing_id and existing_id in self.jobs and self._is_reusable(self.jobs[existing_id]):
+                print(f"[EXPORT_JOBS] Reusing job {existing_id} for identical {format} export")
+                return dict(self.jobs[existing_id]), True
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'job_id': job_id,
+                'format': format,
+                'filters': {k: v for k, v in filters.items() if v},
+                'status': 'queued',
+                'progress': 0,
+                'rows_done': 0,
+                'total_rows': None,
+                'created_at': time.time(),
+                'finished_at': None,
+                'filename': None,
+                'storage': None,
+                'location': None,
+                'error': None,
+            }
+            self.jobs[job_id] = job
+            self.jobs_by_key[key] = job_id
+
+        self._persist(job_id)
+        self.executor.submit(self._run, job_id, fetch_rows)
+        print(f"[EXPORT_JOBS] Job {job_id} queued ({format})")
+        return dict(job), False
+
+    def _update(self, job_id: str, **updates):
+        with self._lock:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(updates)
+
+    def _job_blob(self, job_id: str):
+        return self.bucket.blob(f"exports/jobs/{job_id}.json")
+
+    def _persist(self, job_id: str):
+        """Write the job record next to its file in GCS, so other instances can serve it"""
+        if self.bucket is None:
+            return
+        with self._lock:
+            job = dict(self.jobs.get(job_id) or {})
+        if not job:
+            return
+        try:
+            self._job_blob(job_id).upload_from_string(json.dumps(job), content_type='application/json')
+        except Exception as e:
+            print(f"[EXPORT_JOBS] Could not persist job {job_id}: {e}")
+
+    def _load_persisted(self, job_id: str) -> Optional[Dict]:
+        """Job record written by another instance, or None (unknown, expired or unreadable)"""
+        if self.bucket is None or not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            blob = self._job_blob(job_id)
+            if not blob.exists():
+                return None
+            job = json.loads(blob.download_as_text())
+        except Exception as e:
+            print(f"[EXPORT_JOBS] Could not load job {job_id}: {e}")
+            return None
+        if job.get('status') in TERMINAL_STATUSES and time.time() - job['finished_at'] > self.artifact_ttl:
+            return None
+        return job
+
+    def _run(self, job_id: str, fetch_rows: FetchRows):
+        job = self.jobs[job_id]
+        format = job['format']
+        started = time.time()
+        self._update(job_id, status='running', progress=1)
+
+        try:
+            total_rows, columns, batches = fetch_rows()
+            if format == 'pdf':
+                total_rows = min(total_rows, PDF_MAX_ROWS)
+            self._update(job_id, total_rows=total_rows, progress=5)
+
+            def progress(rows_done):
+                # Rendering covers 5-90%; storing the file takes the rest
+                pct = 5 + int(85 * rows_done / total_rows) if total_rows else 90
+                self._update(job_id, rows_done=rows_done, progress=min(pct, 90))
+
+            filename = f"community_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job_id}.{format}"
+            local_path = os.path.join(self.storage_dir, filename)
+            RENDERERS[format](local_path, total_rows, columns, batches, progress)
+            self._update(job_id, progress=95)
+
+            storage, location = 'local', local_path
+            if self.bucket is not None:
+                blob_name = f"exports/{filename}"
+                self.bucket.blob(blob_name).upload_from_filename(local_path, content_type=EXPORT_JOB_FORMATS[format])
+                os.remove(local_path)
+                storage, location = 'gcs', blob_name
+
+            self._update(job_id, status='completed', progress=100, filename=filename,
+                         storage=storage, location=location, finished_at=time.time())
+            self._persist(job_id)
+            print(f"[EXPORT_JOBS] Job {job_id} completed in {time.time() - started:.1f}s ({storage})")
+        except Exception as e:
+            print(f"[EXPORT_JOBS] Job {job_id} failed: {e}")
+            import traceback
+            traceback.print_exc()
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+            self._persist(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job record (this instance's, else the persisted one), or None"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._load_persisted(job_id)
+
+    def wait(self, job_id: str, timeout: float, poll_interval: float = 0.25) -> Optional[Dict]:
+        """Block until a job finishes or `timeout` seconds pass; returns the latest snapshot"""
+        deadline = time.time() + timeout
+        job = self.get_job(job_id)
+        while job is not None and job['status'] not in TERMINAL_STATUSES and time.time() < deadline:
+            time.sleep(poll_interval)
+            job = self.get_job(job_id)
+        return job
+
+    def iter_progress(self, job_id: str, poll_interval: float = 0.5, heartbeat: float = 15.0,
+                      timeout: float = 1800.0):
+        """Yield job snapshots whenever progress changes, plus periodic heartbeats (None)"""
+        last_seen = None
+        last_sent = time.time()
+        deadline = time.time() + timeout
+        if job_id not in self.jobs:
+            poll_interval = max(poll_interval, 5.0)  # persisted record: only changes when the job finishes
+        while time.time() < deadline:
+            job = self.get_job(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['progress'])
+            if state != last_seen:
+                last_seen = state
+                last_sent = time.time()
+                yield job
+                if job['status'] in TERMINAL_STATUSES:
+                    return
+            elif time.time() - last_sent >= heartbeat:
+                last_sent = time.time()
+                yield None
+            time.sleep(poll_interval)
+
+    def open_artifact(self, job: Dict):
+        """Open a finished job's file for reading (binary file-like object)"""
+        if job['storage'] == 'gcs':
+            return self.bucket.blob(job['location']).open('rb')
+        return open(job['location'], 'rb')
+
+    def cleanup_expired(self):
+        """Forget jobs (and delete files) older than the artifact TTL"""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['status'] in TERMINAL_STATUSES and now - job['finished_at'] > self.artifact_ttl]
+            for job_id in expired:
+                job = self.jobs.pop(job_id)
+                try:
+                    if job['storage'] == 'local' and job['location'] and os.path.exists(job['location']):
+                        os.remove(job['location'])
+                    elif job['storage'] == 'gcs':
+                        self.bucket.blob(job['location']).delete()
+                    if self.bucket is not None:
+                        self._job_blob(job_id).delete()
+                except Exception as e:
+                    print(f"[EXPORT_JOBS] Failed to delete artifact for {job_id}: {e}")
+            if expired:
+                live_ids = set(self.jobs)
+                self.jobs_by_key = {k: v for k, v in self.jobs_by_key.items() if v in live_ids}
@@ -0,0 +1,389 @@
+"""
+Model Routing Service - one place that decides which Gemini model serves which route
+
+A route is either an ADK agent (by agent name) or an app endpoint/helper that
+calls Gemini directly. Each route maps to a tier:
+
+- fast:   routing, classification, tool calls and short answers (default gemini-2.5-flash)
+- pro:    deep analysis and long-form writing (default gemini-2.5-pro)
+
+Tiers are configured with MODEL_TIER_FAST / MODEL_TIER_PRO, and individual
+routes can be moved with MODEL_ROUTES, e.g.
+'analytics_agent=fast,executive_summary=gemini-2.5-flash-lite' (a tier name or a
+model id).
+
+Every model call is measured per route: latency, token usage and an estimated
+cost from MODEL_PRICING. For agents, `instrument_agent_models` attaches model
+callbacks to the whole agent tree (failed calls are recorded by the runner
+plugin from `model_error_plugins()`), and the caller reports each finished turn
+with `record_turn` so end-to-end latency and cost per turn are attributed to
+the agent that produced the answer. Direct callers use `generative_model(route)`,
+a metered drop-in for `genai.GenerativeModel`.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# ADK 1.x only reports model errors to runner plugins, not to agent callbacks
+try:
+    from google.adk.plugins.base_plugin import BasePlugin
+    ADK_PLUGINS_AVAILABLE = True
+except ImportError:
+    BasePlugin = object
+    ADK_PLUGINS_AVAILABLE = False
+
+LATENCY_WINDOW = 200
+MAX_OPEN_TURNS = 1000
+
+DEFAULT_TIERS = {
+    'fast': 'gemini-2.5-flash',
+    'pro': 'gemini-2.5-pro',
+}
+DEFAULT_TIER = 'fast'
+
+# Route -> tier. Agents are keyed by their ADK agent name.
+ROUTES = {
+    # Root agent: routes to a sub-agent or shows the menu
+    'community_health_assistant': 'fast',
+    'air_quality_agent': 'fast',
+    'live_air_quality_agent': 'fast',
+    'infectious_diseases_agent': 'fast',
+    'clinic_finder_agent': 'fast',
+    'google_search_agent': 'fast',
+    'health_faq_agent': 'fast',
+    'crowdsourcing_agent': 'fast',
+    'actionline_agent': 'fast',
+    'veo_prompt_agent': 'fast',
+    'twitter_agent': 'fast',
+    'Personalized_advisor': 'fast',
+    # Multi-step analysis over several datasets / semantic report search
+    'analytics_agent': 'pro',
+    'health_official_agent': 'pro',
+    # Direct Gemini calls
+    'chat_fallback': 'fast',
+    'report_text_analysis': 'fast',
+    'report_image_analysis': 'fast',
+    'report_summary': 'fast',
+    'alert_summary': 'fast',
+    'conversation_summary': 'fast',
+    'executive_summary': 'pro',
+}
+
+# USD per 1M tokens (input, output); thinking tokens are billed as output
+MODEL_PRICING = {
+    'gemini-2.5-pro': (1.25, 10.00),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.0-flash': (0.10, 0.40),
+    'gemini-2.0-flash-lite': (0.075, 0.30),
+}
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def tiers() -> Dict[str, str]:
+    """Tier -> model id (read from the environment on every call, so .env loaded late still applies)"""
+    return {tier: os.getenv(f'MODEL_TIER_{tier.upper()}', model) for tier, model in DEFAULT_TIERS.items()}
+
+
+def route_overrides(value: Optional[str] = None) -> Dict[str, str]:
+    """Parse MODEL_ROUTES, e.g. 'analytics_agent=fast,alert_summary=gemini-2.5-flash-lite'"""
+    return dict(_parse_routes(value if value is not None else os.getenv('MODEL_ROUTES', '')))
+
+
+@lru_cache(maxsize=8)
+def _parse_routes(value: str) -> tuple:
+    overrides = []
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        route, _, target = entry.partition('=')
+        if route.strip() and target.strip():
+            overrides.append((route.strip(), target.strip()))
+        else:
+            print(f"[MODEL ROUTING] Ignoring invalid route '{entry}'")
+    return tuple(overrides)
+
+
+def model_for(route: str) -> str:
+    """Model id serving a route (override, else the route's tier, else the default tier)"""
+    available = tiers()
+    target = route_overrides().get(route, ROUTES.get(route, DEFAULT_TIER))
+    return available.get(target, target)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """Estimated USD for one call, None for models without a price"""
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        return None
+    return (input_tokens * pricing[0] + output_tokens * pricing[1]) / 1_000_000
+
+
+def _usage_tokens(usage) -> tuple:
+    """(input, output) tokens from a Gemini usage_metadata (either SDK), zeros when missing"""
+    if usage is None:
+        return 0, 0
+    output = (getattr(usage, 'candidates_token_count', None) or 0) + (getattr(usage, 'thoughts_token_count', None) or 0)
+    return getattr(usage, 'prompt_token_count', None) or 0, output
+
+
+class RouteMetrics:
+    """Thread-safe rolling latency, token and cost aggregates per route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, dict] = {}
+        self._turns: Dict[str, dict] = {}
+        self._open_turns: "OrderedDict[str, dict]" = OrderedDict()  # invocation id -> running totals
+        self._request_ids = itertools.count(1)
+        self.started_at = time.time()
+
+    @staticmethod
+    def _new_stats() -> dict:
+        return {'count': 0, 'errors': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0.0,
+                'unpriced': 0, 'elapsed_total': 0.0, 'latencies': deque(maxlen=LATENCY_WINDOW), 'models': {}}
+
+    def record_call(self, route: str, model: str, elapsed: float, usage=None,
+                    error: Optional[Exception] = None, turn_id: Optional[str] = None):
+        """Add one model call; with `turn_id` its tokens and cost also count towards that turn"""
+        input_tokens, output_tokens = _usage_tokens(usage)
+        cost = estimate_cost(model, input_tokens, output_tokens)
+        with self._lock:
+            stats = self._calls.get(route) or self._calls.setdefault(route, self._new_stats())
+            stats['count'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['input_tokens'] += input_tokens
+            stats['output_tokens'] += output_tokens
+            stats['cost'] += cost or 0.0
+            stats['unpriced'] += 1 if cost is None else 0
+            stats['elapsed_total'] += elapsed
+            stats['latencies'].append(elapsed)
+            stats['models'][model] = stats['models'].get(model, 0) + 1
+            if turn_id is not None:
+                turn = self._open_turns.get(turn_id)
+                if turn is None:
+                    turn = self._open_turns[turn_id] = {'model_calls': 0, 'input_tokens': 0,
+                                                        'output_tokens': 0, 'cost': 0.0}
+                    while len(self._open_turns) > MAX_OPEN_TURNS:
+                        self._open_turns.popitem(last=False)
+                turn['model_calls'] += 1
+                turn['input_tokens'] += input_tokens
+                turn['output_tokens'] += output_tokens
+                turn['cost'] += cost or 0.0
+
+        print(f"[MODEL ROUTING] {route} -> {model}: {elapsed * 1000:.0f}ms, "
+              f"{input_tokens}+{output_tokens} tokens{' ERROR' if error else ''}")
+
+    def record_request(self, route: str, model: str, elapsed: float, usage=None,
+                       error: Optional[Exception] = None) -> dict:
+        """A request served by a single model call: recorded as both a call and an end-to-end sample"""
+        turn_id = f"request-{next(self._request_ids)}"
+        self.record_call(route, model, elapsed, usage, error, turn_id)
+        return self.record_turn(route, elapsed, turn_id, error)
+
+    def record_turn(self, route: str, elapsed: float, turn_id: Optional[str] = None,
+                    error: Optional[Exception] = None) -> dict:
+        """
+        Close a request/turn: end-to-end latency plus the model calls recorded under `turn_id`.
+        Returns the turn's totals (model_calls, tokens, cost).
+        """
+        with self._lock:
+            turn = self._open_turns.pop(turn_id, None) if turn_id is not None else None
+            turn = turn or {'model_calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0.0}
+            stats = self._turns.get(route) or self._turns.setdefault(route, self._new_stats())
+            stats['count'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['input_tokens'] += turn['input_tokens']
+            stats['output_tokens'] += turn['output_tokens']
+            stats['cost'] += turn['cost']
+            stats['elapsed_total'] += elapsed
+            stats['latencies'].append(elapsed)
+            stats['model_calls'] = stats.get('model_calls', 0) + turn['model_calls']
+        return turn
+
+    @staticmethod
+    def _summarize(stats: dict) -> dict:
+        count = stats['count'] or 1
+        latencies = list(stats['latencies'])
+        summary = {
+            'count': stats['count'],
+            'errors': stats['errors'],
+            'latency_avg': round(stats['elapsed_total'] / count, 3),
+            'latency_p50': _percentile(latencies, 50),
+            'latency_p95': _percentile(latencies, 95),
+            'input_tokens': stats['input_tokens'],
+            'output_tokens': stats['output_tokens'],
+            'cost_usd': round(stats['cost'], 6),
+            'avg_cost_usd': round(stats['cost'] / count, 6),
+        }
+        if stats['models']:
+            summary['models'] = dict(stats['models'])
+        if stats['unpriced']:
+            summary['unpriced_calls'] = stats['unpriced']
+        if 'model_calls' in stats:
+            summary['avg_model_calls'] = round(stats['model_calls'] / count, 2)
+        return summary
+
+    def snapshot(self) -> dict:
+        """Current route table plus per-route model call and end-to-end aggregates"""
+        with self._lock:
+            calls = {route: self._summarize(stats) for route, stats in self._calls.items()}
+            turns = {route: self._summarize(stats) for route, stats in self._turns.items()}
+        return {
+            'since': self.started_at,
+            'tiers': tiers(),
+            'routes': {route: model_for(route) for route in sorted(set(ROUTES) | set(route_overrides()))},
+            'model_calls': dict(sorted(calls.items(), key=lambda item: item[1]['cost_usd'], reverse=True)),
+            'end_to_end': dict(sorted(turns.items(), key=lambda item: item[1]['cost_usd'], reverse=True)),
+            'totals': {
+                'model_calls': sum(c['count'] for c in calls.values()),
+                'cost_usd': round(sum(c['cost_usd'] for c in calls.values()), 6),
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._turns.clear()
+            self._open_turns.clear()
+            self.started_at = time.time()
+
+
+route_metrics = RouteMetrics()
+
+
+def record_turn(route: str, elapsed: float, turn_id: Optional[str] = None,
+                error: Optional[Exception] = None) -> dict:
+    return route_metrics.record_turn(route, elapsed, turn_id, error)
+
+
+def record_request(route: str, model: str, elapsed: float, usage=None, error: Optional[Exception] = None) -> dict:
+    return route_metrics.record_request(route, model, elapsed, usage, error)
+
+
+class MeteredGenerativeModel:
+    """genai.GenerativeModel proxy whose generate_content() calls are measured under a route"""
+
+    def __init__(self, model, route: str):
+        self._model = model
+        self.route = route
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def generate_content(self, *args, **kwargs):
+        started_at = time.perf_counter()
+        model_name = self._model.model_name.split('/')[-1]
+        try:
+            response = self._model.generate_content(*args, **kwargs)
+        except Exception as e:
+            route_metrics.record_request(self.route, model_name, time.perf_counter() - started_at, error=e)
+            raise
+        route_metrics.record_request(self.route, model_name, time.perf_counter() - started_at,
+                                     getattr(response, 'usage_metadata', None))
+        return response
+
+
+def generative_model(route: str, **kwargs):
+    """Metered `genai.GenerativeModel` for a route (google.generativeai must be configured by the caller)"""
+    import google.generativeai as genai
+
+    return MeteredGenerativeModel(genai.GenerativeModel(model_for(route), **kwargs), route)
+
+
+# === ADK agents ===
+_call_started: "OrderedDict[tuple, tuple]" = OrderedDict()  # (invocation id, agent) -> (started_at, model)
+_call_started_lock = threading.Lock()
+
+
+def _before_model(callback_context, llm_request):
+    key = (callback_context.invocation_id, callback_context.agent_name)
+    with _call_started_lock:
+        _call_started[key] = (time.perf_counter(), llm_request.model)
+        while len(_call_started) > MAX_OPEN_TURNS:
+            _call_started.popitem(last=False)
+    return None
+
+
+def _after_model(callback_context, llm_response):
+    if llm_response.partial:
+        return None  # SSE text deltas; the aggregated response follows
+    key = (callback_context.invocation_id, callback_context.agent_name)
+    with _call_started_lock:
+        started = _call_started.pop(key, None)
+    if started is not None:
+        started_at, model = started
+        error = RuntimeError(llm_response.error_message) if llm_response.error_code else None
+        route_metrics.record_call(callback_context.agent_name, model or '?', time.perf_counter() - started_at,
+                                  llm_response.usage_metadata, error=error, turn_id=callback_context.invocation_id)
+    return None
+
+
+def _on_model_error(callback_context, llm_request, error):
+    """Record a model call that raised (the after-model callback never runs for it)"""
+    key = (callback_context.invocation_id, callback_context.agent_name)
+    with _call_started_lock:
+        started = _call_started.pop(key, None)
+    if started is not None:
+        started_at, model = started
+        route_metrics.record_call(callback_context.agent_name, model or getattr(llm_request, 'model', None) or '?',
+                                  time.perf_counter() - started_at, None, error=error,
+                                  turn_id=callback_context.invocation_id)
+    return None
+
+
+class ModelErrorMetricsPlugin(BasePlugin):
+    """Runner plugin that counts failed model calls of instrumented agents"""
+
+    def __init__(self):
+        super().__init__(name='model_error_metrics')
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        return _on_model_error(callback_context, llm_request, error)
+
+
+def model_error_plugins() -> List:
+    """Plugins to pass to the ADK App/Runner alongside instrument_agent_models"""
+    return [ModelErrorMetricsPlugin()] if ADK_PLUGINS_AVAILABLE else []
+
+
+def _add_callback(agent, field: str, callback) -> bool:
+    current = getattr(agent, field, None)
+    callbacks = current if isinstance(current, list) else [current] if current else []
+    if callback in callbacks:
+        return False
+    setattr(agent, field, callbacks + [callback])
+    return True
+
+
+def instrument_agent_models(agent, _seen=None) -> int:
+    """
+    Measure every model call of an ADK agent tree (sub-agents and AgentTool agents) per
+    agent name; idempotent. Returns the number of agents newly instrumented.
+    """
+    _seen = _seen if _seen is not None else set()
+    if id(agent) in _seen:
+        return 0
+    _seen.add(id(agent))
+    count = 0
+    if hasattr(agent, 'before_model_callback'):
+        added = _add_callback(agent, 'before_model_callback', _before_model)
+        _add_callback(agent, 'after_model_callback', _after_model)
+        if hasattr(agent, 'on_model_error_callback'):  # ADK versions with per-agent error callbacks
+            _add_callback(agent, 'on_model_error_callback', _on_model_error)
+        count += 1 if added else 0
+    for tool in getattr(agent, 'tools', None) or []:
+        if getattr(tool, 'agent', None) is not None:
+            count += instrument_agent_models(tool.agent, _seen)
+    for sub_agent in getattr(agent, 'sub_agents', None) or []:
+        count += instrument_agent_models(sub_agent, _seen)
+    return count
@@ -1,15 +1,19 @@
 # ./agent.py
 # -*- coding: utf-8 -*-
-import os
 import asyncio
+import os
 import logging
+import threading
+import time
+from contextlib import aclosing
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 from google.adk.agents import Agent
 from google.adk.agents.readonly_context import ReadonlyContext
-from google.adk.events import EventActions, Event
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.apps import App
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
 from google.adk.tools import google_search
 import google.generativeai as genai
@@ -44,6 +48,13 @@ from .tools.health_tools import get_health_faq
 from .agents.crowdsourcing_agent import crowdsourcing_agent
 from .agents.health_official_agent import health_official_agent
 from .tools.embedding_tool import generate_report_embeddings
+from .session_manager import AgentSessionManager
+from .history_compaction import SUMMARY_STATE_KEY, HistoryCompactor
+from .response_cache import EMBEDDING_TIMEOUT, SEMANTIC_CACHE_ENABLED, SemanticResponseCache
+from .tools.semantic_query_tool import get_gemini_embedding
+from .agent_tracing import AGENT_TRACING_ENABLED, AgentTracer
+from .agent_runtime import get_agent_loop, run_sync_tools_in_threads, setup_metrics, stream_metrics
+from .tools.common_utils import instrument_agent_models, model_error_plugins, model_for, record_turn
 
 # Try to import analytics agent, use None if it fails
 try:
@@ -53,12 +64,20 @@ except Exception as e:
     analytics_agent = None
 
 # === Model configuration ===
-GEMINI_MODEL = "gemini-2.5-pro"
+# The root agent only routes and answers menu-style questions (fast tier; see model_routing_service)
+GEMINI_MODEL = model_for("community_health_assistant")
 
 # === Create PSA Video Agents ===
-psa_agents = create_psa_video_agents(model=GEMINI_MODEL, tools_module=None)
+psa_agents = create_psa_video_agents(tools_module=None)
 
 # === Persona Definitions ===
+PERSONA_MAPPING = {
+    "Health Official": "health_official",
+    "Community Resident": "user",
+    "health_official": "health_official",
+    "user": "user"
+}
+
 USER_PROMPT = (
     "You are a friendly and approachable **Community Health & Wellness Assistant**.\n\n"
     "Your goal is to help everyday citizens with their local health, environment, and wellness needs.\n\n"
@@ -142,9 +161,9 @@ HEALTH_OFFICIAL_PROMPT = (
     "7️⃣ After each analytical response, ask: 'Would you like me to generate a visualization or PSA follow-up for this trend?'"
 )
 
-def get_current_time_context():
-    """Generate current time context for the agent"""
-    now = datetime.now()
+@lru_cache(maxsize=2)
+def _time_context_for_minute(minute: str) -> str:
+    now = datetime.strptime(minute, "%Y-%m-%d %H:%M")
     current_time = now.strftime("%A, %B %d, %Y at %I:%M %p")
     current_date = now.strftime("%Y-%m-%d")
     current_year = now.year
@@ -162,59 +181,94 @@ IMPORTANT: Always reference the current time when providing health advice, espec
 - Recent data trends and patterns
 """
 
+def get_current_time_context():
+    """Generate current time context for the agent (rendered once per minute)"""
+    return _time_context_for_minute(datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+def format_location_context(location_context) -> str:
+    """Render a frontend location dict as a prompt section ('' when empty)"""
+    if not location_context:
+        return ""
+    location_parts = []
+    if location_context.get('city'):
+        location_parts.append(f"City: {location_context['city']}")
+    if location_context.get('state'):
+        location_parts.append(f"State: {location_context['state']}")
+    if location_context.get('county'):
+        location_parts.append(f"County: {location_context['county']}")
+    if location_context.get('zipCode'):
+        location_parts.append(f"ZIP Code: {location_context['zipCode']}")
+    if location_context.get('formattedAddress'):
+        location_parts.append(f"Address: {location_context['formattedAddress']}")
+    if not location_parts:
+        return ""
+    coordinates = location_context.get('coordinates') or {}
+    return f"""
+USER LOCATION CONTEXT:
+- {', '.join(location_parts)}
+- Coordinates: {coordinates.get('lat', 'N/A')}, {coordinates.get('lng', 'N/A')}
+"""
+
+def format_time_frame_context(time_frame) -> str:
+    """Render a frontend time frame dict as a prompt section ('' when empty)"""
+    if not time_frame:
+        return ""
+    return f"""
+DATA TIME FRAME CONTEXT:
+- Start Date: {time_frame.get('start_date', 'Not specified')}
+- End Date: {time_frame.get('end_date', 'Not specified')}
+- Analysis Period: {time_frame.get('period', 'Not specified')}
+"""
+
+PERSONA_ROLE_CONTEXT = {
+    "health_official": "\nUSER ROLE: You are speaking with a Health Official who has access to semantic search, analytics, and PSA video generation tools\n",
+    "user": "\nUSER ROLE: You are speaking with a Community Resident who can report issues and get health information\n",
+}
+
+PERSONA_PROMPTS = {
+    "health_official": HEALTH_OFFICIAL_PROMPT,
+    "user": USER_PROMPT,
+}
+
+def context_instruction_provider(context: ReadonlyContext) -> str:
+    """
+    Global instruction for the whole agent tree, assembled per model call from
+    session state ("location_context", "time_frame", "persona_type" and the
+    compacted "conversation_summary") plus the cached time context, so
+    per-request context never requires a new agent.
+    """
+    state = context.state
+    persona_type = state.get("persona_type") or "user"
+    summary = state.get(SUMMARY_STATE_KEY)
+    return (
+        get_current_time_context()
+        + format_location_context(state.get("location_context"))
+        + format_time_frame_context(state.get("time_frame"))
+        + PERSONA_ROLE_CONTEXT.get(persona_type, PERSONA_ROLE_CONTEXT["user"])
+        + (f"\nEARLIER IN THIS CONVERSATION (summary of older turns):\n{summary}\n" if summary else "")
+    )
+
+def _persona_instruction(persona_type: str):
+    """Fixed system prompt of a pooled root agent (a provider, so prompts skip state templating)"""
+    prompt = PERSONA_PROMPTS.get(persona_type, USER_PROMPT)
+    def instruction_provider(context: ReadonlyContext) -> str:
+        return prompt
+    return instruction_provider
+
 def persona_aware_instruction_provider(context: ReadonlyContext) -> str:
     """
     Dynamically determine system prompt at runtime based on persona_type.
-    This allows the agent to switch personas without recreating the entire agent.
+    Kept for agents that switch personas from session state; the pooled root
+    agents use a fixed per-persona prompt instead.
     """
     persona_type = context.state.get("persona_type")
     # Choose persona based on LOGIN_ROLE or parameter
     if persona_type is None:
         persona_type = os.getenv("LOGIN_ROLE", "user")
-    print(f"[Instruction Provider] : Persona_type = {persona_type}")
     return HEALTH_OFFICIAL_PROMPT if persona_type == "health_official" else USER_PROMPT
 
-def create_root_agent_with_context(location_context=None, time_frame=None, persona_type=None):
-    """Create the root agent with dynamic context including current time, location, time frame, and persona"""
-    
-    # Get current time context
-    time_context = get_current_time_context()
-    
-    # Build location context if provided
-    location_info = ""
-    if location_context:
-        location_parts = []
-        if location_context.get('city'):
-            location_parts.append(f"City: {location_context['city']}")
-        if location_context.get('state'):
-            location_parts.append(f"State: {location_context['state']}")
-        if location_context.get('county'):
-            location_parts.append(f"County: {location_context['county']}")
-        if location_context.get('zipCode'):
-            location_parts.append(f"ZIP Code: {location_context['zipCode']}")
-        if location_context.get('formattedAddress'):
-            location_parts.append(f"Address: {location_context['formattedAddress']}")
-        
-        if location_parts:
-            location_info = f"""
-USER LOCATION CONTEXT:
-- {', '.join(location_parts)}
-- Coordinates: {location_context.get('coordinates', {}).get('lat', 'N/A')}, {location_context.get('coordinates', {}).get('lng', 'N/A')}
-"""
-    
-    # Build time frame context if provided
-    time_frame_info = ""
-    if time_frame:
-        time_frame_info = f"""
-DATA TIME FRAME CONTEXT:
-- Start Date: {time_frame.get('start_date', 'Not specified')}
-- End Date: {time_frame.get('end_date', 'Not specified')}
-- Analysis Period: {time_frame.get('period', 'Not specified')}
-"""
-    
-    # Combine all context
-    global_context = f"{time_context}{location_info}{time_frame_info}"
-    
+def create_root_agent(persona_type: str = "user"):
+    """Build the root agent graph for a persona (called once per persona, see get_root_agent)"""
     # Build complete sub_agents list
     sub_agents_list = [
         air_quality_agent,
@@ -240,199 +294,199 @@ DATA TIME FRAME CONTEXT:
         name="community_health_assistant",
         model=GEMINI_MODEL,
         description="Main community health assistant that routes queries to specialized sub-agents.",
-        global_instruction=global_context,
-        instruction=persona_aware_instruction_provider,
+        global_instruction=context_instruction_provider,
+        instruction=_persona_instruction(persona_type),
         tools=[generate_report_embeddings],
         sub_agents=sub_agents_list
     )
 
+# === Root Agent Pool (one agent graph per persona) ===
+_root_agents = {}
+_root_agents_lock = threading.Lock()
+
+def get_root_agent(persona_type: str = "user"):
+    """
+    Pooled root agent for a persona. The first one owns the shared sub-agent
+    instances; an ADK agent can only have one parent, so other personas get a
+    deep clone of that graph with their own prompt.
+    """
+    persona_type = persona_type if persona_type in PERSONA_PROMPTS else "user"
+    with _root_agents_lock:
+        agent = _root_agents.get(persona_type)
+        if agent is None:
+            started_at = time.perf_counter()
+            if not _root_agents:
+                agent = create_root_agent(persona_type)
+            else:
+                template = next(iter(_root_agents.values()))
+                agent = template.clone(update={"instruction": _persona_instruction(persona_type)})
+            _root_agents[persona_type] = agent
+            logger.info(f"[ROOT AGENT] Built root agent for persona '{persona_type}' "
+                        f"in {(time.perf_counter() - started_at) * 1000:.1f}ms")
+    return agent
+
+def create_root_agent_with_context(location_context=None, time_frame=None, persona_type=None):
+    """
+    Backward-compatible accessor: returns the pooled root agent for the persona.
+    Location and time frame are no longer baked into the agent; they are read
+    from session state by context_instruction_provider.
+    """
+    return get_root_agent(persona_type or os.getenv("LOGIN_ROLE", "user"))
+
 # === Default Root Agent (for backward compatibility) ===
-root_agent = create_root_agent_with_context()
+root_agent = get_root_agent(PERSONA_MAPPING.get(os.getenv("LOGIN_ROLE", "user"), "user"))
 
 # === Runner & Session Setup ===
 APP_NAME = "community_health_app"
-USER_ID = "user1234"
-SESSION_ID = "1234"
-
-_session_service: Optional[InMemorySessionService] = None
-_session = None
-_runner: Optional[Runner] = None
-
-def _initialize_session_and_runner():
-    """Initialize session service and runner lazily."""
-    global _session_service, _session, _runner
-    if _session_service is None:
-        logger.info(f"[ROOT AGENT] Initializing session service and runner")
-        _session_service = InMemorySessionService()
-        _session = asyncio.run(
-            _session_service.create_session(
-                app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-            )
-        )
-        _runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=_session_service)
-        logger.info(f"[ROOT AGENT] Session and runner initialized successfully")
-
-def call_agent(query: str, location_context=None, time_frame=None, persona=None) -> str:
-    """Helper function to call the agent with a query and return the response."""
-    global _runner
-    
-    # Initialize runner if not already done
-    logger.info(f"[ROOT AGENT] Starting query processing: '{query[:100]}...'")
-    logger.info(f"[ROOT AGENT] Context - Persona: {persona}, Location: {location_context}, TimeFrame: {time_frame}")
-    
-    _initialize_session_and_runner()
-    
-    # Determine effective persona (frontend > env var > default)
+DEFAULT_CLIENT_ID = "local_user"  # CLI and callers without a browser session
+
+# The runner, session service and all agent coroutines live on one long-lived event loop
+agent_loop = get_agent_loop()
+# One ADK session per chat client (TTL + LRU eviction, capped history)
+session_manager = AgentSessionManager(APP_NAME)
+_runners = {}  # persona_type -> Runner over that persona's pooled root agent
+# Spans for agent transfers, model calls and tool calls of every turn (see /api/metrics/agent-traces)
+agent_tracer = AgentTracer() if AGENT_TRACING_ENABLED else None
+
+def _get_runner(persona_type: str = "user") -> Runner:
+    """Runner for a persona's pooled root agent (created once; sessions are per client, runners are not)."""
+    runner = _runners.get(persona_type)
+    if runner is None:
+        agent = get_root_agent(persona_type)
+        logger.info(f"[ROOT AGENT] Initializing runner for persona '{persona_type}'")
+        # Blocking tools would otherwise run directly on the shared event loop
+        wrapped = run_sync_tools_in_threads(agent)
+        logger.info(f"[ROOT AGENT] {wrapped} synchronous tools will run in worker threads")
+        # Per-agent model latency, tokens and cost (see /api/metrics/models)
+        instrument_agent_models(agent)
+        # Failed model calls only reach runner plugins, so they are counted there
+        plugins = ([agent_tracer] if agent_tracer else []) + model_error_plugins()
+        app = App(name=APP_NAME, root_agent=agent, plugins=plugins)
+        runner = _runners.setdefault(persona_type, Runner(app=app, session_service=session_manager.session_service))
+    return runner
+
+# Older turns of long conversations are folded into a summary after each turn
+history_compactor = HistoryCompactor(session_manager) if os.getenv(
+    "AGENT_COMPACTION_ENABLED", "true").lower() != "false" else None
+
+def _schedule_compaction(client_id: str):
+    if history_compactor:
+        history_compactor.schedule(client_id)
+
+# Answers to repeated menu/FAQ-style questions, reused across clients of the same persona
+response_cache = SemanticResponseCache(
+    embed_fn=lambda text: get_gemini_embedding(text, timeout=EMBEDDING_TIMEOUT)
+) if SEMANTIC_CACHE_ENABLED else None
+
+# Partial events with text deltas while the model is generating
+STREAMING_RUN_CONFIG = RunConfig(streaming_mode=StreamingMode.SSE)
+
+def _event_text(event) -> str:
+    """Concatenated visible text of an event (thought parts excluded)."""
+    if not event.content or not event.content.parts:
+        return ''
+    return ''.join(part.text for part in event.content.parts if part.text and not part.thought)
+
+def _resolve_persona_type(persona=None) -> str:
+    """Determine effective persona (frontend > env var > default) as an internal type."""
     effective_persona = persona if persona else os.getenv("LOGIN_ROLE", "user")
-    
-    # Map persona names to internal types
-    persona_mapping = {
-        "Health Official": "health_official",
-        "Community Resident": "user",
-        "health_official": "health_official",
-        "user": "user"
-    }
-    persona_type = persona_mapping.get(effective_persona, "user")
-    
+    persona_type = PERSONA_MAPPING.get(effective_persona, "user")
     print(f"[AGENT] Using persona: {persona_type} (from: {effective_persona})")
+    return persona_type
+
+def _build_user_content(query: str) -> types.Content:
+    """The user's message as sent to the model (context comes from session state)."""
+    return types.Content(role="user", parts=[types.Part(text=query)])
+
+async def _prepare_turn(client_id: str, persona_type: str, location_context=None, time_frame=None):
+    """
+    Per-request setup inside the client's turn lock: store persona, location and
+    time frame in session state (an event is appended only when a value changed).
+    """
+    await session_manager.update_state(client_id, {
+        "persona_type": persona_type,
+        "location_context": location_context or None,
+        "time_frame": time_frame or None,
+    })
+
+def _finish_trace(invocation_id, started_at, agent_started_at, query, client_id, persona_type, answered_by):
+    """Close the turn's trace (no-op when tracing is disabled); returns its summary"""
+    if not agent_tracer:
+        return None
+    return agent_tracer.finish(invocation_id, started_at, agent_started_at, query=query[:200],
+                               client=client_id[:8], persona=persona_type, answered_by=answered_by)
+
+async def call_agent_async(query: str, location_context=None, time_frame=None, persona=None, client_id=None) -> str:
+    """Call the agent with a query and return the final response (runs on the agent event loop)."""
+    logger.info(f"[ROOT AGENT] Starting query processing: '{query[:100]}...'")
+    logger.info(f"[ROOT AGENT] Context - Persona: {persona}, Location: {location_context}, TimeFrame: {time_frame}")
     
-    # Build context string and inject it into the query instead of creating new agent
-    context_prefix = ""
-    
-    # Get time context
-    time_context = get_current_time_context()
-    
-    # Build location context
-    location_info = ""
-    if location_context:
-        location_parts = []
-        if location_context.get('city'):
-            location_parts.append(f"City: {location_context['city']}")
-        if location_context.get('state'):
-            location_parts.append(f"State: {location_context['state']}")
-        if location_context.get('county'):
-            location_parts.append(f"County: {location_context['county']}")
-        if location_context.get('zipCode'):
-            location_parts.append(f"ZIP Code: {location_context['zipCode']}")
+    started_at = time.perf_counter()
+    client_id = client_id or DEFAULT_CLIENT_ID
+    persona_type = _resolve_persona_type(persona)
+    content = _build_user_content(query)
+    runner = _get_runner(persona_type)
+    queued_at = time.perf_counter()
+    
+    # Turns of one client run one at a time; other clients are not blocked
+    async with session_manager.turn(client_id) as (user_id, session_id):
+        locked_at = time.perf_counter()
+        await _prepare_turn(client_id, persona_type, location_context, time_frame)
+        setup = setup_metrics.record(started_at, queued_at, locked_at, time.perf_counter())
         
-        if location_parts:
-            location_info = f"\n[LOCATION CONTEXT: {', '.join(location_parts)}]"
-    
-    # Build time frame context
-    time_frame_info = ""
-    if time_frame:
-        time_frame_info = f"\n[TIME FRAME: {time_frame.get('start_date', '')} to {time_frame.get('end_date', '')}]"
-    
-    # Build persona context
-    persona_info = ""
-    if persona_type == "health_official":
-        persona_info = "\n[USER ROLE: You are speaking with a Health Official who has access to semantic search, analytics, and PSA video generation tools]"
-    else:
-        persona_info = "\n[USER ROLE: You are speaking with a Community Resident who can report issues and get health information]"
-    
-    context_prefix = f"{time_context}{location_info}{time_frame_info}{persona_info}\n\nUser Question: "
-
-    # Pass Persona_type to session state
-    state_change = {"persona_type": persona_type}
-    # --- Create Event with Actions ---
-    actions_with_update = EventActions(state_delta=state_change)
-    # This event might represent an internal system action, not just an agent response
-    system_event = Event(
-        invocation_id="inv_login_update",
-        author="system",  # Or 'agent', 'tool' etc.
-        actions=actions_with_update
-    )
-    # --- Append the Event (This updates the state) ---
-    asyncio.run(_session_service.append_event(_session, system_event))
-    # --- Check Updated State ---
-    updated_session = asyncio.run(_session_service.get_session(app_name=APP_NAME,
-                                                        user_id=USER_ID,
-                                                        session_id=SESSION_ID))
-    print(f"[AGENT] : State after event: {updated_session.state}")
-    
-    # Use the default runner with context injected into query
-    enhanced_query = context_prefix + query if context_prefix else query
-    content = types.Content(role="user", parts=[types.Part(text=enhanced_query)])
-    logger.info(f"[ROOT AGENT] Enhanced query prepared, sending to runner")
-    print(content)
-    events = _runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
-
-    for event in events:
-        if event.is_final_response():
-            logger.info(f"[ROOT AGENT] Received final response from sub-agent")
-            # Check state after invocation for debugging
-            updated_session = asyncio.run(_session_service.get_session(app_name=APP_NAME,
-                                                                       user_id=USER_ID,
-                                                                       session_id=SESSION_ID))
-            print(f"[AGENT] : State after invocation: {updated_session.state}")
-            return event.content.parts[0].text
+        cached = None
+        if response_cache:
+            # The embedding call is blocking I/O; keep it off the shared loop
+            cached = await asyncio.to_thread(response_cache.lookup, query, persona_type, location_context, time_frame)
+            if cached['answer'] is not None:
+                logger.info(f"[ROOT AGENT] Answered from response cache ({cached['category']}, "
+                            f"similarity={cached['similarity']}) in {(time.perf_counter() - started_at) * 1000:.0f}ms")
+                await session_manager.append_exchange(client_id, content, cached['answer'], runner.agent.name)
+                record_turn("response_cache", time.perf_counter() - started_at)
+                _finish_trace(None, started_at, None, query, client_id, persona_type, "response_cache")
+                _schedule_compaction(client_id)
+                return cached['answer']
+        
+        logger.info(f"[ROOT AGENT] Setup {setup * 1000:.1f}ms, sending to runner")
+        agent_started_at = time.perf_counter()
+        model_calls = 0
+        invocation_id = None
+        async with aclosing(runner.run_async(user_id=user_id, session_id=session_id, new_message=content)) as events:
+            async for event in events:
+                invocation_id = event.invocation_id
+                if event.content and event.content.role == "model" and not event.partial:
+                    model_calls += 1
+                if event.is_final_response():
+                    logger.info(f"[ROOT AGENT] Received final response from sub-agent")
+                    answer = event.content.parts[0].text
+                    turn = record_turn(event.author, time.perf_counter() - started_at, event.invocation_id)
+                    logger.info(f"[ROOT AGENT] Turn answered by {event.author}: {turn['model_calls']} model calls, "
+                                f"~${turn['cost']:.5f}")
+                    _finish_trace(invocation_id, started_at, agent_started_at, query, client_id, persona_type, event.author)
+                    if cached is not None:
+                        response_cache.store(cached, query, answer, time.perf_counter() - agent_started_at, model_calls)
+                    _schedule_compaction(client_id)
+                    return answer
+        _finish_trace(invocation_id, started_at, agent_started_at, query, client_id, persona_type, None)
     logger.warning("[ROOT AGENT] No response received from agent")
     return "No response received from agent."
 
 
-def call_agent_stream(query: str, location_context=None, time_frame=None, persona=None):
-    """Generator function that yields agent events for real-time visualization."""
-    global _runner
-    
-    # Initialize runner if not already done
+async def call_agent_stream_async(query: str, location_context=None, time_frame=None, persona=None, client_id=None):
+    """Async generator that yields agent events for real-time visualization (runs on the agent event loop).
+
+    Model output is streamed as 'token' events (text deltas) while it is generated;
+    the complete answer still arrives as 'final_response', followed by a 'metrics' event.
+    """
+    started_at = time.perf_counter()
     logger.info(f"[ROOT AGENT STREAM] Starting query processing: '{query[:100]}...'")
     logger.info(f"[ROOT AGENT STREAM] Context - Persona: {persona}, Location: {location_context}, TimeFrame: {time_frame}")
     
-    _initialize_session_and_runner()
-    
-    # Determine effective persona
-    effective_persona = persona if persona else os.getenv("LOGIN_ROLE", "user")
-    persona_mapping = {
-        "Health Official": "health_official",
-        "Community Resident": "user",
-        "health_official": "health_official",
-        "user": "user"
-    }
-    persona_type = persona_mapping.get(effective_persona, "user")
-    
-    # Build context (same as call_agent)
-    time_context = get_current_time_context()
-    
-    location_info = ""
-    if location_context:
-        location_parts = []
-        if location_context.get('city'):
-            location_parts.append(f"City: {location_context['city']}")
-        if location_context.get('state'):
-            location_parts.append(f"State: {location_context['state']}")
-        if location_context.get('county'):
-            location_parts.append(f"County: {location_context['county']}")
-        if location_context.get('zipCode'):
-            location_parts.append(f"ZIP Code: {location_context['zipCode']}")
-        if location_parts:
-            location_info = f"\n[LOCATION CONTEXT: {', '.join(location_parts)}]"
-    
-    time_frame_info = ""
-    if time_frame:
-        time_frame_info = f"\n[TIME FRAME: {time_frame.get('start_date', '')} to {time_frame.get('end_date', '')}]"
-    
-    persona_info = ""
-    if persona_type == "health_official":
-        persona_info = "\n[USER ROLE: You are speaking with a Health Official who has access to semantic search, analytics, and PSA video generation tools]"
-    else:
-        persona_info = "\n[USER ROLE: You are speaking with a Community Resident who can report issues and get health information]"
-    
-    context_prefix = f"{time_context}{location_info}{time_frame_info}{persona_info}\n\nUser Question: "
-    
-    # Update session state
-    state_change = {"persona_type": persona_type}
-    actions_with_update = EventActions(state_delta=state_change)
-    system_event = Event(
-        invocation_id="inv_login_update",
-        author="system",
-        actions=actions_with_update
-    )
-    asyncio.run(_session_service.append_event(_session, system_event))
-    
-    # Prepare query
-    enhanced_query = context_prefix + query if context_prefix else query
-    content = types.Content(role="user", parts=[types.Part(text=enhanced_query)])
-    logger.info(f"[ROOT AGENT STREAM] Enhanced query prepared, sending to runner")
+    client_id = client_id or DEFAULT_CLIENT_ID
+    persona_type = _resolve_persona_type(persona)
+    content = _build_user_content(query)
+    runner = _get_runner(persona_type)
+    queued_at = time.perf_counter()
     
     # Yield initial event
     yield {
@@ -442,64 +496,144 @@ def call_agent_stream(query: str, location_context=None, time_frame=None, person
         'status': 'Starting agent workflow...'
     }
     
-    # Run and stream events
-    events = _runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
-    
-    for event in events:
-        event_data = {
-            'timestamp': datetime.now().isoformat()
-        }
+    first_token_at = last_token_at = None
+    streamed_chars = chunks = usage_tokens = 0
+    active_agent = None
+    invocation_id = None
+    final_sent = False
+    
+    # Held until the generator finishes or is closed by a disconnecting client; the session is
+    # resolved under the lock, so a reset or eviction while this turn waits cannot break it
+    async with session_manager.turn(client_id) as (user_id, session_id):
+        locked_at = time.perf_counter()
+        await _prepare_turn(client_id, persona_type, location_context, time_frame)
+        setup = setup_metrics.record(started_at, queued_at, locked_at, time.perf_counter())
+        logger.info(f"[ROOT AGENT STREAM] Setup {setup * 1000:.1f}ms, sending to runner")
+        agent_started_at = time.perf_counter()
         
-        # Try to extract agent name from event
-        try:
-            if hasattr(event, 'content') and event.content:
-                # This is likely a response event
-                if event.is_final_response():
-                    event_data['type'] = 'final_response'
-                    event_data['content'] = event.content.parts[0].text if event.content.parts else ''
-                    event_data['status'] = 'Complete'
-                    logger.info(f"[ROOT AGENT STREAM] Final response received")
-                    yield event_data
-                    return
-                else:
-                    # Intermediate response or thinking
-                    event_data['type'] = 'thinking'
-                    event_data['status'] = 'Processing...'
-                    yield event_data
-            
-            # Check if this is an agent transfer
-            if hasattr(event, 'author') and event.author:
-                if event.author not in ['user', 'system']:
-                    event_data['type'] = 'agent_active'
-                    event_data['agent'] = event.author
-                    event_data['status'] = f'{event.author} is working...'
-                    logger.info(f"[ROOT AGENT STREAM] Agent active: {event.author}")
-                    yield event_data
-            
-            # Check for tool calls in event actions
-            if hasattr(event, 'actions') and event.actions:
-                if hasattr(event.actions, 'tool_calls') and event.actions.tool_calls:
-                    for tool_call in event.actions.tool_calls:
-                        tool_name = tool_call.name if hasattr(tool_call, 'name') else 'unknown_tool'
-                        event_data['type'] = 'tool_call'
-                        event_data['tool'] = tool_name
-                        event_data['status'] = f'Calling tool: {tool_name}'
-                        logger.info(f"[ROOT AGENT STREAM] Tool call: {tool_name}")
-                        yield event_data
-        except Exception as e:
-            logger.warning(f"[ROOT AGENT STREAM] Error processing event: {e}")
-            # Continue processing other events
-            continue
+        # Run and stream events (SSE mode: partial events carry text deltas)
+        async with aclosing(runner.run_async(user_id=user_id, session_id=session_id, new_message=content,
+                                             run_config=STREAMING_RUN_CONFIG)) as events:
+            async for event in events:
+                event_data = {
+                    'timestamp': datetime.now().isoformat()
+                }
+                
+                invocation_id = event.invocation_id
+                try:
+                    # Agent transfer (reported once per change, not for every chunk)
+                    if event.author and event.author not in ['user', 'system'] and event.author != active_agent:
+                        active_agent = event.author
+                        logger.info(f"[ROOT AGENT STREAM] Agent active: {event.author}")
+                        yield {
+                            **event_data,
+                            'type': 'agent_active',
+                            'agent': event.author,
+                            'status': f'{event.author} is working...'
+                        }
+                    
+                    if event.partial:
+                        delta = _event_text(event)
+                        if delta:
+                            last_token_at = time.perf_counter()
+                            if first_token_at is None:
+                                first_token_at = last_token_at
+                                logger.info(f"[ROOT AGENT STREAM] First token after {(first_token_at - started_at) * 1000:.0f}ms")
+                            streamed_chars += len(delta)
+                            chunks += 1
+                            event_data['type'] = 'token'
+                            event_data['agent'] = event.author
+                            event_data['content'] = delta
+                            yield event_data
+                        continue
+                    
+                    if event.usage_metadata and event.usage_metadata.candidates_token_count:
+                        usage_tokens += event.usage_metadata.candidates_token_count
+                    
+                    if event.content:
+                        if event.is_final_response():
+                            event_data['type'] = 'final_response'
+                            event_data['content'] = _event_text(event)
+                            event_data['status'] = 'Complete'
+                            logger.info(f"[ROOT AGENT STREAM] Final response received")
+                            final_sent = True
+                            yield event_data
+                            break
+                        
+                        # Check for tool calls
+                        function_calls = event.get_function_calls()
+                        for tool_call in function_calls:
+                            logger.info(f"[ROOT AGENT STREAM] Tool call: {tool_call.name}")
+                            yield {
+                                **event_data,
+                                'type': 'tool_call',
+                                'tool': tool_call.name,
+                                'status': f'Calling tool: {tool_call.name}'
+                            }
+                        if not function_calls:
+                            # Intermediate response or thinking
+                            event_data['type'] = 'thinking'
+                            event_data['status'] = 'Processing...'
+                            yield event_data
+                except Exception as e:
+                    logger.warning(f"[ROOT AGENT STREAM] Error processing event: {e}")
+                    # Continue processing other events
+                    continue
+    
+    _schedule_compaction(client_id)
+    
+    if not final_sent:
+        logger.warning("[ROOT AGENT STREAM] No response received from agent")
+        yield {
+            'type': 'error',
+            'timestamp': datetime.now().isoformat(),
+            'status': 'No response received',
+            'content': 'No response received from agent.'
+        }
     
-    # If we didn't get a final response
-    logger.warning("[ROOT AGENT STREAM] No response received from agent")
+    ended_at = time.perf_counter()
+    turn = record_turn(active_agent or runner.agent.name, ended_at - started_at, invocation_id,
+                       error=None if final_sent else RuntimeError("No response received"))
+    trace = _finish_trace(invocation_id, started_at, agent_started_at, query, client_id, persona_type,
+                          active_agent if final_sent else None)
+    sample = stream_metrics.record(
+        ttft=first_token_at - started_at if first_token_at else None,
+        last_token=last_token_at - started_at if last_token_at else None,
+        duration=ended_at - started_at,
+        tokens=usage_tokens or streamed_chars // 4,
+        chunks=chunks
+    )
+    logger.info(f"[ROOT AGENT STREAM] TTFT={sample['ttft']}, tokens={sample['tokens']}, "
+                f"tokens/s={sample['tokens_per_sec']}, total={sample['duration']:.2f}s")
     yield {
-        'type': 'error',
+        'type': 'metrics',
         'timestamp': datetime.now().isoformat(),
-        'status': 'No response received',
-        'content': 'No response received from agent.'
+        'ttft_ms': round(sample['ttft'] * 1000) if sample['ttft'] is not None else None,
+        'duration_ms': round(sample['duration'] * 1000),
+        'setup_ms': round(setup * 1000, 1),
+        'model_calls': turn['model_calls'],
+        'trace_id': trace['trace_id'] if trace else None,
+        'cost_usd': round(turn['cost'], 6),
+        'tokens': sample['tokens'],
+        'tokens_per_sec': round(sample['tokens_per_sec'], 1) if sample['tokens_per_sec'] else None
     }
 
+def call_agent(query: str, location_context=None, time_frame=None, persona=None, client_id=None) -> str:
+    """Helper function to call the agent with a query and return the response (sync bridge)."""
+    return agent_loop.run(call_agent_async(query, location_context, time_frame, persona, client_id))
+
+
+def call_agent_stream(query: str, location_context=None, time_frame=None, persona=None, client_id=None,
+                      heartbeat: Optional[float] = None):
+    """Iterator of agent events for real-time visualization (sync bridge, paced by the consumer).
+
+    With `heartbeat`, None is yielded when no event arrived for that many seconds.
+    """
+    return agent_loop.iterate(
+        call_agent_stream_async(query, location_context, time_frame, persona, client_id),
+        heartbeat=heartbeat
+    )
+
 # === Interactive Runner ===
 def run_interactive():
     print("🌿 COMMUNITY HEALTH & WELLNESS ASSISTANT 🌿")
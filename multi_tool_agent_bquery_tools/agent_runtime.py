@@ -0,0 +1,278 @@
+"""
+Agent Runtime - long-lived asyncio event loop for the ADK runner
+
+Flask handles requests on plain threads, and the old `call_agent` paths ran
+`asyncio.run(...)` several times per request (each one creating and tearing
+down an event loop) and drove the runner through the synchronous
+`Runner.run`, which starts yet another thread + loop per call.
+
+`AgentEventLoop` owns a single event loop on a daemon thread. The Runner and
+session service live on it, async APIs (`call_agent_async`,
+`call_agent_stream_async`) run there, and sync callers bridge in with
+`run()` (coroutines) or `iterate()` (async generators, pulled one item at a
+time so a slow consumer never lets the producer run ahead).
+
+Because ADK calls synchronous tools directly on the loop, blocking tools
+(BigQuery, HTTP APIs) are moved onto worker threads with
+`run_sync_tools_in_threads`, so one user's tool call does not stall the
+other conversations sharing the loop.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import AsyncIterator, Awaitable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AgentEventLoop:
+    """A dedicated event loop running forever on a daemon thread"""
+
+    def __init__(self, name: str = "adk-agent-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Start the loop thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run_forever, daemon=True, name=self.name)
+            self._thread.start()
+        self._started.wait()
+        logger.info(f"[AGENT LOOP] Event loop thread '{self.name}' started")
+
+    def _run_forever(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._started.set()
+        self._loop.run_forever()
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable[T]) -> "asyncio.Future":
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if self.in_loop_thread():
+            raise RuntimeError("AgentEventLoop.run() called from the loop thread; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[T], heartbeat: Optional[float] = None) -> Iterator[Optional[T]]:
+        """
+        Bridge an async generator to a sync iterator.
+
+        Each `next()` advances the generator by exactly one item on the loop, so
+        the producer is paced by the consumer. With `heartbeat`, None is yielded
+        whenever no item arrived for that many seconds (so SSE responses can send
+        keep-alives during long tool calls). Closing the iterator (e.g. the HTTP
+        client disconnected) cancels the pending step and closes the generator.
+        """
+        holder = {}
+        try:
+            while True:
+                future = self.submit(_anext(agen, holder))
+                while True:
+                    try:
+                        item = future.result(heartbeat)
+                        break
+                    except FutureTimeoutError:
+                        yield None
+                    except StopAsyncIteration:
+                        return
+                yield item
+        finally:
+            try:
+                self.run(_aclose(agen, holder), timeout=5)
+            except Exception as e:
+                logger.warning(f"[AGENT LOOP] Error closing stream: {e}")
+
+    def stop(self):
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+async def _anext(agen, holder):
+    holder['task'] = asyncio.current_task()
+    return await agen.__anext__()
+
+
+async def _aclose(agen, holder):
+    task = holder.get('task')
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+    await agen.aclose()
+
+
+def _offload_to_thread(func):
+    """Async wrapper that runs a blocking tool function in a worker thread"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    wrapper.__signature__ = inspect.signature(func)
+    return wrapper
+
+
+def run_sync_tools_in_threads(agent, _seen=None) -> int:
+    """
+    Replace plain synchronous function tools in an agent tree with thread-offloaded
+    async versions (same name, signature and docstring, so tool declarations are
+    unchanged). Returns the number of tools wrapped.
+    """
+    _seen = _seen if _seen is not None else set()
+    if id(agent) in _seen:
+        return 0
+    _seen.add(id(agent))
+
+    wrapped = 0
+    tools = getattr(agent, "tools", None)
+    if tools:
+        for i, tool in enumerate(tools):
+            if inspect.isfunction(tool) and not inspect.iscoroutinefunction(tool):
+                tools[i] = _offload_to_thread(tool)
+                wrapped += 1
+            elif hasattr(tool, "agent"):
+                # AgentTool: its wrapped agent may have function tools too
+                wrapped += run_sync_tools_in_threads(tool.agent, _seen)
+
+    for sub_agent in getattr(agent, "sub_agents", None) or []:
+        wrapped += run_sync_tools_in_threads(sub_agent, _seen)
+    return wrapped
+
+
+class StreamMetrics:
+    """Rolling time-to-first-token and tokens/sec statistics for streamed agent replies"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.total_streams = 0
+
+    def record(self, ttft: Optional[float], last_token: Optional[float], duration: float,
+               tokens: int, chunks: int):
+        """
+        Args:
+            ttft: Seconds from request start to the first text delta (None if no text streamed)
+            last_token: Seconds from request start to the last text delta
+            duration: Seconds from request start to the end of the stream
+            tokens: Output tokens (model usage metadata, else estimated from characters)
+            chunks: Number of text deltas sent
+        """
+        generation = last_token - ttft if ttft is not None else 0
+        sample = {
+            'ttft': ttft,
+            'duration': duration,
+            'tokens': tokens,
+            'chunks': chunks,
+            'tokens_per_sec': tokens / generation if generation > 0 else None,
+            'finished_at': time.time(),
+        }
+        with self._lock:
+            self._recent.append(sample)
+            self.total_streams += 1
+        return sample
+
+    @staticmethod
+    def _percentiles(values) -> Dict:
+        values = sorted(v for v in values if v is not None)
+        if not values:
+            return {'p50': None, 'p95': None}
+        return {
+            'p50': round(values[len(values) // 2], 3),
+            'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        }
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            recent = list(self._recent)
+            total = self.total_streams
+        return {
+            'total_streams': total,
+            'window': len(recent),
+            'ttft_seconds': self._percentiles(s['ttft'] for s in recent),
+            'tokens_per_sec': self._percentiles(s['tokens_per_sec'] for s in recent),
+            'duration_seconds': self._percentiles(s['duration'] for s in recent),
+        }
+
+
+class SetupMetrics:
+    """Rolling per-request setup time (persona/runner lookup, session and state updates before the model runs)"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._setup = deque(maxlen=window)
+        self._queued = deque(maxlen=window)
+        self.total_requests = 0
+
+    def record(self, started_at: float, queued_at: float, locked_at: float, ready_at: float) -> float:
+        """
+        Args:
+            started_at: perf_counter() when the request entered the agent
+            queued_at: when it started waiting for the client's turn lock
+            locked_at: when the turn lock was acquired
+            ready_at: when the runner is about to be invoked
+
+        Returns the setup time in seconds (excluding the wait for an earlier turn of the same client).
+        """
+        setup = (queued_at - started_at) + (ready_at - locked_at)
+        with self._lock:
+            self._setup.append(setup)
+            self._queued.append(locked_at - queued_at)
+            self.total_requests += 1
+        return setup
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            setup = list(self._setup)
+            queued = list(self._queued)
+            total = self.total_requests
+        return {
+            'total_requests': total,
+            'window': len(setup),
+            'setup_ms': StreamMetrics._percentiles(s * 1000 for s in setup),
+            'turn_wait_ms': StreamMetrics._percentiles(s * 1000 for s in queued),
+        }
+
+
+stream_metrics = StreamMetrics()
+setup_metrics = SetupMetrics()
+
+_agent_loop: Optional[AgentEventLoop] = None
+_agent_loop_lock = threading.Lock()
+
+
+def get_agent_loop() -> AgentEventLoop:
+    """Process-wide agent event loop (started on first use)"""
+    global _agent_loop
+    with _agent_loop_lock:
+        if _agent_loop is None:
+            _agent_loop = AgentEventLoop()
+    return _agent_loop
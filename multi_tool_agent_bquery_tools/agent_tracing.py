@@ -0,0 +1,344 @@
+"""
+Agent Tracing - per-turn spans for agent transfers, model calls and tool calls
+
+`AgentTracer` is an ADK plugin installed on every runner. For each turn it
+records spans with start/end times:
+
+- agent:  an agent's run (root routing, then the sub-agent it transferred to)
+- model:  one model invocation (model name, tokens, errors)
+- tool:   one tool execution with a short summary of its arguments
+          (transfer_to_agent calls show the routing decision)
+
+The caller closes the turn with `finish()`, which adds the whole request and
+its setup time (session/state updates before the runner starts) and moves the
+trace into a bounded history. Traces export in Chrome trace format
+(chrome://tracing, Perfetto), and durations are aggregated into per-agent,
+per-model and per-tool latency histograms.
+
+Agents run through AgentTool start their own invocation; their spans are
+attached to the trace of the tool call that started them.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+logger = logging.getLogger(__name__)
+
+AGENT_TRACING_ENABLED = os.getenv('AGENT_TRACING_ENABLED', 'true').lower() != 'false'
+DEFAULT_HISTORY = int(os.getenv('AGENT_TRACE_HISTORY', '100'))
+MAX_OPEN_TRACES = 200
+ARGS_SUMMARY_CHARS = 200
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# perf_counter() -> epoch microseconds, for Chrome trace timestamps
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+
+# Trace of the tool call currently executing (lets nested AgentTool runs join it)
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar('agent_trace', default=None)
+
+
+def _summarize_args(args: Optional[dict]) -> str:
+    text = json.dumps(args or {}, default=str, ensure_ascii=False)
+    return text if len(text) <= ARGS_SUMMARY_CHARS else text[:ARGS_SUMMARY_CHARS - 3] + '...'
+
+
+class Trace:
+    """Spans of one turn (one root invocation)"""
+
+    def __init__(self, trace_id: str, started_at: float):
+        self.trace_id = trace_id
+        self.started_at = started_at
+        self.ended_at: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.open: Dict[tuple, List[Dict[str, Any]]] = {}  # (kind, key) -> stack of open spans
+        self.meta: Dict[str, Any] = {}
+
+    def begin(self, cat: str, name: str, key, **args) -> Dict[str, Any]:
+        span = {'cat': cat, 'name': name, 'start': time.perf_counter(), 'end': None, 'args': args}
+        self.spans.append(span)
+        self.open.setdefault((cat, key), []).append(span)
+        return span
+
+    def end(self, cat: str, key, **args) -> Optional[Dict[str, Any]]:
+        stack = self.open.get((cat, key))
+        if not stack:
+            return None
+        span = stack.pop()
+        if not stack:
+            del self.open[(cat, key)]
+        span['end'] = time.perf_counter()
+        span['args'].update(args)
+        return span
+
+    def close(self, ended_at: float):
+        """End the turn; spans still open (e.g. the answering agent when the caller stopped early) end here"""
+        for stack in self.open.values():
+            for span in stack:
+                span['end'] = ended_at
+                span['args']['closed_at_turn_end'] = True
+        self.open.clear()
+        self.ended_at = ended_at
+
+    @property
+    def duration_ms(self) -> float:
+        return round(((self.ended_at or time.perf_counter()) - self.started_at) * 1000, 1)
+
+    def summary(self) -> Dict[str, Any]:
+        slowest = max((s for s in self.spans if s['cat'] in ('model', 'tool') and s['end']),
+                      key=lambda s: s['end'] - s['start'], default=None)
+        counts = {}
+        for span in self.spans:
+            counts[span['cat']] = counts.get(span['cat'], 0) + 1
+        return {
+            'trace_id': self.trace_id,
+            'started_at': round(self.started_at + _EPOCH_OFFSET, 3),
+            'duration_ms': self.duration_ms,
+            'spans': counts,
+            'slowest': {'cat': slowest['cat'], 'name': slowest['name'],
+                        'ms': round((slowest['end'] - slowest['start']) * 1000, 1)} if slowest else None,
+            **self.meta,
+        }
+
+    def chrome_events(self, pid: int = 1) -> List[Dict[str, Any]]:
+        """Complete ('X') events; overlapping spans (parallel tools) are spread over extra lanes"""
+        lanes: List[List[float]] = []  # per lane, stack of open span end times
+        events = [{'ph': 'M', 'pid': pid, 'name': 'process_name',
+                   'args': {'name': f"turn {self.trace_id[:12]}: {self.meta.get('query', '')[:60]}"}}]
+        for span in sorted(self.spans, key=lambda s: (s['start'], -(s['end'] or s['start']))):
+            end = span['end'] or self.ended_at or span['start']
+            for tid, stack in enumerate(lanes):
+                while stack and stack[-1] <= span['start']:
+                    stack.pop()
+                if not stack or stack[-1] >= end:
+                    break
+            else:
+                tid = len(lanes)
+                lanes.append([])
+            lanes[tid].append(end)
+            events.append({
+                'name': span['name'],
+                'cat': span['cat'],
+                'ph': 'X',
+                'ts': round((span['start'] + _EPOCH_OFFSET) * 1e6),
+                'dur': round((end - span['start']) * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': span['args'],
+            })
+        return events
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms) with a bounded sample for percentiles"""
+
+    def __init__(self, window: int = 500):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self._recent = deque(maxlen=window)
+
+    def add(self, ms: float, error: bool = False):
+        index = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= bound), len(HISTOGRAM_BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.errors += 1 if error else 0
+        self._recent.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self._recent)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 1) if ordered else None
+
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else None,
+            'p50_ms': pct(50),
+            'p95_ms': pct(95),
+            'max_ms': round(self.max_ms, 1),
+            'buckets': {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class AgentTracer(BasePlugin):
+    """ADK plugin recording agent/model/tool spans per turn"""
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        super().__init__(name='agent_tracer')
+        self._open: "OrderedDict[str, Trace]" = OrderedDict()  # invocation id -> trace
+        self._finished: "OrderedDict[str, Trace]" = OrderedDict()
+        self.history = history
+        self._histograms: Dict[str, Dict[str, LatencyHistogram]] = {'turn': {}, 'agent': {}, 'model': {}, 'tool': {}}
+        self._lock = threading.Lock()
+
+    # --- trace lookup ---
+    def _trace(self, invocation_id: str) -> Optional[Trace]:
+        return self._open.get(invocation_id)
+
+    async def before_run_callback(self, *, invocation_context):
+        invocation_id = invocation_context.invocation_id
+        parent = _current_trace.get()
+        if parent is not None and parent.ended_at is not None:
+            parent = None  # left over from an earlier turn on this task
+        with self._lock:
+            if invocation_id not in self._open:
+                # Nested runs (AgentTool) join the trace of the tool call that started them
+                self._open[invocation_id] = parent or Trace(invocation_id, time.perf_counter())
+                while len(self._open) > MAX_OPEN_TRACES:
+                    self._open.popitem(last=False)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        trace = self._trace(invocation_context.invocation_id)
+        if trace is not None and trace.trace_id != invocation_context.invocation_id:
+            with self._lock:
+                self._open.pop(invocation_context.invocation_id, None)  # nested run done; parent goes on
+        return None
+
+    # --- spans ---
+    async def before_agent_callback(self, *, agent, callback_context):
+        trace = self._trace(callback_context.invocation_id)
+        if trace is not None:
+            trace.begin('agent', agent.name, (callback_context.invocation_id, agent.name))
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        trace = self._trace(callback_context.invocation_id)
+        if trace is not None:
+            trace.end('agent', (callback_context.invocation_id, agent.name))
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        trace = self._trace(callback_context.invocation_id)
+        if trace is not None:
+            trace.begin('model', callback_context.agent_name, (callback_context.invocation_id, callback_context.agent_name),
+                        model=llm_request.model, contents=len(llm_request.contents or []))
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        trace = self._trace(callback_context.invocation_id)
+        if trace is None or llm_response.partial:
+            return None
+        args = {}
+        usage = llm_response.usage_metadata
+        if usage:
+            args.update(input_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count)
+        calls = [part.function_call.name for part in (llm_response.content.parts if llm_response.content else None) or []
+                 if part.function_call]
+        if calls:
+            args['calls'] = calls
+        if llm_response.error_code:
+            args['error'] = f"{llm_response.error_code}: {llm_response.error_message}"
+        trace.end('model', (callback_context.invocation_id, callback_context.agent_name), **args)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        trace = self._trace(callback_context.invocation_id)
+        if trace is not None:
+            trace.end('model', (callback_context.invocation_id, callback_context.agent_name), error=str(error)[:200])
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        trace = self._trace(tool_context.invocation_id)
+        if trace is not None:
+            trace.begin('tool', tool.name, tool_context.function_call_id,
+                        agent=tool_context.agent_name, args=_summarize_args(tool_args))
+            _current_trace.set(trace)
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        trace = self._trace(tool_context.invocation_id)
+        if trace is not None:
+            status = result.get('status') if isinstance(result, dict) else None
+            trace.end('tool', tool_context.function_call_id, **({'status': status} if status else {}))
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        trace = self._trace(tool_context.invocation_id)
+        if trace is not None:
+            trace.end('tool', tool_context.function_call_id, error=str(error)[:200])
+        return None
+
+    # --- turn lifecycle ---
+    def finish(self, invocation_id: Optional[str], started_at: float, setup_done_at: Optional[float] = None,
+               **meta) -> Optional[Dict[str, Any]]:
+        """
+        Close a turn's trace and aggregate its spans.
+
+        Args:
+            invocation_id: ADK invocation id of the turn (None when the runner never started)
+            started_at: perf_counter() when the request entered the agent
+            setup_done_at: perf_counter() when the runner was invoked (adds a 'setup' span)
+            meta: Stored with the trace, e.g. query, client, persona, answered_by
+        Returns the trace summary.
+        """
+        ended_at = time.perf_counter()
+        with self._lock:
+            trace = self._open.pop(invocation_id, None) if invocation_id else None
+            if trace is None:
+                trace = Trace(invocation_id or f"turn-{int(started_at * 1e6)}", started_at)
+            trace.close(ended_at)
+            trace.started_at = min(trace.started_at, started_at)
+            trace.spans.insert(0, {'cat': 'turn', 'name': 'turn', 'start': started_at, 'end': ended_at,
+                                   'args': {'query': meta.get('query', '')}})
+            if setup_done_at is not None:
+                trace.spans.insert(1, {'cat': 'turn', 'name': 'setup', 'start': started_at,
+                                       'end': setup_done_at, 'args': {}})
+            trace.meta.update(meta)
+
+            for span in trace.spans:
+                if span['cat'] == 'turn' and span['name'] != 'turn':
+                    continue
+                histograms = self._histograms[span['cat']]
+                histogram = histograms.get(span['name']) or histograms.setdefault(span['name'], LatencyHistogram())
+                histogram.add((span['end'] - span['start']) * 1000, error='error' in span['args'])
+
+            self._finished[trace.trace_id] = trace
+            while len(self._finished) > self.history:
+                self._finished.popitem(last=False)
+            return trace.summary()
+
+    # --- export ---
+    def recent(self, limit: int = 50, slowest: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._finished.values())
+        if slowest:
+            traces.sort(key=lambda t: t.duration_ms, reverse=True)
+        else:
+            traces.reverse()
+        return [trace.summary() for trace in traces[:limit]]
+
+    def chrome_trace(self, trace_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """One trace (or all recent ones, one process each) in Chrome trace event format"""
+        with self._lock:
+            if trace_id is not None:
+                trace = self._finished.get(trace_id)
+                traces = [trace] if trace else []
+            else:
+                traces = list(self._finished.values())
+        if trace_id is not None and not traces:
+            return None
+        events = []
+        for pid, trace in enumerate(traces, start=1):
+            events.extend(trace.chrome_events(pid))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'traces': [trace.summary() for trace in traces]}}
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        """Latency histograms per turn, agent, model-calling agent and tool"""
+        with self._lock:
+            return {cat: {name: histogram.snapshot() for name, histogram in sorted(by_name.items())}
+                    for cat, by_name in self._histograms.items()}
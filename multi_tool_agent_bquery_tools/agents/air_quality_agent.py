@@ -1,7 +1,8 @@
 from google.adk.agents import Agent
 from ..tools.air_quality_tool import get_air_quality
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_MODEL = model_for("air_quality_agent")
 
 air_quality_agent = Agent(
     name="air_quality_agent",
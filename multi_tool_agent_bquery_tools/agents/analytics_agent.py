@@ -6,8 +6,10 @@ from .analytics_prompts import return_instructions_analytics
 from ..tools.air_quality_tool import get_air_quality
 from ..tools.live_air_quality_tool import get_live_air_quality
 from ..tools.disease_tools import get_infectious_disease_data
+from ..tools.cross_dataset_tool import get_cross_dataset_data
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_MODEL = model_for("analytics_agent")
 
 # Try to use VertexAI code executor, fall back to None if not available
 # (Agent will still work without code executor for basic data retrieval)
@@ -37,5 +39,5 @@ analytics_agent = Agent(
     description="Analytics agent that performs cross-dataset analysis across air quality and disease data. Provides statistical analysis, correlations, and insights.",
     instruction=return_instructions_analytics(),
     code_executor=code_executor,
-    tools=[get_air_quality, get_live_air_quality, get_infectious_disease_data],
+    tools=[get_cross_dataset_data, get_air_quality, get_live_air_quality, get_infectious_disease_data],
 )
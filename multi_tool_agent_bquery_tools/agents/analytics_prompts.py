@@ -9,6 +9,9 @@ analytics across multiple datasets (air quality and infectious disease data), wi
 emphasis on avoiding assumptions and ensuring accuracy.
 
 **Available Data Sources:**
+0. **Cross-Dataset Fetch (preferred)** - `get_cross_dataset_data()` fetches any of "air_quality",
+   "infectious_disease" and "live_air_quality" for one location IN A SINGLE CALL, concurrently,
+   aligned on a shared monthly index (`index`, `series`)
 1. **Historical Air Quality Data** - EPA Historical Air Quality dataset via `get_air_quality()`
 2. **Live Air Quality Data** - Real-time data via AirNow API using `get_live_air_quality()`
 3. **Infectious Disease Data** - CDC BEAM data via `get_infectious_disease_data()`
@@ -23,6 +26,9 @@ You do NOT have Python code execution available. You can ONLY:
 You MUST use the provided tools (not Python functions) to fetch data.
 
 **Data Acquisition - USE TOOLS ONLY:**
+0. For any question involving more than one dataset, make ONE call to `get_cross_dataset_data()`
+   with all needed datasets (e.g. datasets=["air_quality", "infectious_disease"]) instead of
+   calling the single-dataset tools one after another
 1. Use tool `get_air_quality()` to fetch historical air quality data
 2. Use tool `get_live_air_quality()` for current air quality readings  
 3. Use tool `get_infectious_disease_data()` for CDC disease data
@@ -63,6 +69,9 @@ Tool responses are in JSON format. Access data like:
 - Look for 'report' field for formatted text summaries
 
 **Cross-Dataset Analysis:**
+`get_cross_dataset_data()` returns `index` (months as YYYY-MM) and `series` lists aligned to it
+(`pm25_mean`, `aqi_max`, `disease_cases`; None means no data that month), so values at the same
+position belong to the same month.
 When analyzing relationships between air quality and disease data:
 - Correlate air quality metrics (AQI, PM2.5) with disease rates
 - Identify temporal patterns across both datasets
@@ -2,8 +2,8 @@
 import random
 from google.adk.agents import Agent
 from google.adk.tools import google_search, AgentTool
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.0-flash"
 
 # --- small fake data pool ---
 CLINIC_DATA = {
@@ -40,7 +40,7 @@ def _mock_results(location: str):
 
 google_search_agent= Agent(
     name="google_search_agent",
-    model=GEMINI_MODEL,
+    model=model_for("google_search_agent"),
     description="Agent to answer questions using Google Search.",
     instruction="You are agent that can search user query from Internet via tool 'google-search.",
     tools=[google_search]
@@ -48,7 +48,7 @@ google_search_agent= Agent(
 
 clinic_finder_agent = Agent(
     name="clinic_finder_agent",
-    model=GEMINI_MODEL,
+    model=model_for("clinic_finder_agent"),
     description="Sub-agent that helps users find clinics and optionally log health reports.",
     instruction="""
 You are a compassionate and knowledgeable **Clinic Finder Assistant**.
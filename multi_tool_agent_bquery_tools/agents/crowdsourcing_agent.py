@@ -1,7 +1,9 @@
 from google.adk.agents import Agent
 from ..tools.crowdsourcing_tool import report_to_bq, upload_to_gcs
+from ..tools.semantic_query_tool import find_similar_reports
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.5-pro"
+GEMINI_MODEL = model_for("crowdsourcing_agent")
 
 crowdsourcing_agent = Agent(
     name="crowdsourcing_agent",
@@ -20,7 +22,10 @@ crowdsourcing_agent = Agent(
         " - `environmental` → air pollution, smoke, fires, odors, chemical leaks\n"
         " - `weather` → flooding, storms, extreme temperature, heavy rain\n"
         " - `emergency` → accidents, explosions, infrastructure collapse\n"
-        "If uncertain, default to `health`.\n\n"
+        "If uncertain, default to `health`.\n"
+        "• Once you know the location and what happened, you may call `find_similar_reports` (description, state, county, report_type) "
+        "to see whether neighbours already reported it in the last week. If so, mention it briefly (e.g. '3 others nearby reported smoke today') "
+        "and still continue with the report — every report counts.\n\n"
         
         "2️⃣ SELECT SPECIFIC TYPE\n"
         "• Based on the `report_type` you just inferred, you MUST select the *best* matching `specific_type` from the corresponding list below.\n"
@@ -101,5 +106,5 @@ crowdsourcing_agent = Agent(
         " If an image was included, mention that it was uploaded successfully.\n"
         "• Always end with: *Thank you for helping improve community safety!*"
     ),
-    tools=[upload_to_gcs, report_to_bq],
+    tools=[upload_to_gcs, find_similar_reports, report_to_bq],
 )
\ No newline at end of file
@@ -1,7 +1,8 @@
 # ./agents/health_faq_agent.py
 from google.adk.agents import Agent
 from ..tools.health_tools import get_health_faq
-GEMINI_MODEL = "gemini-2.0-flash"
+from ..tools.common_utils import model_for
+GEMINI_MODEL = model_for("health_faq_agent")
 
 health_faq_agent = Agent(
     name="health_faq_agent",
@@ -1,8 +1,10 @@
 # ./agents/health_official_agent.py
 from google.adk.agents import Agent
 from ..tools.semantic_query_tool import semantic_query_reports
+from ..tools.hotspot_tool import get_report_hotspots
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.5-pro"
+GEMINI_MODEL = model_for("health_official_agent")
 
 health_official_agent = Agent(
     name="health_official_agent",
@@ -20,17 +22,22 @@ health_official_agent = Agent(
 
         "Follow these steps:\n"
         "1️⃣ Understand the query semantically (not just keywords). Identify city, county, or state names, possible timeframes, and health or environmental topics.\n"
-        "2️⃣ Call the tool `semantic_query_reports` with the user's full question text to perform vector-based semantic search.\n"
+        "2️⃣ Call the tool `semantic_query_reports` with the user's full question text to perform hybrid keyword + semantic search. "
+        "Pass the scope you identified as filters so only matching reports are ranked: `state`, `county` (e.g. 'Alameda'), "
+        "`severity` (low/moderate/high/critical; 'severe' → 'high'), `report_type` (health/environmental/weather/emergency) "
+        "and `days` ('yesterday' → 1, 'last week' → 7, 'this month' → 30).\n"
         "3️⃣ Use the tool output to compose a concise, structured response for health officials that includes:\n"
         "   - Total number of relevant reports\n"
         "   - Severity breakdown (low/moderate/high/critical)\n"
         "   - Common themes or issues detected\n"
         "   - Locations involved and timestamps if relevant\n"
+        "   For 'what's spiking / unusual / trending' questions, call `get_report_hotspots` (county, state, report_type) "
+        "instead: it compares current report counts with each area's own baseline.\n"
         "4️⃣ If the query mentions timeframes ('last week', 'this month', 'yesterday'), include that in your summary.\n"
         "5️⃣ If no results are found, respond politely: 'No matching reports were found for that region or timeframe.'\n\n"
 
         "When responding, be factual and analytic — your tone should sound like a health data analyst briefing officials. "
         "Do not fabricate data; rely only on tool results."
     ),
-    tools=[semantic_query_reports],
+    tools=[semantic_query_reports, get_report_hotspots],
 )
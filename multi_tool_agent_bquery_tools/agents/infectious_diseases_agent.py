@@ -1,7 +1,8 @@
 from google.adk.agents import Agent
 from ..tools.disease_tools import get_infectious_disease_data
+from ..tools.common_utils import model_for
 
-GEMINI_MODEL = "gemini-2.5-pro"
+GEMINI_MODEL = model_for("infectious_diseases_agent")
 
 infectious_diseases_agent = Agent(
     name="infectious_diseases_agent",
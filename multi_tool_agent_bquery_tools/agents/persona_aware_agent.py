@@ -4,6 +4,7 @@ from google.adk.agents.callback_context import CallbackContext
 from google.adk.tools import AgentTool
 
 import multi_tool_agent_bquery_tools.agent
+from multi_tool_agent_bquery_tools.tools.common_utils import model_for
 
 RESIDENT_PROMPT = """
 You are a health advisor for people who are community resident,
@@ -31,7 +32,7 @@ def before_agent(callback_context: CallbackContext):
 
 persona_aware_agent = LlmAgent(
     name="Personalized_advisor",
-    model='gemini-2.5-flash',
+    model=model_for("Personalized_advisor"),
     description="Health & Wellness Advisor based on persona",
     instruction= instruction_provider,
     before_agent_callback= before_agent, # This is for testing only, delete or comment out for
@@ -5,15 +5,17 @@ Three specialized agents for creating and posting health PSA videos
 This module is isolated and can be developed/tested independently
 """
 from google.adk.agents import Agent
-from typing import List
+from typing import List, Optional
 
+from ..tools.common_utils import model_for
 
-def create_psa_video_agents(model: str, tools_module) -> List[Agent]:
+
+def create_psa_video_agents(model: Optional[str] = None, tools_module=None) -> List[Agent]:
     """
     Factory function to create PSA video generation sub-agents.
     
     Args:
-        model: The Gemini model name (e.g., "gemini-2.0-flash")
+        model: The Gemini model name (default: each agent's route in model_routing_service)
         tools_module: The video_gen and social_media tools
     
     Returns:
@@ -27,7 +29,7 @@ def create_psa_video_agents(model: str, tools_module) -> List[Agent]:
     # AGENT 1: ActionLine Generator
     actionline_agent = Agent(
         name="actionline_agent",
-        model=model,
+        model=model or model_for("actionline_agent"),
         description="Public health recommendation writer - converts health data into single actionable statement",
         instruction=(
             "You are ActionLine, a public-health recommendation writer. "
@@ -60,7 +62,7 @@ def create_psa_video_agents(model: str, tools_module) -> List[Agent]:
     # AGENT 2: Veo Prompt Engineer
     veo_prompt_agent = Agent(
         name="veo_prompt_agent",
-        model=model,
+        model=model or model_for("veo_prompt_agent"),
         description="Prompt engineer that converts action lines into Veo 3 video generation prompts",
         instruction=(
             "You are VeoPrompt, a prompt-engineer specialized in creating prompts "
@@ -100,7 +102,7 @@ def create_psa_video_agents(model: str, tools_module) -> List[Agent]:
     # AGENT 3: Twitter Social Media Manager
     twitter_agent = Agent(
         name="twitter_agent",
-        model=model,
+        model=model or model_for("twitter_agent"),
         description="Social media specialist for posting health PSA videos to Twitter/X",
         instruction=(
             "You are a social media specialist for community health organizations. "
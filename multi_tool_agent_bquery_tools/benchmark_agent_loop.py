@@ -0,0 +1,119 @@
+"""
+Benchmark: per-request event-loop overhead of the ADK call path
+
+Compares the old request path (asyncio.run for append_event + get_session x2,
+then the synchronous Runner.run, which starts a thread and another event loop)
+with the persistent agent event loop (one hop onto the loop thread, session
+bookkeeping and Runner.run_async on the already-running loop).
+
+An echo agent replaces the LLM so only the framework overhead is measured.
+
+Usage:
+    python -m multi_tool_agent_bquery_tools.benchmark_agent_loop [--requests 200] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from .agent_runtime import AgentEventLoop
+from .session_manager import AgentSessionManager
+
+APP_NAME = "benchmark_app"
+
+
+class EchoAgent(BaseAgent):
+    """Answers immediately with the user's text"""
+
+    async def _run_async_impl(self, ctx):
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text="ok")]),
+        )
+
+
+def _message(i: int) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=f"question {i}")])
+
+
+def run_before(requests: int, concurrency: int):
+    """Old path: one global session, asyncio.run per step, synchronous Runner.run"""
+    service = InMemorySessionService()
+    session = asyncio.run(service.create_session(app_name=APP_NAME, user_id="user1234", session_id="1234"))
+    runner = Runner(agent=EchoAgent(name="echo"), app_name=APP_NAME, session_service=service)
+
+    def one_request(i):
+        started = time.perf_counter()
+        asyncio.run(service.append_event(session, Event(
+            invocation_id="inv_login_update", author="system",
+            actions=EventActions(state_delta={"persona_type": "user"})
+        )))
+        asyncio.run(service.get_session(app_name=APP_NAME, user_id="user1234", session_id="1234"))
+        for event in runner.run(user_id="user1234", session_id="1234", new_message=_message(i)):
+            if event.is_final_response():
+                asyncio.run(service.get_session(app_name=APP_NAME, user_id="user1234", session_id="1234"))
+                break
+        return time.perf_counter() - started
+
+    return _measure(one_request, requests, concurrency)
+
+
+def run_after(requests: int, concurrency: int):
+    """New path: per-client sessions on a persistent loop, Runner.run_async"""
+    loop = AgentEventLoop(name="benchmark-loop")
+    manager = AgentSessionManager(APP_NAME)
+    runner = Runner(agent=EchoAgent(name="echo"), app_name=APP_NAME, session_service=manager.session_service)
+
+    async def turn(i):
+        client_id = f"client-{i % max(concurrency, 1)}"
+        user_id, session_id = await manager.get_or_create(client_id)
+        async with manager.turn_lock(client_id):
+            await manager.update_state(client_id, {"persona_type": "user"})
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=_message(i)):
+                if event.is_final_response():
+                    break
+
+    def one_request(i):
+        started = time.perf_counter()
+        loop.run(turn(i))
+        return time.perf_counter() - started
+
+    try:
+        return _measure(one_request, requests, concurrency)
+    finally:
+        loop.stop()
+
+
+def _measure(one_request, requests: int, concurrency: int):
+    one_request(-1)  # warm-up
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one_request, range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'throughput_rps': requests / wall,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    for label, run in (("before (asyncio.run + Runner.run)", run_before),
+                       ("after (persistent loop + run_async)", run_after)):
+        result = run(args.requests, args.concurrency)
+        print(f"{label:40s} mean {result['mean_ms']:7.2f}ms  p50 {result['p50_ms']:7.2f}ms  "
+              f"p95 {result['p95_ms']:7.2f}ms  {result['throughput_rps']:8.1f} req/s")
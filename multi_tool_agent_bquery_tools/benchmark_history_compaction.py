@@ -0,0 +1,111 @@
+"""
+Benchmark: per-turn latency over a long conversation, with and without history compaction
+
+A simulated model replaces Gemini: its latency grows with the prompt it is sent
+(fixed overhead plus a per-token prefill cost) and every answer is a few hundred
+tokens long, like the real assistant's. Without compaction the prompt, and so
+each turn, keeps growing; with compaction older turns are folded into a summary
+(extractive summarizer, no API calls) and per-turn latency stays flat.
+
+Between turns the benchmark waits for background compaction to finish, which
+stands in for the user's reading/typing time.
+
+Usage:
+    python -m multi_tool_agent_bquery_tools.benchmark_history_compaction [--turns 50]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.genai import types
+
+from .history_compaction import SUMMARY_STATE_KEY, HistoryCompactor, extractive_summary
+from .session_manager import AgentSessionManager
+
+APP_NAME = "benchmark_app"
+SYSTEM_PROMPT = "You are a community health assistant. " * 200  # roughly the size of USER_PROMPT
+ANSWER = ("Fine particulate matter (PM2.5) levels in the county were moderate for most of the period, "
+          "with short unhealthy spikes during wildfire weeks; sensitive groups should limit outdoor "
+          "exercise on those days. ") * 8
+
+
+class SimulatedLlm(BaseLlm):
+    """Answers after a delay proportional to the prompt size"""
+    model: str = "simulated"
+    base_ms: float = 20.0
+    ms_per_1k_tokens: float = 15.0
+
+    async def generate_content_async(self, llm_request, stream=False) -> AsyncGenerator[LlmResponse, None]:
+        prompt_chars = len(str(llm_request.config.system_instruction or ''))
+        for content in llm_request.contents:
+            prompt_chars += sum(len(part.text or '') for part in content.parts or [])
+        tokens = prompt_chars / 4
+        await asyncio.sleep((self.base_ms + tokens / 1000 * self.ms_per_1k_tokens) / 1000)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=ANSWER)]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=int(tokens)),
+        )
+
+
+def summary_instruction(context) -> str:
+    summary = context.state.get(SUMMARY_STATE_KEY)
+    return SYSTEM_PROMPT + (f"\nEARLIER IN THIS CONVERSATION:\n{summary}" if summary else "")
+
+
+async def extractive(previous, events):
+    return extractive_summary(previous, events)
+
+
+async def run_conversation(turns: int, compaction: bool):
+    manager = AgentSessionManager(APP_NAME, max_events=100000)
+    compactor = HistoryCompactor(manager, summarizer=extractive) if compaction else None
+    agent = Agent(name="assistant", model=SimulatedLlm(), instruction=summary_instruction)
+    runner = Runner(agent=agent, app_name=APP_NAME, session_service=manager.session_service)
+    user_id, session_id = await manager.get_or_create("client")
+
+    results = []
+    for turn in range(1, turns + 1):
+        message = types.Content(role="user", parts=[types.Part(text=f"Question {turn}: how was the air in 20{turn % 20:02d}?")])
+        started_at = time.perf_counter()
+        prompt_tokens = None
+        async with manager.turn_lock("client"):
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
+                if event.usage_metadata:
+                    prompt_tokens = event.usage_metadata.prompt_token_count
+        results.append((turn, (time.perf_counter() - started_at) * 1000, prompt_tokens))
+        if compactor:
+            compactor.schedule("client")
+            await asyncio.sleep(0)
+            pending = compactor._running.get("client")
+            if pending:
+                await pending
+    return results, compactor.stats() if compactor else None
+
+
+def _report(label, results, stats):
+    print(f"\n{label}")
+    print(f"{'turn':>6} {'latency_ms':>11} {'prompt_tokens':>14}")
+    for turn, latency, tokens in results:
+        if turn == 1 or turn % 10 == 0:
+            print(f"{turn:6d} {latency:11.1f} {tokens:14d}")
+    first, last = results[:10], results[-10:]
+    print(f"mean latency turns 1-10: {statistics.mean(r[1] for r in first):.1f}ms, "
+          f"turns {results[-10][0]}-{results[-1][0]}: {statistics.mean(r[1] for r in last):.1f}ms")
+    if stats:
+        print(f"compactions: {stats['compactions']}, turns folded: {stats['turns_folded']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    for label, compaction in (("without compaction", False), ("with compaction", True)):
+        results, stats = asyncio.run(run_conversation(args.turns, compaction))
+        _report(label, results, stats)
@@ -0,0 +1,244 @@
+"""
+Embedding Cache - reuse text-embedding-004 vectors across searches and backfills
+
+Officials repeat the same semantic searches, the response cache embeds every
+question, and crowdsourced reports often share a description ("smoke from the
+fire", copy-pasted notices). Each of those used to be a Gemini embedding API
+call. `EmbeddingCache` keys vectors on a content hash of the model name and the
+whitespace-normalized text, with two tiers:
+
+- memory: an LRU of up to EMBEDDING_CACHE_MAX_ENTRIES vectors per process
+- disk (optional): a SQLite file of float32 blobs shared by every process on
+  the host (Flask workers, backfill scripts) and kept across restarts, pruned
+  to EMBEDDING_CACHE_DISK_MAX_ENTRIES least recently used rows; set
+  EMBEDDING_CACHE_PATH to an empty string to disable it
+
+`embed(texts, embed_missing)` looks every text up, calls `embed_missing` once
+with the unique misses (duplicates within a batch are embedded once) and stores
+what it returns. Failed embeddings (None) are never cached.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() != 'false'
+DEFAULT_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '5000'))
+DEFAULT_DISK_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_DISK_MAX_ENTRIES', '200000'))
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'embedding_cache.sqlite')
+PRUNE_EVERY = 1000  # disk inserts between size checks
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace differences do not change what a report or question says"""
+    return ' '.join((text or '').split())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-hash keyed embedding store: in-process LRU in front of an optional SQLite tier"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, path: Optional[str] = None,
+                 disk_max_entries: int = DEFAULT_DISK_MAX_ENTRIES):
+        """
+        Args:
+            max_entries: Vectors kept in memory (LRU)
+            path: SQLite file for the persistent tier ('' disables it; default EMBEDDING_CACHE_PATH or data/)
+            disk_max_entries: Rows kept on disk; the least recently used are pruned beyond it
+        """
+        self.max_entries = max_entries
+        self.path = os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_PATH) if path is None else path
+        self.disk_max_entries = disk_max_entries
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._db_lock = threading.Lock()
+        self._inserts_since_prune = 0
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.duplicates = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.evictions = 0
+
+    # --- persistent tier ---
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.path or self._db_failed:
+            return None
+        if self._db is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                db.execute('PRAGMA journal_mode=WAL')  # concurrent readers across processes
+                db.execute('CREATE TABLE IF NOT EXISTS embeddings ('
+                           'key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB, used_at REAL)')
+                db.execute('CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)')
+                db.commit()
+                self._db = db
+            except Exception as e:
+                self._db_failed = True
+                logger.warning(f"[EMBEDDING CACHE] Persistent tier disabled ({self.path}): {e}")
+        return self._db
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._db_lock:
+            db = self._connection()
+            if db is None or not keys:
+                return found
+            try:
+                for i in range(0, len(keys), 500):  # SQLite host-parameter limit
+                    chunk = keys[i:i + 500]
+                    rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                                      chunk).fetchall()
+                    for key, blob in rows:
+                        found[key] = array('f', blob).tolist()
+                if found:
+                    db.executemany('UPDATE embeddings SET used_at = ? WHERE key = ?',
+                                   [(time.time(), key) for key in found])
+                    db.commit()
+            except Exception as e:
+                logger.warning(f"[EMBEDDING CACHE] Disk lookup failed: {e}")
+        return found
+
+    def _disk_put(self, items: Dict[str, List[float]], model: str):
+        with self._db_lock:
+            db = self._connection()
+            if db is None or not items:
+                return
+            try:
+                now = time.time()
+                db.executemany('INSERT OR REPLACE INTO embeddings (key, model, dim, vector, used_at) VALUES (?, ?, ?, ?, ?)',
+                               [(key, model, len(vector), array('f', vector).tobytes(), now)
+                                for key, vector in items.items()])
+                self._inserts_since_prune += len(items)
+                if self._inserts_since_prune >= PRUNE_EVERY:
+                    self._inserts_since_prune = 0
+                    db.execute('DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings '
+                               'ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.disk_max_entries,))
+                db.commit()
+            except Exception as e:
+                logger.warning(f"[EMBEDDING CACHE] Disk write failed: {e}")
+
+    # --- memory tier ---
+    def _remember(self, key: str, vector: List[float]):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # --- public API ---
+    def embed(self, texts: Sequence[str], embed_missing: Callable[[List[str]], List[Optional[List[float]]]],
+              model: str = 'models/text-embedding-004') -> List[Optional[List[float]]]:
+        """
+        Vectors for texts in input order. `embed_missing` is called at most once, with the
+        unique texts found in neither tier, and must return one vector (or None) per text.
+        """
+        keys = [cache_key(text, model) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        with self._lock:
+            self.lookups += len(keys)
+            for key in keys:
+                if key in self._entries and key not in vectors:
+                    self._entries.move_to_end(key)
+                    vectors[key] = self._entries[key]
+                    self.memory_hits += 1
+
+        pending = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if pending:
+            from_disk = self._disk_get(pending)
+            with self._lock:
+                self.disk_hits += len(from_disk)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+            vectors.update(from_disk)
+
+        missing = [key for key in pending if key not in vectors]
+        if missing:
+            text_for = {}
+            for key, text in zip(keys, texts):
+                text_for.setdefault(key, text)
+            embedded = embed_missing([text_for[key] for key in missing])
+            new = {key: list(vector) for key, vector in zip(missing, embedded) if vector is not None}
+            with self._lock:
+                self.misses += len(missing)
+                self.api_calls += 1
+                for key, vector in new.items():
+                    self._remember(key, vector)
+            self._disk_put(new, model)
+            vectors.update(new)
+
+        with self._lock:
+            # Repeats of a text within this call beyond its first lookup
+            self.duplicates += len(keys) - len(set(keys))
+        return [vectors.get(key) for key in keys]
+
+    def embed_one(self, text: str, embed: Callable[[str], List[float]],
+                  model: str = 'models/text-embedding-004') -> List[float]:
+        """Single text; errors from `embed` propagate"""
+        return self.embed([text], lambda missing: [embed(missing[0])], model)[0]
+
+    def clear(self, disk: bool = False):
+        with self._lock:
+            self._entries.clear()
+        if disk:
+            with self._db_lock:
+                db = self._connection()
+                if db is not None:
+                    db.execute('DELETE FROM embeddings')
+                    db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits + self.duplicates
+            stats = {
+                'enabled': EMBEDDING_CACHE_ENABLED,
+                'lookups': self.lookups,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'batch_duplicates': self.duplicates,
+                'misses': self.misses,
+                'hit_rate': round(hits / self.lookups, 3) if self.lookups else None,
+                'texts_not_sent_to_api': hits,
+                'api_requests': self.api_calls,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+                'persistent_path': self.path or None,
+            }
+        with self._db_lock:
+            db = self._connection()
+            if db is not None:
+                try:
+                    stats['disk_entries'] = db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+                except Exception as e:
+                    stats['disk_error'] = str(e)
+        return stats
+
+
+embedding_cache = EmbeddingCache()
+
+
+def cached_embeddings(texts: Sequence[str], embed_missing: Callable[[List[str]], List[Optional[List[float]]]],
+                      model: str = 'models/text-embedding-004') -> List[Optional[List[float]]]:
+    """Shared-cache lookup used by the embedding tools (straight to `embed_missing` when disabled)"""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed_missing(list(texts)) if texts else []
+    return embedding_cache.embed(texts, embed_missing, model)
+
+
+def embedding_cache_stats() -> Dict:
+    return embedding_cache.stats()
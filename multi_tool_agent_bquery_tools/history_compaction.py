@@ -0,0 +1,245 @@
+"""
+History Compaction - keep long agent conversations at a bounded prompt size
+
+Every turn re-sends the session's event history to the model, so without
+compaction each turn of a long conversation is slower and more expensive
+than the one before. After a turn finishes, `HistoryCompactor` checks the
+client's session against a turn budget and an (estimated) token budget. When
+either is exceeded, all but the most recent `keep_turns` turns are folded into
+a short running summary stored in session state ("conversation_summary",
+rendered into the global instruction by the root agent) and their raw events
+are removed from the stored session.
+
+Summarization runs in the background after the reply has been sent; only
+the final swap (drop events, store summary) takes the client's turn lock.
+
+All coroutines must run on the agent event loop (see agent_runtime.py).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from google.adk.events import Event
+
+from .tools.common_utils import model_for, record_request
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_STATE_KEY = "conversation_summary"
+DEFAULT_MAX_TURNS = int(os.getenv('AGENT_COMPACT_AFTER_TURNS', '8'))
+DEFAULT_TOKEN_BUDGET = int(os.getenv('AGENT_COMPACT_TOKEN_BUDGET', '6000'))
+DEFAULT_KEEP_TURNS = int(os.getenv('AGENT_COMPACT_KEEP_TURNS', '3'))
+SUMMARY_MAX_CHARS = int(os.getenv('AGENT_SUMMARY_MAX_CHARS', '2000'))
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = (
+    "You maintain the running memory of a conversation between a user and a community "
+    "health assistant. Update the summary with the new turns below. Keep facts the "
+    "assistant may need later: the user's locations, dates and time frames, diseases "
+    "or pollutants discussed, key numbers from tool results, reports submitted and open "
+    "requests. Drop greetings and menus. Answer with the updated summary only, at most "
+    "150 words.\n\n"
+    "CURRENT SUMMARY:\n{summary}\n\nNEW TURNS:\n{turns}"
+)
+
+
+def _event_text(event: Event) -> str:
+    """Text, function calls and function responses of an event, as the model sees them"""
+    if not event.content or not event.content.parts:
+        return ''
+    pieces = []
+    for part in event.content.parts:
+        if part.text and not part.thought:
+            pieces.append(part.text)
+        elif part.function_call:
+            pieces.append(f"[called {part.function_call.name}({json.dumps(part.function_call.args or {}, default=str)})]")
+        elif part.function_response:
+            pieces.append(f"[{part.function_response.name} returned "
+                          f"{json.dumps(part.function_response.response or {}, default=str)}]")
+    return ' '.join(pieces)
+
+
+def estimate_tokens(events: List[Event]) -> int:
+    return sum(len(_event_text(event)) for event in events) // CHARS_PER_TOKEN
+
+
+def _turn_starts(events: List[Event]) -> List[int]:
+    """Indexes of the user messages that start each turn"""
+    return [i for i, event in enumerate(events) if event.author == 'user' and event.content]
+
+
+def format_turns(events: List[Event], max_chars_per_event: int = 600) -> str:
+    lines = []
+    for event in events:
+        text = _event_text(event)
+        if text:
+            speaker = 'User' if event.author == 'user' else f'Assistant ({event.author})'
+            lines.append(f"{speaker}: {text[:max_chars_per_event]}")
+    return '\n'.join(lines)
+
+
+def _clip(text: str, limit: int) -> str:
+    """Cut text at the last word boundary within `limit` characters"""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(' ', 1)[0] if ' ' in text[:limit] else text[:limit]
+    return cut.rstrip(' ,;:') + '...'
+
+
+def fit_summary(text: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    Trim a summary to max_chars by dropping its oldest entries whole (a "- User asked"
+    bullet with its indented answer, or a line of a model summary); a single entry that
+    is still too long is cut at a word boundary.
+    """
+    entries = []
+    for line in text.splitlines():
+        if line.startswith('  ') and entries:
+            entries[-1].append(line)
+        elif line.strip():
+            entries.append([line])
+    while len(entries) > 1 and len('\n'.join(line for entry in entries for line in entry)) > max_chars:
+        entries.pop(0)
+    return _clip('\n'.join(line for entry in entries for line in entry), max_chars)
+
+
+def extractive_summary(previous: str, events: List[Event]) -> str:
+    """Fallback summary without a model call: the opening of each folded user/assistant message"""
+    lines = [previous] if previous else []
+    for event in events:
+        if event.content and any(part.text for part in event.content.parts or []):
+            text = ' '.join(_event_text(event).split())
+            if event.author == 'user':
+                lines.append(f"- User asked: {_clip(text, 160)}")
+            elif not event.get_function_calls():
+                lines.append(f"  Assistant answered: {_clip(text, 200)}")
+    return fit_summary('\n'.join(lines))
+
+
+def gemini_summarizer(model: Optional[str] = None) -> Callable[[str, List[Event]], Awaitable[str]]:
+    """Summarizer using a small Gemini model, falling back to the extractive summary on errors"""
+    from google import genai
+    from google.genai import types
+
+    client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY'))
+    model = model or model_for('conversation_summary')
+
+    async def summarize(previous: str, events: List[Event]) -> str:
+        prompt = SUMMARY_PROMPT.format(summary=previous or '(none)', turns=format_turns(events))
+        started_at = time.perf_counter()
+        try:
+            response = await client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(temperature=0, max_output_tokens=400),
+            )
+            record_request('conversation_summary', model, time.perf_counter() - started_at, response.usage_metadata)
+            if response.text:
+                return fit_summary(response.text.strip())
+        except Exception as e:
+            record_request('conversation_summary', model, time.perf_counter() - started_at, error=e)
+            logger.warning(f"[COMPACTION] Summary model failed, using extractive summary: {e}")
+        return extractive_summary(previous, events)
+
+    return summarize
+
+
+class HistoryCompactor:
+    """Folds old turns of a client's session into a running summary once a budget is exceeded"""
+
+    def __init__(self, session_manager, summarizer: Optional[Callable[[str, List[Event]], Awaitable[str]]] = None,
+                 max_turns: int = DEFAULT_MAX_TURNS, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 keep_turns: int = DEFAULT_KEEP_TURNS):
+        """
+        Args:
+            session_manager: AgentSessionManager owning the sessions
+            summarizer: async (previous_summary, events) -> new summary (default: Gemini, extractive fallback)
+            max_turns: Compact when the stored history has more user turns than this
+            token_budget: Compact when the stored history is estimated above this many tokens
+            keep_turns: Most recent turns always kept verbatim
+        """
+        self.session_manager = session_manager
+        self.summarizer = summarizer
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self._running: Dict[str, asyncio.Task] = {}
+        self.compactions = 0
+        self.turns_folded = 0
+        self.summary_seconds = 0.0
+
+    def _storage_session(self, client_id: str):
+        manager = self.session_manager
+        with manager._lock:
+            entry = manager._clients.get(client_id)
+        if entry is None:
+            return None
+        return manager.session_service.sessions.get(manager.app_name, {}).get(client_id, {}).get(entry['session_id'])
+
+    def needs_compaction(self, events: List[Event]) -> bool:
+        turns = len(_turn_starts(events))
+        if turns <= self.keep_turns:
+            return False
+        return turns > self.max_turns or estimate_tokens(events) > self.token_budget
+
+    def schedule(self, client_id: str):
+        """Start a background compaction for the client unless one is already running"""
+        task = self._running.get(client_id)
+        if task and not task.done():
+            return
+        self._running[client_id] = asyncio.get_running_loop().create_task(self.maybe_compact(client_id))
+
+    async def maybe_compact(self, client_id: str) -> bool:
+        """Compact the client's history if it is over budget; returns True when it was compacted"""
+        try:
+            storage = self._storage_session(client_id)
+            if storage is None or not self.needs_compaction(storage.events):
+                return False
+
+            events = list(storage.events)
+            starts = _turn_starts(events)
+            cutoff = starts[-self.keep_turns] if self.keep_turns else len(events)
+            folded = events[:cutoff]
+            previous = storage.state.get(SUMMARY_STATE_KEY, '')
+
+            started_at = time.perf_counter()
+            if self.summarizer is None:
+                self.summarizer = gemini_summarizer()
+            summary = await self.summarizer(previous, folded)
+            elapsed = time.perf_counter() - started_at
+
+            folded_ids = {event.id for event in folded}
+            async with self.session_manager.turn_lock(client_id):
+                storage = self._storage_session(client_id)
+                if storage is None:
+                    return False
+                storage.events = [event for event in storage.events if event.id not in folded_ids]
+                await self.session_manager.update_state(client_id, {SUMMARY_STATE_KEY: summary})
+
+            self.compactions += 1
+            self.turns_folded += len(starts) - self.keep_turns
+            self.summary_seconds += elapsed
+            logger.info(f"[COMPACTION] Client {client_id[:8]}: folded {len(folded)} events "
+                        f"({len(starts) - self.keep_turns} turns) into a {len(summary)}-char summary "
+                        f"in {elapsed * 1000:.0f}ms")
+            return True
+        except KeyError:
+            return False  # Session evicted meanwhile
+        except Exception as e:
+            logger.warning(f"[COMPACTION] Failed for client {client_id[:8]}: {e}")
+            return False
+        finally:
+            self._running.pop(client_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            'compactions': self.compactions,
+            'turns_folded': self.turns_folded,
+            'avg_summary_ms': round(self.summary_seconds / self.compactions * 1000, 1) if self.compactions else None,
+            'max_turns': self.max_turns,
+            'token_budget': self.token_budget,
+            'keep_turns': self.keep_turns,
+        }
@@ -0,0 +1,275 @@
+"""
+Semantic Response Cache - reuse agent answers for near-identical questions
+
+Much of the chat traffic is the same few questions ("show me the menu",
+generic hygiene FAQs, "what is AQI"), and each one used to cost a full
+root-agent round trip. `SemanticResponseCache` sits in front of
+`call_agent`: the question is embedded and compared (cosine similarity)
+with previously answered questions in the same scope, and an answer above
+the threshold is returned without running the agent.
+
+Every question is first classified:
+- live:       asks for current/today/nearby data -> never cached
+- action:     submits reports, generates videos/embeddings -> never cached
+- follow_up:  depends on the conversation ("what about 2019?") -> never cached
+- local:      refers to the user's location -> scoped by persona + location + time frame, short TTL
+- general:    location-independent (menu, FAQs, definitions) -> scoped by persona + location, long TTL
+
+Every answer is generated with the asker's location in context, so even general
+answers are only reused for the same location; they never leak it to another user.
+
+Repeated wording is answered from an exact-match index before any embedding call.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Optional: numpy for vectorized similarity (pure Python fallback otherwise)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() != 'false'
+DEFAULT_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.93'))
+DEFAULT_GENERAL_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+DEFAULT_LOCAL_TTL = int(os.getenv('SEMANTIC_CACHE_LOCAL_TTL', '3600'))
+DEFAULT_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '500'))
+EMBEDDING_TIMEOUT = float(os.getenv('SEMANTIC_CACHE_EMBED_TIMEOUT', '3'))
+
+LIVE_PATTERN = re.compile(
+    r"\b(live|current(ly)?|today|tonight|now|right now|this (morning|afternoon|evening|week)|"
+    r"forecast|latest|recent(ly)?|near me|nearby|open now|alert(s)?)\b", re.IGNORECASE)
+ACTION_PATTERN = re.compile(
+    r"\b(submit|report(ing)?|file|generate|create|make|produce|embed(dings?)?|video|psa|"
+    r"campaign|post|tweet|upload|delete|update)\b", re.IGNORECASE)
+FOLLOW_UP_START = re.compile(r"^(and|also|but|what about|how about|same|then|ok(ay)?|yes|no|sure)\b", re.IGNORECASE)
+FOLLOW_UP_REFERENCE = re.compile(r"\b(that|those|them|it|this|these|above|previous|earlier|again|more)\b", re.IGNORECASE)
+FOLLOW_UP_MAX_WORDS = 6  # short questions with a reference only make sense with the conversation
+LOCAL_PATTERN = re.compile(
+    r"\b(my (area|city|county|state|neighborhood|zip)|here|local(ly)?|in (my|our)|county|city|zip|"
+    r"\d{5})\b", re.IGNORECASE)
+
+# Replies that signal a failed turn are never reused
+FAILURE_MARKERS = ("API key is not set up", "cannot fulfill this request", "No response received")
+
+
+def normalize_question(question: str) -> str:
+    return ' '.join(re.sub(r"[^\w\s]", " ", question.casefold()).split())
+
+
+def classify_question(question: str, location_context: Optional[dict] = None) -> str:
+    """Cache category of a question: live, action, follow_up, local or general"""
+    if LIVE_PATTERN.search(question):
+        return 'live'
+    if ACTION_PATTERN.search(question):
+        return 'action'
+    if FOLLOW_UP_START.search(question.strip()) or (
+            len(question.split()) <= FOLLOW_UP_MAX_WORDS and FOLLOW_UP_REFERENCE.search(question)):
+        return 'follow_up'
+    if LOCAL_PATTERN.search(question):
+        return 'local'
+    if location_context:
+        lowered = question.casefold()
+        for key in ('city', 'county', 'state', 'zipCode'):
+            value = location_context.get(key)
+            if value and str(value).casefold() in lowered:
+                return 'local'
+    # Questions naming any other place ("asthma in Texas") are location-specific too
+    if re.search(r"\b(in|for|at|near|around) [A-Z][a-z]+", question):
+        return 'local'
+    return 'general'
+
+
+def location_key(location_context: Optional[dict]) -> str:
+    if not location_context:
+        return '-'
+    parts = [str(location_context.get(k) or '').casefold().strip() for k in ('state', 'county', 'city', 'zipCode')]
+    return '|'.join(parts)
+
+
+def _cosine_scores(query_vector, matrix) -> List[float]:
+    if NUMPY_AVAILABLE:
+        return (matrix @ query_vector).tolist()
+    return [sum(a * b for a, b in zip(row, query_vector)) for row in matrix]
+
+
+def _unit(vector):
+    if NUMPY_AVAILABLE:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector] if norm else list(vector)
+
+
+class SemanticResponseCache:
+    """Per-scope store of (question embedding, answer) pairs with TTLs and an LRU bound"""
+
+    def __init__(self, embed_fn, threshold: float = DEFAULT_THRESHOLD, general_ttl: int = DEFAULT_GENERAL_TTL,
+                 local_ttl: int = DEFAULT_LOCAL_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            embed_fn: text -> embedding vector (raises on failure; the cache is then bypassed)
+            threshold: Minimum cosine similarity for a semantic hit
+            general_ttl: Seconds answers to location-independent questions are reused
+            local_ttl: Seconds answers scoped to a location are reused
+            max_entries: Total answers kept (least recently used dropped first)
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttls = {'general': general_ttl, 'local': local_ttl}
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()  # entry id -> entry, LRU order
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'exact_hits': 0,
+            'semantic_hits': 0,
+            'misses': 0,
+            'bypassed': {},
+            'stored': 0,
+            'embedding_errors': 0,
+            'hit_seconds': 0.0,
+            'miss_seconds': 0.0,
+            'miss_turns': 0,
+            'miss_model_calls': 0,
+        }
+
+    @staticmethod
+    def _scope(persona_type: str, category: str, location_context: Optional[dict],
+               time_frame: Optional[dict]) -> str:
+        location = location_key(location_context)
+        if category != 'local':
+            return f"{persona_type}:{category}:{location}"
+        period = '|'.join(str((time_frame or {}).get(k) or '') for k in ('start_date', 'end_date'))
+        return f"{persona_type}:{category}:{location}:{period}"
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry['expires_at'] <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question: str, persona_type: str, location_context: Optional[dict] = None,
+               time_frame: Optional[dict] = None) -> Dict:
+        """
+        Find a cached answer. Returns a dict with 'answer' (None on miss), 'category',
+        'scope' and, on a miss that may be stored later, the question 'embedding'.
+        Location-scoped answers are also keyed on the selected time frame.
+        """
+        started_at = time.perf_counter()
+        category = classify_question(question, location_context)
+        result = {'answer': None, 'category': category, 'embedding': None, 'similarity': None}
+        if category not in self.ttls:
+            with self._lock:
+                bypassed = self._stats['bypassed']
+                bypassed[category] = bypassed.get(category, 0) + 1
+            return result
+
+        scope = self._scope(persona_type, category, location_context, time_frame)
+        normalized = normalize_question(question)
+        exact_key = hashlib.sha1(f"{scope}\n{normalized}".encode('utf-8')).hexdigest()
+        result.update(scope=scope, exact_key=exact_key)
+
+        now = time.time()
+        with self._lock:
+            self._stats['lookups'] += 1
+            self._expire(now)
+            entry = self._entries.get(exact_key)
+            if entry:
+                self._entries.move_to_end(exact_key)
+                self._stats['exact_hits'] += 1
+                self._stats['hit_seconds'] += time.perf_counter() - started_at
+                result.update(answer=entry['answer'], similarity=1.0)
+                return result
+
+        try:
+            vector = _unit(self.embed_fn(question))
+        except Exception as e:
+            logger.warning(f"[SEMANTIC CACHE] Embedding failed, bypassing cache: {e}")
+            with self._lock:
+                self._stats['embedding_errors'] += 1
+                self._stats['misses'] += 1
+            return result
+        result['embedding'] = vector
+
+        with self._lock:
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry['scope'] == scope]
+            if candidates:
+                if NUMPY_AVAILABLE:
+                    matrix = np.stack([entry['embedding'] for _, entry in candidates])
+                else:
+                    matrix = [entry['embedding'] for _, entry in candidates]
+                scores = _cosine_scores(vector, matrix)
+                best = max(range(len(scores)), key=scores.__getitem__)
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self._stats['semantic_hits'] += 1
+                    self._stats['hit_seconds'] += time.perf_counter() - started_at
+                    result.update(answer=entry['answer'], similarity=round(scores[best], 4))
+                    logger.info(f"[SEMANTIC CACHE] Hit ({scores[best]:.3f}) for '{question[:60]}' "
+                                f"~ '{entry['question'][:60]}'")
+                    return result
+            self._stats['misses'] += 1
+        return result
+
+    def store(self, lookup: Dict, question: str, answer: str, agent_seconds: float, model_calls: int):
+        """Remember the agent's answer for a missed lookup and account for the agent's cost"""
+        with self._lock:
+            self._stats['miss_seconds'] += agent_seconds
+            self._stats['miss_turns'] += 1
+            self._stats['miss_model_calls'] += model_calls
+            if lookup.get('embedding') is None or lookup.get('scope') is None or not answer:
+                return
+            if any(marker in answer for marker in FAILURE_MARKERS):
+                return
+            self._entries[lookup['exact_key']] = {
+                'scope': lookup['scope'],
+                'question': question,
+                'answer': answer,
+                'embedding': lookup['embedding'],
+                'expires_at': time.time() + self.ttls[lookup['category']],
+            }
+            self._entries.move_to_end(lookup['exact_key'])
+            self._stats['stored'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit rates plus estimated agent latency and model calls saved"""
+        with self._lock:
+            s = dict(self._stats, bypassed=dict(self._stats['bypassed']))
+            entries = len(self._entries)
+        hits = s['exact_hits'] + s['semantic_hits']
+        avg_agent = s['miss_seconds'] / s['miss_turns'] if s['miss_turns'] else None
+        avg_calls = s['miss_model_calls'] / s['miss_turns'] if s['miss_turns'] else None
+        avg_hit = s['hit_seconds'] / hits if hits else None
+        return {
+            'entries': entries,
+            'threshold': self.threshold,
+            'lookups': s['lookups'],
+            'exact_hits': s['exact_hits'],
+            'semantic_hits': s['semantic_hits'],
+            'misses': s['misses'],
+            'hit_rate': round(hits / s['lookups'], 3) if s['lookups'] else None,
+            'bypassed': s['bypassed'],
+            'embedding_errors': s['embedding_errors'],
+            'avg_hit_ms': round(avg_hit * 1000, 1) if avg_hit is not None else None,
+            'avg_agent_ms': round(avg_agent * 1000, 1) if avg_agent is not None else None,
+            'estimated_seconds_saved': round(hits * (avg_agent - avg_hit), 2) if hits and avg_agent else 0,
+            'estimated_model_calls_saved': round(hits * avg_calls, 1) if hits and avg_calls else 0,
+        }
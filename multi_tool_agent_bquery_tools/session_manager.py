@@ -0,0 +1,224 @@
+"""
+Agent Session Manager - one ADK session per chat client
+
+Sessions are created lazily the first time a client (browser) sends a message,
+evicted after they have been idle for `ttl` seconds or when more than
+`max_sessions` clients are active (least recently used first), and each stored
+session keeps at most `max_events` events. That cap is a backstop above the
+history compactor's budget: events it drops are folded into the session's
+conversation summary (extractively, no model call) rather than forgotten. Turns for the same client are serialized; different clients run
+concurrently.
+
+All coroutines must run on the agent event loop (see agent_runtime.py).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from .history_compaction import SUMMARY_STATE_KEY, extractive_summary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_TTL = int(os.getenv('AGENT_SESSION_TTL', '1800'))  # 30 minutes idle
+DEFAULT_MAX_SESSIONS = int(os.getenv('AGENT_MAX_SESSIONS', '500'))
+# Hard cap on stored events; well above what AGENT_COMPACT_AFTER_TURNS turns normally produce
+DEFAULT_MAX_EVENTS = int(os.getenv('AGENT_MAX_HISTORY_EVENTS', '120'))
+
+
+def trim_events(events: List[Event], max_events: int) -> List[Event]:
+    """Keep the last `max_events` events, starting at a user message so no tool call is cut in half"""
+    if len(events) <= max_events:
+        return events
+    window = events[-max_events:]
+    for i, event in enumerate(window):
+        if event.author == 'user':
+            return window[i:]
+    return window
+
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    """InMemorySessionService whose stored sessions keep only their most recent events, summarizing the rest"""
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        super().__init__()
+        self.max_events = max_events
+
+    async def append_event(self, session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        # Only the stored copy is trimmed; the in-flight invocation keeps its full context
+        storage_session = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+        if storage_session is not None and self.max_events and len(storage_session.events) > self.max_events:
+            kept = trim_events(storage_session.events, self.max_events)
+            dropped = storage_session.events[:len(storage_session.events) - len(kept)]
+            storage_session.state[SUMMARY_STATE_KEY] = extractive_summary(
+                storage_session.state.get(SUMMARY_STATE_KEY, ''), dropped)
+            storage_session.events = kept
+        return event
+
+
+class AgentSessionManager:
+    """Maps chat client ids to ADK sessions with TTL and LRU eviction"""
+
+    def __init__(self, app_name: str, ttl: int = DEFAULT_SESSION_TTL,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, max_events: int = DEFAULT_MAX_EVENTS):
+        self.app_name = app_name
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.session_service = BoundedInMemorySessionService(max_events)
+        self._clients: "OrderedDict[str, Dict]" = OrderedDict()  # client_id -> entry, LRU order
+        self._lock = threading.Lock()
+
+    async def get_or_create(self, client_id: str) -> Tuple[str, str]:
+        """
+        Return (user_id, session_id) for a client, creating its session if needed.
+
+        Args:
+            client_id: Stable per-browser id (from the signed Flask session cookie)
+        """
+        await self.evict()
+
+        with self._lock:
+            entry = self._clients.get(client_id)
+            if entry:
+                entry['last_used'] = time.time()
+                self._clients.move_to_end(client_id)
+                return client_id, entry['session_id']
+
+        session_id = uuid.uuid4().hex
+        await self.session_service.create_session(
+            app_name=self.app_name, user_id=client_id, session_id=session_id
+        )
+        with self._lock:
+            entry = self._clients.setdefault(client_id, {
+                'session_id': session_id,
+                'created_at': time.time(),
+                'last_used': time.time(),
+                'lock': asyncio.Lock(),
+                'state': {},
+            })
+        if entry['session_id'] != session_id:
+            # Another request for the same client won the race; drop our session
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=client_id, session_id=session_id
+            )
+        else:
+            logger.info(f"[SESSIONS] Created session for client {client_id[:8]} ({len(self._clients)} active)")
+            await self.evict()
+        return client_id, entry['session_id']
+
+    def turn_lock(self, client_id: str) -> asyncio.Lock:
+        """Lock that serializes turns of one client (sessions must exist first)"""
+        with self._lock:
+            return self._clients[client_id]['lock']
+
+    @asynccontextmanager
+    async def turn(self, client_id: str):
+        """
+        Hold the client's turn lock for one turn, yielding (user_id, session_id).
+
+        The session is looked up again once the lock is acquired: if it was reset or
+        evicted while this turn was waiting, a fresh session is created instead of
+        running against a deleted one.
+        """
+        while True:
+            user_id, session_id = await self.get_or_create(client_id)
+            with self._lock:
+                entry = self._clients.get(client_id)
+            if entry is None or entry['session_id'] != session_id:
+                continue
+            async with entry['lock']:
+                with self._lock:
+                    current = self._clients.get(client_id) is entry
+                if current:
+                    yield user_id, session_id
+                    return
+
+    async def update_state(self, client_id: str, state_delta: Dict):
+        """Apply a state delta to the client's session, skipping the event when nothing changed"""
+        with self._lock:
+            entry = self._clients[client_id]
+            changed = {k: v for k, v in state_delta.items() if entry['state'].get(k) != v}
+        if not changed:
+            return
+
+        session = await self.session_service.get_session(
+            app_name=self.app_name, user_id=client_id, session_id=entry['session_id']
+        )
+        await self.session_service.append_event(session, Event(
+            invocation_id=f"state_{uuid.uuid4().hex[:8]}",
+            author="system",
+            actions=EventActions(state_delta=changed)
+        ))
+        entry['state'].update(changed)
+        logger.info(f"[SESSIONS] State for client {client_id[:8]} updated: {changed}")
+
+    async def append_exchange(self, client_id: str, user_content, reply_text: str, author: str):
+        """Record a question and an answer produced outside the runner (e.g. a cached reply) in the history"""
+        with self._lock:
+            entry = self._clients[client_id]
+        session = await self.session_service.get_session(
+            app_name=self.app_name, user_id=client_id, session_id=entry['session_id']
+        )
+        invocation_id = f"cached_{uuid.uuid4().hex[:8]}"
+        await self.session_service.append_event(session, Event(
+            invocation_id=invocation_id, author="user", content=user_content
+        ))
+        await self.session_service.append_event(session, Event(
+            invocation_id=invocation_id, author=author,
+            content=types.Content(role="model", parts=[types.Part(text=reply_text)])
+        ))
+
+    async def evict(self):
+        """Drop sessions idle longer than the TTL, then the least recently used above max_sessions"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for client_id, entry in list(self._clients.items()):
+                over_capacity = len(self._clients) > self.max_sessions
+                if now - entry['last_used'] <= self.ttl and not over_capacity:
+                    break  # LRU order: every later entry is newer
+                if entry['lock'].locked():
+                    continue  # Turn in progress
+                expired.append((client_id, self._clients.pop(client_id)))
+
+        for client_id, entry in expired:
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=client_id, session_id=entry['session_id']
+            )
+            self.session_service.sessions.get(self.app_name, {}).pop(client_id, None)
+        if expired:
+            logger.info(f"[SESSIONS] Evicted {len(expired)} session(s), {len(self._clients)} active")
+
+    async def reset(self, client_id: str):
+        """Forget a client's conversation (its next message starts a new session)"""
+        with self._lock:
+            entry = self._clients.get(client_id)
+        if not entry:
+            return
+        async with entry['lock']:  # Let a running turn finish first
+            with self._lock:
+                if self._clients.get(client_id) is not entry:
+                    return
+                self._clients.pop(client_id)
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=client_id, session_id=entry['session_id']
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active_sessions': len(self._clients),
+                'ttl': self.ttl,
+                'max_sessions': self.max_sessions,
+                'max_events': self.session_service.max_events,
+            }
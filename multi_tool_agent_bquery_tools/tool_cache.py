@@ -0,0 +1,209 @@
+"""
+Tool Cache - memoization for ADK data tools
+
+The router and analytics_agent routinely re-ask a data tool with the same
+arguments in follow-up turns, and every call used to re-run the same BigQuery
+query. `memoize_tool` caches a tool function's result keyed on its normalized
+arguments (defaults applied, whitespace in strings collapsed), with:
+
+- a per-tool TTL (None = never expires, for frozen datasets such as the EPA
+  historical table),
+- an optional `version` callable (e.g. a table's last-modified time), checked
+  at most every `version_check` seconds; when it changes the tool's entries are
+  dropped, so new ingestions are picked up,
+- a per-tool LRU bound on the number of entries,
+- single-flight misses: concurrent identical calls wait for the first one,
+- per-tool hit/miss statistics.
+
+The decorated function keeps its name, signature and docstring, so ADK builds
+the same function declaration for it.
+"""
+import copy
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE_ENABLED = os.getenv('TOOL_CACHE_ENABLED', 'true').lower() != 'false'
+DEFAULT_MAX_ENTRIES = int(os.getenv('TOOL_CACHE_MAX_ENTRIES', '256'))
+
+
+def normalize_arg(value):
+    """
+    Canonical form of a tool argument for cache keys.
+
+    Case is kept: the data tools compare strings case-sensitively, so "los angeles"
+    and "Los Angeles" are different queries. Tools that want case-insensitive hits
+    canonicalize their arguments before calling the memoized function.
+    """
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_arg(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), normalize_arg(v)) for k, v in value.items()))
+    return value
+
+
+class ToolCache:
+    """Bounded, TTL- and version-aware result cache for one tool function"""
+
+    def __init__(self, name: str, ttl: Optional[float] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 version: Optional[Callable[[], object]] = None, version_check: float = 300,
+                 cache_if: Optional[Callable[[object], bool]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version
+        self.version_check = version_check
+        self.cache_if = cache_if
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stored_at, result)
+        self._inflight: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._current_version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self):
+        """Drop all entries when the data version changed (rate-limited)"""
+        if self.version is None or time.time() - self._version_checked_at < self.version_check:
+            return
+        self._version_checked_at = time.time()
+        try:
+            version = self.version()
+        except Exception as e:
+            logger.warning(f"[TOOL CACHE] {self.name}: version check failed: {e}")
+            return
+        if version is None:
+            return
+        if self._current_version is not None and version != self._current_version:
+            logger.info(f"[TOOL CACHE] {self.name}: data changed ({self._current_version} -> {version}), invalidating")
+            self.invalidate()
+        self._current_version = version
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_call(self, key, call):
+        """Return the cached result for key, or call() once (concurrent callers wait) and cache it"""
+        self._check_version()
+        while True:
+            entry = self._lookup(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return copy.deepcopy(entry[1])
+
+            with self._lock:
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            waiting.wait()  # Another thread is computing this key; re-check the cache
+
+        try:
+            result = call()
+            if self.cache_if is None or self.cache_if(result):
+                self._store(key, copy.deepcopy(result))
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'data_version': str(self._current_version) if self._current_version is not None else None,
+            }
+
+
+_tool_caches: Dict[str, ToolCache] = {}
+
+
+def memoize_tool(ttl: Optional[float] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 version: Optional[Callable[[], object]] = None, version_check: float = 300,
+                 cache_if: Optional[Callable[[object], bool]] = None):
+    """
+    Decorator memoizing a tool function on its normalized arguments.
+
+    Args:
+        ttl: Seconds an entry stays valid (None: until evicted or invalidated)
+        max_entries: LRU bound on cached results for this tool
+        version: Callable returning the current data version; entries are dropped when it changes
+        version_check: Minimum seconds between version() calls
+        cache_if: Predicate on the result; results it rejects (errors, demo data) are not cached
+    """
+    def decorator(func):
+        cache = ToolCache(func.__name__, ttl=ttl, max_entries=max_entries, version=version,
+                          version_check=version_check, cache_if=cache_if)
+        _tool_caches[func.__name__] = cache
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TOOL_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple((name, normalize_arg(value)) for name, value in bound.arguments.items())
+            return cache.get_or_call(key, lambda: func(*args, **kwargs))
+
+        wrapper.tool_cache = cache
+        return wrapper
+    return decorator
+
+
+def invalidate_tool_cache(name: Optional[str] = None) -> int:
+    """Drop cached results of one tool (or all tools); returns how many caches were cleared"""
+    caches = [_tool_caches[name]] if name in _tool_caches else [] if name else list(_tool_caches.values())
+    for cache in caches:
+        cache.invalidate()
+    return len(caches)
+
+
+def tool_cache_stats() -> Dict:
+    """Per-tool cache statistics"""
+    return {name: cache.stats() for name, cache in _tool_caches.items()}
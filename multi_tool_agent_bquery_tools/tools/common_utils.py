@@ -1,7 +1,45 @@
 # ./tools/common_utils.py
 import datetime
+import logging
+import os
 from typing import Optional, Tuple
 
+# BigQuery cost/latency metrics live in the app's top-level bigquery_metrics_service
+try:
+    from bigquery_metrics_service import instrument_bigquery_client
+except ImportError:
+    def instrument_bigquery_client(client, tag=None):
+        return client
+
+# Model tiers per agent and per-route latency/cost metrics live in the app's top-level model_routing_service
+try:
+    from model_routing_service import (generative_model, model_for, instrument_agent_models, model_error_plugins,
+                                       record_request, record_turn)
+except ImportError as e:
+    # Without the routing table every agent, including the pro-tier ones, runs on the fast tier
+    logging.getLogger(__name__).warning(
+        f"[MODEL ROUTING] model_routing_service unavailable ({e}); all agents use MODEL_TIER_FAST "
+        f"and model calls are not metered")
+
+    def model_for(route):
+        return os.getenv('MODEL_TIER_FAST', 'gemini-2.5-flash')
+
+    def generative_model(route, **kwargs):
+        import google.generativeai as genai
+        return genai.GenerativeModel(model_for(route), **kwargs)
+
+    def instrument_agent_models(agent, _seen=None):
+        return 0
+
+    def model_error_plugins():
+        return []
+
+    def record_turn(route, elapsed, turn_id=None, error=None):
+        return {'model_calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0.0}
+
+    def record_request(route, model, elapsed, usage=None, error=None):
+        return record_turn(route, elapsed)
+
 # Mapping reused by both modules
 COUNTY_STATE_MAPPING = {
     "Los Angeles": "California", "Cook": "Illinois", "Harris": "Texas",
@@ -0,0 +1,291 @@
+# ./tools/cross_dataset_tool.py
+import os
+import time
+import string
+import calendar
+import google.auth
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+from ..tools.common_utils import infer_state_from_county, instrument_bigquery_client
+from ..tools.disease_tools import BEAM_TABLE, DISEASE_SYNONYMS, _beam_table_version
+from ..tools.live_air_quality_tool import get_live_air_quality
+from ..tools.semantic_query_tool import _state_values
+from ..tool_cache import memoize_tool
+
+try:
+    from epa_pm25_cache_service import get_epa_cache
+    EPA_CACHE_AVAILABLE = True
+except ImportError:
+    EPA_CACHE_AVAILABLE = False
+
+EPA_TABLE = "bigquery-public-data.epa_historical_air_quality.pm25_frm_daily_summary"
+SUPPORTED_DATASETS = ("air_quality", "infectious_disease", "live_air_quality")
+MONTH_NAMES = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTH_NAMES.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+
+def _bigquery_client(tag: str):
+    from google.cloud import bigquery
+
+    application_default_credentials, _ = google.auth.default()
+    return instrument_bigquery_client(bigquery.Client(
+        project=os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c"),
+        credentials=application_default_credentials
+    ), tag=tag)
+
+
+def _month_number(value) -> Optional[int]:
+    """BEAM months may be numbers or names."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text.isdigit():
+        return int(text)
+    return MONTH_NAMES.get(text) or MONTH_NAMES.get(text[:3])
+
+
+def _canonical_place(value: Optional[str]) -> Optional[str]:
+    """EPA place names are Title Case ("Los Angeles"); mixed-case input such as "McDowell" is kept as typed."""
+    if not value or not value.strip():
+        return None
+    value = " ".join(value.split())
+    return string.capwords(value) if value in (value.lower(), value.upper()) else value
+
+
+def _resolve_state(state: str) -> Tuple[str, Optional[str]]:
+    """(EPA state name, BEAM abbreviation) for a state name or code in any case; no abbreviation when unknown."""
+    values = _state_values(" ".join(state.split()))
+    if len(values) == 2:
+        name, abbrev = sorted(values, key=len, reverse=True)
+        return name, abbrev
+    return _canonical_place(state), None
+
+
+# Frozen data, but only non-empty series are kept: callers pass the canonical names the
+# EPA columns use, so an empty result means a misspelled place rather than a cacheable fact
+@memoize_tool(ttl=None, cache_if=lambda r: bool(r["monthly"]))
+def _epa_monthly_series(state: str, county: Optional[str], city: Optional[str], year: int) -> Dict:
+    """Monthly PM2.5 mean, max AQI and sample counts for one location and year (frozen EPA data)."""
+    monthly = {}
+    epa_cache = get_epa_cache() if EPA_CACHE_AVAILABLE else None
+    rows = None
+    if epa_cache:
+        try:
+            rows = epa_cache.query(state=state, county=county, city=city,
+                                   start_date=f"{year}-01-01", end_date=f"{year}-12-31", require_mean=True,
+                                   columns=["date_local", "arithmetic_mean", "aqi"])
+        except Exception as e:
+            print(f"[CROSS DATASET] Local EPA cache failed, using BigQuery: {e}")
+
+    if rows is not None:
+        source = "local_cache"
+        for row in rows:
+            stats = monthly.setdefault(row["date_local"].month, {"sum": 0.0, "samples": 0, "aqi_max": None})
+            stats["sum"] += row["arithmetic_mean"]
+            stats["samples"] += 1
+            if row["aqi"] is not None:
+                stats["aqi_max"] = max(stats["aqi_max"] or 0, row["aqi"])
+        monthly = {m: {"pm25_mean": s["sum"] / s["samples"], "aqi_max": s["aqi_max"], "samples": s["samples"]}
+                   for m, s in monthly.items()}
+    else:
+        from google.cloud import bigquery
+
+        source = "bigquery"
+        conditions = ["state_name = @state", "EXTRACT(YEAR FROM date_local) = @year", "arithmetic_mean IS NOT NULL"]
+        params = [bigquery.ScalarQueryParameter("state", "STRING", state),
+                  bigquery.ScalarQueryParameter("year", "INT64", year)]
+        if county:
+            conditions.append("county_name = @county")
+            params.append(bigquery.ScalarQueryParameter("county", "STRING", county))
+        if city:
+            conditions.append("city_name = @city")
+            params.append(bigquery.ScalarQueryParameter("city", "STRING", city))
+        query = f"""
+        SELECT
+            EXTRACT(MONTH FROM date_local) AS month,
+            AVG(arithmetic_mean) AS pm25_mean,
+            MAX(aqi) AS aqi_max,
+            COUNT(*) AS samples
+        FROM `{EPA_TABLE}`
+        WHERE {' AND '.join(conditions)}
+        GROUP BY month
+        """
+        results = _bigquery_client("tool.get_cross_dataset_data.air_quality").query(
+            query, job_config=bigquery.QueryJobConfig(query_parameters=params)
+        ).result()
+        monthly = {row.month: {"pm25_mean": row.pm25_mean, "aqi_max": row.aqi_max, "samples": row.samples}
+                   for row in results}
+
+    return {"source": source, "monthly": monthly}
+
+
+@memoize_tool(
+    ttl=int(os.getenv("BEAM_CACHE_TTL", "21600")),
+    version=_beam_table_version,
+    version_check=int(os.getenv("BEAM_VERSION_CHECK_SECONDS", "300")),
+)
+def _beam_monthly_series(state_abbrev: str, year: int, disease: Optional[str]) -> Dict:
+    """Monthly isolate counts (total and per pathogen) for one state and year from CDC BEAM."""
+    from google.cloud import bigquery
+
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c")
+    conditions = ["State = @state", "Year = @year"]
+    params = [bigquery.ScalarQueryParameter("state", "STRING", state_abbrev),
+              bigquery.ScalarQueryParameter("year", "INT64", year)]
+    if disease:
+        conditions.append("LOWER(Pathogen) LIKE LOWER(@pathogen)")
+        params.append(bigquery.ScalarQueryParameter("pathogen", "STRING", f"%{disease}%"))
+    query = f"""
+    SELECT Month, Pathogen, SUM(`Number of isolates`) AS cases
+    FROM `{project_id}.{BEAM_TABLE}`
+    WHERE {' AND '.join(conditions)}
+    GROUP BY Month, Pathogen
+    """
+    results = _bigquery_client("tool.get_cross_dataset_data.infectious_disease").query(
+        query, job_config=bigquery.QueryJobConfig(query_parameters=params)
+    ).result()
+
+    monthly, pathogens = {}, {}
+    for row in results:
+        month = _month_number(row.Month)
+        cases = int(row.cases or 0)
+        if month:
+            monthly[month] = monthly.get(month, 0) + cases
+        pathogens[row.Pathogen] = pathogens.get(row.Pathogen, 0) + cases
+    top = sorted(pathogens.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {"source": "bigquery", "monthly": monthly,
+            "top_pathogens": [{"pathogen": name, "cases": cases} for name, cases in top]}
+
+
+def _timed(fetch, *args):
+    started_at = time.perf_counter()
+    try:
+        return {"status": "success", "result": fetch(*args), "elapsed_ms": round((time.perf_counter() - started_at) * 1000)}
+    except Exception as e:
+        print(f"[CROSS DATASET] {getattr(fetch, '__name__', fetch)} failed: {e}")
+        return {"status": "error", "error_message": str(e), "elapsed_ms": round((time.perf_counter() - started_at) * 1000)}
+
+
+def get_cross_dataset_data(datasets: List[str], state: Optional[str] = None, county: Optional[str] = None,
+                           city: Optional[str] = None, year: Optional[int] = None,
+                           disease: Optional[str] = None, live_location: Optional[str] = None) -> dict:
+    """
+    Fetches several datasets for the same location in one call (concurrently) and aligns them
+    on a shared monthly index, for cross-dataset questions such as correlating air quality with
+    disease rates.
+
+    Args:
+        datasets: Any of "air_quality" (EPA historical PM2.5/AQI, data through Nov 2021),
+            "infectious_disease" (CDC BEAM isolates, state level) and "live_air_quality"
+            (current AirNow readings, not part of the monthly index).
+        state: State name or code in any case, e.g. "California" or "CA" (inferred from county when omitted).
+        county: County name without "County", e.g. "Los Angeles" (air quality only).
+        city: City name (air quality only).
+        year: Year for the monthly index; default 2020 when air_quality is requested, else 2025.
+        disease: Optional pathogen filter for infectious_disease, e.g. "Salmonella".
+        live_location: ZIP code or place name for live_air_quality (default: city or county and state).
+
+    Returns:
+        dict with "index" (YYYY-MM months), aligned "series" lists (None where a dataset has no
+        data for a month), "live" readings, per-source status/timing in "sources", and a "report".
+    """
+    try:
+        requested = [d.strip().lower() for d in datasets or [] if d and d.strip()]
+        unknown = [d for d in requested if d not in SUPPORTED_DATASETS]
+        if unknown or not requested:
+            return {
+                "status": "error",
+                "error_message": f"Unknown or missing datasets {unknown or datasets}; choose from {', '.join(SUPPORTED_DATASETS)}."
+            }
+
+        if county and not state:
+            state, is_ambiguous = infer_state_from_county(county)
+            if is_ambiguous:
+                return {"status": "ambiguous",
+                        "error_message": f"County '{county}' exists in multiple states. Please specify the state."}
+        if not state and ("air_quality" in requested or "infectious_disease" in requested):
+            return {"status": "error", "error_message": "Please specify a state for historical datasets."}
+        state_abbrev = None
+        if state:
+            state, state_abbrev = _resolve_state(state)
+        county, city = _canonical_place(county), _canonical_place(city)
+        if "infectious_disease" in requested and not state_abbrev:
+            return {"status": "error", "error_message": f"Unknown state '{state}' for infectious disease data; "
+                                                        f"use a US state name or code, e.g. \"Texas\" or \"TX\"."}
+
+        if year is None:
+            year = 2020 if "air_quality" in requested else 2025
+        if disease:
+            disease = DISEASE_SYNONYMS.get(disease.lower().strip(), disease)
+
+        jobs = {}
+        if "air_quality" in requested:
+            jobs["air_quality"] = (_epa_monthly_series, state, county, city, year)
+        if "infectious_disease" in requested:
+            jobs["infectious_disease"] = (_beam_monthly_series, state_abbrev, year, disease)
+        if "live_air_quality" in requested:
+            place = live_location or ", ".join(p for p in (city or (f"{county} County" if county else None), state) if p)
+            jobs["live_air_quality"] = (get_live_air_quality, place)
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="cross-dataset") as pool:
+            futures = {name: pool.submit(_timed, *job) for name, job in jobs.items()}
+            outcomes = {name: future.result() for name, future in futures.items()}
+        wall_ms = round((time.perf_counter() - started_at) * 1000)
+        print(f"[CROSS DATASET] Fetched {', '.join(jobs)} in {wall_ms}ms "
+              f"(sequential would be ~{sum(o['elapsed_ms'] for o in outcomes.values())}ms)")
+
+        index = [f"{year}-{month:02d}" for month in range(1, 13)]
+        series = {}
+        sources = {}
+        for name, outcome in outcomes.items():
+            sources[name] = {k: v for k, v in outcome.items() if k != "result"}
+            result = outcome.get("result")
+            if name == "air_quality" and result:
+                sources[name]["data_source"] = result["source"]
+                monthly = result["monthly"]
+                series["pm25_mean"] = [round(monthly[m]["pm25_mean"], 2) if m in monthly else None for m in range(1, 13)]
+                series["aqi_max"] = [monthly[m]["aqi_max"] if m in monthly else None for m in range(1, 13)]
+                series["pm25_samples"] = [monthly[m]["samples"] if m in monthly else 0 for m in range(1, 13)]
+            elif name == "infectious_disease" and result:
+                sources[name]["data_source"] = result["source"]
+                monthly = result["monthly"]
+                series["disease_cases"] = [monthly.get(m) for m in range(1, 13)]
+                sources[name]["top_pathogens"] = result["top_pathogens"]
+
+        live = outcomes.get("live_air_quality", {}).get("result")
+
+        location_desc = ", ".join(p for p in (city, f"{county} County" if county else None, state) if p)
+        lines = [f"Cross-dataset data for {location_desc or live_location} ({year}, monthly):"]
+        for name, values in series.items():
+            present = [v for v in values if v is not None]
+            if present and name != "pm25_samples":
+                lines.append(f"- {name}: {len(present)}/12 months with data, "
+                             f"min {min(present)}, max {max(present)}")
+            elif not present:
+                lines.append(f"- {name}: no data for {year}")
+        for name, source in sources.items():
+            if source["status"] != "success":
+                lines.append(f"- {name}: unavailable ({source['error_message']})")
+        if "disease_cases" in series and county:
+            lines.append("- Note: BEAM disease counts are state-level; air quality is filtered to the county.")
+        if live:
+            lines.append(str(live))
+
+        return {
+            "status": "success" if any(s["status"] == "success" for s in sources.values()) else "error",
+            "location": {"state": state, "county": county, "city": city},
+            "index": index,
+            "series": series,
+            "live": live,
+            "sources": sources,
+            "fetch_ms": wall_ms,
+            "report": "\n".join(lines),
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": f"Error retrieving cross-dataset data: {str(e)}"
+        }
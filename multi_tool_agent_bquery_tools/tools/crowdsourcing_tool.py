@@ -3,10 +3,18 @@ from datetime import datetime, timezone
 from typing import Optional, List
 from google.cloud import bigquery, storage
 from google import generativeai as genai
+from .common_utils import generative_model, instrument_bigquery_client
 
 import os, uuid, tempfile, requests
 from google.cloud import storage
 
+# Near-duplicate clusters are shared with /api/submit-report through the app's top-level service
+try:
+    from report_dedup_service import get_report_deduplicator
+    REPORT_DEDUP_AVAILABLE = True
+except ImportError:
+    REPORT_DEDUP_AVAILABLE = False
+
 # Try to import ADK io, but make it optional
 try:
     from google.adk import io as adk_io
@@ -23,7 +31,7 @@ def generate_text_summary(description: str, media_summary: Optional[str] = None)
         return None
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-pro")
+        model = generative_model("report_summary")
         prompt = f"""
         You are a public health summarizer.
         Given the following report description and media summary,
@@ -175,7 +183,8 @@ def report_to_bq(
 
     project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c")
     dataset_id, table_id = "CrowdsourceData", "CrowdSourceData"
-    client = bigquery.Client(project=project_id)
+    # Only inserts today; wrapped so any query added here is tagged like the other tools
+    client = instrument_bigquery_client(bigquery.Client(project=project_id), tag="tool.report_to_bq")
     table_ref = f"{project_id}.{dataset_id}.{table_id}"
 
     inferred_severity = severity or infer_severity(description)
@@ -196,12 +205,27 @@ def report_to_bq(
             attachment_urls.append(gcs_url)
             media_count = 1
 
+    report_id = str(uuid.uuid4())
+    submitted_at = datetime.now(timezone.utc)
+
+    # --- Near-duplicates reuse their cluster's summary ---
+    deduplicator = get_report_deduplicator() if REPORT_DEDUP_AVAILABLE else None
+    dedup = None
+    if deduplicator and description:
+        try:
+            dedup = deduplicator.assign(report_id, description, state, submitted_at, report_type, inferred_severity)
+        except Exception as e:
+            print(f"[DEDUP] Check failed: {e}")
+    if not ai_overall_summary and not ai_media_summary and dedup and dedup["enrichment"]:
+        ai_overall_summary = dedup["enrichment"].get("summary")
+
     # --- Generate overall summary ---
     ai_overall_summary = ai_overall_summary or generate_text_summary(description, ai_media_summary)
+    if dedup and ai_overall_summary and not dedup["enrichment"]:
+        deduplicator.set_enrichment(dedup["cluster_id"], {"summary": ai_overall_summary})
 
     # --- Compose row ---
-    report_id = str(uuid.uuid4())
-    timestamp = datetime.now(timezone.utc).isoformat()
+    timestamp = submitted_at.isoformat()
 
     row = {
         "report_id": report_id,
@@ -245,7 +269,9 @@ def report_to_bq(
         if errors:
             print(f"[ERROR] Insert failed: {errors}")
             return f"⚠️ Error inserting report: {errors}"
-        return f"✅ Report logged successfully (ID: {report_id}) — Severity: {inferred_severity.title()}"
+        duplicate_note = (f" — near-duplicate of report {dedup['duplicate_of']} (cluster {dedup['cluster_id']}, "
+                          f"{dedup['cluster_size']} reports)") if dedup and dedup["is_duplicate"] else ""
+        return f"✅ Report logged successfully (ID: {report_id}) — Severity: {inferred_severity.title()}{duplicate_note}"
     except Exception as e:
         print(f"[ERROR] BigQuery insert failed: {e}")
         return f"⚠️ BigQuery insert error: {e}"
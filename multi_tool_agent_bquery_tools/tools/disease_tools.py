@@ -1,7 +1,8 @@
 import os
 import random
 import google.auth
-from ..tools.common_utils import COUNTY_STATE_MAPPING, infer_state_from_county
+from ..tools.common_utils import COUNTY_STATE_MAPPING, infer_state_from_county, instrument_bigquery_client
+from ..tool_cache import memoize_tool
 from typing import Optional, Tuple, Dict, List
 
 
@@ -19,7 +20,51 @@ DISEASE_SYNONYMS = {
     "shiga toxin producing e coli": "STEC",
 }
 
+BEAM_TABLE = "beam_report_data_folder.beam_report_data"
 
+# CDC BEAM data uses 2-letter state codes
+STATE_ABBREVIATIONS = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR',
+    'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE',
+    'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID',
+    'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
+    'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
+    'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS',
+    'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
+    'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
+    'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
+    'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
+    'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT',
+    'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV',
+    'Wisconsin': 'WI', 'Wyoming': 'WY'
+}
+
+
+def _beam_table_version() -> Optional[str]:
+    """Last-modified time of the BEAM table (metadata only, no bytes scanned); changes on every ingestion."""
+    from google.cloud import bigquery
+    
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c")
+    application_default_credentials, _ = google.auth.default()
+    client = bigquery.Client(project=project_id, credentials=application_default_credentials)
+    modified = client.get_table(f"{project_id}.{BEAM_TABLE}").modified
+    return modified.isoformat() if modified else None
+
+
+def _is_real_data(result: dict) -> bool:
+    """Only BEAM query results are memoized, never errors or mock fallback data."""
+    return result.get("status") == "success" and result.get("data", {}).get("data_source") == "bigquery"
+
+
+# BEAM is refreshed by ingestion: entries are dropped when the table changes (checked
+# at most every BEAM_VERSION_CHECK_SECONDS), with a TTL as a backstop
+@memoize_tool(
+    ttl=int(os.getenv("BEAM_CACHE_TTL", "21600")),
+    max_entries=int(os.getenv("BEAM_CACHE_MAX_ENTRIES", "256")),
+    version=_beam_table_version,
+    version_check=int(os.getenv("BEAM_VERSION_CHECK_SECONDS", "300")),
+    cache_if=_is_real_data,
+)
 def get_infectious_disease_data(county: Optional[str] = None, state: Optional[str] = None, 
                                 disease: Optional[str] = None, year: Optional[int] = None) -> dict:
     """Retrieves infectious disease data from CDC BEAM BigQuery dataset."""
@@ -43,22 +88,7 @@ def get_infectious_disease_data(county: Optional[str] = None, state: Optional[st
         state_abbrev = None
         if state:
             # Map full state name to abbreviation (CDC data uses 2-letter codes)
-            state_map = {
-                'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR',
-                'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE',
-                'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID',
-                'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
-                'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
-                'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS',
-                'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
-                'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
-                'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
-                'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
-                'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT',
-                'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV',
-                'Wisconsin': 'WI', 'Wyoming': 'WY'
-            }
-            state_abbrev = state_map.get(state, state[:2].upper() if len(state) > 2 else state.upper())
+            state_abbrev = STATE_ABBREVIATIONS.get(state, state[:2].upper() if len(state) > 2 else state.upper())
             print(f"[DISEASE] Querying for state: {state} -> {state_abbrev}")
         
         # Query CDC BEAM dataset
@@ -97,7 +127,7 @@ def get_infectious_disease_data(county: Optional[str] = None, state: Optional[st
             Pathogen,
             `Serotype or Species`,
             SUM(`Number of isolates`) as total_cases
-        FROM `{project_id}.beam_report_data_folder.beam_report_data`
+        FROM `{project_id}.{BEAM_TABLE}`
         WHERE {where_clause}
         GROUP BY Year, Month, State, `Source Type`, Pathogen, `Serotype or Species`
         ORDER BY total_cases DESC
@@ -111,10 +141,10 @@ def get_infectious_disease_data(county: Optional[str] = None, state: Optional[st
             application_default_credentials, _ = google.auth.default()
             
             # Use standard BigQuery client (ADK's BigQueryToolset.execute_sql doesn't exist)
-            client = bigquery.Client(
+            client = instrument_bigquery_client(bigquery.Client(
                 project=project_id,
                 credentials=application_default_credentials
-            )
+            ), tag="tool.get_infectious_disease_data")
             
             # Debug: Print the full query
             print(f"[DISEASE] Executing BigQuery query on project: {project_id}")
@@ -184,7 +214,8 @@ Note: Data represents laboratory-confirmed isolates reported to surveillance sys
                     "data": {
                         "location": location_desc,
                         "total_cases": total_cases,
-                        "diseases": report_data
+                        "diseases": report_data,
+                        "data_source": "bigquery"
                     }
                 }
             else:
@@ -230,7 +261,8 @@ Disease Breakdown:"""
                 "data": {
                     "location": location_desc,
                     "total_cases": total_cases,
-                    "diseases": report_data
+                    "diseases": report_data,
+                    "data_source": "mock"
                 }
             }
         
@@ -1,48 +1,341 @@
 # ./tools/embedding_tool.py
 from google.cloud import bigquery
-import requests, json, os
+import requests, json, os, random, threading, time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from ..tools.common_utils import instrument_bigquery_client
+from ..embedding_cache import cached_embeddings
+
+try:
+    from report_vector_index_service import get_report_vector_index, sync_bigquery_quantized
+    REPORT_INDEX_AVAILABLE = True
+except ImportError:
+    REPORT_INDEX_AVAILABLE = False
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+BATCH_EMBED_URL = f"https://generativelanguage.googleapis.com/v1beta/{EMBEDDING_MODEL}:batchEmbedContents"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # API maximum is 100 texts per request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "4"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "30"))
+EMBED_INSERT_CHUNK_SIZE = int(os.getenv("EMBED_INSERT_CHUNK_SIZE", "500"))
+# The watermark follows insertion time (inserted_at, stamped by the Pub/Sub worker; report timestamp
+# for direct inserts, which are written at submit time). Rows inserted after (watermark - overlap)
+# are re-checked, covering clock skew between writers and rows still in the streaming buffer.
+EMBED_BACKFILL_OVERLAP_MINUTES = int(os.getenv("EMBED_BACKFILL_OVERLAP_MINUTES", "60"))
+# Reports whose embedding failed are retried on later runs up to this many times, then given up on
+EMBED_BACKFILL_MAX_ATTEMPTS = int(os.getenv("EMBED_BACKFILL_MAX_ATTEMPTS", "3"))
+# Candidate rows scanned per run; already-embedded ones (most, since the worker embeds on ingest) are skipped
+EMBED_BACKFILL_SCAN_LIMIT = int(os.getenv("EMBED_BACKFILL_SCAN_LIMIT", "5000"))
+# Same bound as the report store: reports arrive at most this long after their report timestamp
+EMBED_BACKFILL_MAX_LATENESS_HOURS = int(os.getenv("REPORT_MAX_LATENESS_HOURS", "168"))
+BACKFILL_COLUMNS = ("report_id, city, state, county, description, severity, report_type, "
+                    "timestamp, contact_name, contact_email, contact_phone, is_anonymous")
+WATERMARK_NAME = "report_embeddings"
+_inserted_at_checked = set()
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _http_session() -> requests.Session:
+    """Shared session so batches reuse pooled HTTPS connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(EMBED_CONCURRENCY, 10))
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _post_with_retries(payload: dict, timeout: float = EMBED_TIMEOUT, max_retries: int = EMBED_MAX_RETRIES) -> dict:
+    """POST to batchEmbedContents, retrying 429/5xx and network errors with exponential backoff and jitter"""
+    headers = {"Content-Type": "application/json", "x-goog-api-key": os.getenv("GEMINI_API_KEY")}
+    for attempt in range(max_retries + 1):
+        try:
+            response = _http_session().post(BATCH_EMBED_URL, headers=headers, data=json.dumps(payload), timeout=timeout)
+            if response.status_code not in RETRYABLE_STATUS:
+                response.raise_for_status()
+                return response.json()
+            error = f"status {response.status_code}"
+            retry_after = response.headers.get("Retry-After")
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            error, retry_after = str(e), None
+        if attempt == max_retries:
+            raise RuntimeError(f"batchEmbedContents failed after {max_retries + 1} attempts: {error}")
+        wait = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** attempt, 30) * (0.5 + random.random())
+        print(f"[EMBEDDINGS] {error} (attempt {attempt + 1}/{max_retries + 1}), retrying in {wait:.1f}s")
+        time.sleep(wait)
+
+
+def _embed_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """Embeddings for one batch; a rejected batch is retried text by text so one bad input only fails itself"""
+    payload = {"requests": [{"model": EMBEDDING_MODEL, "content": {"parts": [{"text": text}]}} for text in texts]}
+    try:
+        return [e["values"] for e in _post_with_retries(payload)["embeddings"]]
+    except requests.exceptions.HTTPError as e:
+        if len(texts) == 1:
+            print(f"[EMBEDDINGS] Text rejected: {e}")
+            return [None]
+        print(f"[EMBEDDINGS] Batch of {len(texts)} rejected ({e}), embedding texts individually")
+        return [vector for text in texts for vector in _embed_batch([text])]
+    except Exception as e:
+        print(f"[EMBEDDINGS] Batch of {len(texts)} failed: {e}")
+        return [None] * len(texts)
+
+
+def embed_texts(texts: List[str], batch_size: int = EMBED_BATCH_SIZE,
+                concurrency: int = EMBED_CONCURRENCY) -> Tuple[List[Optional[List[float]]], dict]:
+    """
+    Embeds many texts with text-embedding-004 batchEmbedContents, `concurrency` batches in flight.
+    Texts already in the shared embedding cache (and repeats within `texts`) are not sent.
+
+    Returns:
+        (vectors in input order, None where embedding failed), stats with timing and throughput
+    """
+    started_at = time.perf_counter()
+    sent = []
+
+    def embed_missing(missing: List[str]) -> List[Optional[List[float]]]:
+        sent.extend(missing)
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches))), thread_name_prefix="embed") as pool:
+            return [vector for batch in pool.map(_embed_batch, batches) for vector in batch]
+
+    vectors = cached_embeddings(texts, embed_missing, EMBEDDING_MODEL)
+    batches = -(-len(sent) // batch_size)
+    elapsed = time.perf_counter() - started_at
+    embedded = sum(1 for v in vectors if v is not None)
+    stats = {
+        "texts": len(texts),
+        "embedded": embedded,
+        "failed": len(texts) - embedded,
+        "cached": len(texts) - len(sent),
+        "batches": batches,
+        "seconds": round(elapsed, 2),
+        "texts_per_sec": round(embedded / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(f"[EMBEDDINGS] {embedded}/{len(texts)} texts ({stats['cached']} cached) in {batches} batches, {elapsed:.2f}s "
+          f"({stats['texts_per_sec']} texts/sec, batch_size={batch_size}, concurrency={concurrency})")
+    return vectors, stats
+
+
+def _read_watermark(bq, state_table: str) -> datetime:
+    """Timestamp up to which every report has been checked (epoch when never run)"""
+    bq.create_table(bigquery.Table(state_table, schema=[
+        bigquery.SchemaField("name", "STRING"),
+        bigquery.SchemaField("watermark", "TIMESTAMP"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP"),
+    ]), exists_ok=True)
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("name", "STRING", WATERMARK_NAME)])
+    rows = list(bq.query(f"SELECT MAX(watermark) AS watermark FROM `{state_table}` WHERE name = @name",
+                         job_config=job_config).result())
+    return (rows[0].watermark if rows and rows[0].watermark else None) or datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _write_watermark(bq, state_table: str, watermark: datetime):
+    query = f"""
+    MERGE `{state_table}` T
+    USING (SELECT @name AS name, @watermark AS watermark) S
+    ON T.name = S.name
+    WHEN MATCHED THEN UPDATE SET watermark = S.watermark, updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (name, watermark, updated_at) VALUES (S.name, S.watermark, CURRENT_TIMESTAMP())
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("name", "STRING", WATERMARK_NAME),
+        bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", watermark),
+    ])
+    bq.query(query, job_config=job_config).result()
+
+
+def _ensure_inserted_at(bq, source: str):
+    """Add CrowdSourceData.inserted_at if missing (metadata-only DDL, once per process)"""
+    if source in _inserted_at_checked:
+        return
+    bq.query(f"ALTER TABLE `{source}` ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMP").result()
+    _inserted_at_checked.add(source)
+
+
+def _record_failures(bq, failures_table: str, failures: dict):
+    """Count an attempt for each failed report_id ({report_id: error}); capped rows are skipped for good"""
+    bq.create_table(bigquery.Table(failures_table, schema=[
+        bigquery.SchemaField("report_id", "STRING"),
+        bigquery.SchemaField("attempts", "INT64"),
+        bigquery.SchemaField("last_error", "STRING"),
+        bigquery.SchemaField("last_attempt_at", "TIMESTAMP"),
+    ]), exists_ok=True)
+    if not failures:
+        return
+    query = f"""
+    MERGE `{failures_table}` T
+    USING (SELECT f.report_id, f.error FROM UNNEST(@failures) AS f) S
+    ON T.report_id = S.report_id
+    WHEN MATCHED THEN UPDATE SET attempts = T.attempts + 1, last_error = S.error, last_attempt_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (report_id, attempts, last_error, last_attempt_at)
+      VALUES (S.report_id, 1, S.error, CURRENT_TIMESTAMP())
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("failures", "STRUCT", [
+        bigquery.StructQueryParameter(None, bigquery.ScalarQueryParameter("report_id", "STRING", report_id),
+                                      bigquery.ScalarQueryParameter("error", "STRING", error[:500]))
+        for report_id, error in failures.items()
+    ])])
+    bq.query(query, job_config=job_config).result()
+
+
+def _retry_ids(bq, failures_table: str, limit: int) -> List[str]:
+    """Failed report_ids still under EMBED_BACKFILL_MAX_ATTEMPTS, least recently tried first"""
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("max_attempts", "INT64", EMBED_BACKFILL_MAX_ATTEMPTS),
+        bigquery.ScalarQueryParameter("limit", "INT64", limit),
+    ])
+    query = f"""
+    SELECT report_id FROM `{failures_table}`
+    WHERE attempts < @max_attempts
+    ORDER BY last_attempt_at
+    LIMIT @limit
+    """
+    return [row.report_id for row in bq.query(query, job_config=job_config).result()]
+
+
+def _known_ids(bq, dest_table: str, failures_table: str, report_ids: List[str]) -> Tuple[set, set]:
+    """(ids already in ReportEmbeddings, ids already in the failure log) among report_ids"""
+    if not report_ids:
+        return set(), set()
+    query = f"""
+    SELECT report_id, TRUE AS embedded FROM `{dest_table}` WHERE report_id IN UNNEST(@ids)
+    UNION ALL
+    SELECT report_id, FALSE AS embedded FROM `{failures_table}` WHERE report_id IN UNNEST(@ids)
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("ids", "STRING", report_ids)])
+    embedded, failed = set(), set()
+    for row in bq.query(query, job_config=job_config).result():
+        (embedded if row.embedded else failed).add(row.report_id)
+    return embedded, failed
+
+
+def _source_rows(bq, source: str, report_ids: List[str]) -> list:
+    """Report rows to retry, looked up by id (skipped when there are none)"""
+    if not report_ids:
+        return []
+    query = f"""
+    SELECT {BACKFILL_COLUMNS}, COALESCE(inserted_at, timestamp) AS ingested_at
+    FROM `{source}`
+    WHERE report_id IN UNNEST(@ids)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) = 1
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("ids", "STRING", report_ids)])
+    return list(bq.query(query, job_config=job_config).result())
+
+
+def _clear_failures(bq, failures_table: str, report_ids: List[str]):
+    """Drop failure records of reports that have since been embedded"""
+    if not report_ids:
+        return
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("ids", "STRING", report_ids)])
+    try:
+        bq.query(f"DELETE FROM `{failures_table}` WHERE report_id IN UNNEST(@ids)", job_config=job_config).result()
+    except Exception as e:
+        print(f"[EMBEDDINGS] Could not clear {len(report_ids)} resolved failure(s): {e}")
+
+
+def _save_watermark(bq, state_table: str, watermark: datetime):
+    try:
+        _write_watermark(bq, state_table, watermark)
+    except Exception as e:
+        print(f"[EMBEDDINGS] Could not save watermark {watermark.isoformat()}: {e}")
+
+
+def _sync_quantized(bq, project: str, report_ids: List[str]):
+    """Add this run's embeddings to ReportEmbeddingsQ8 (the BigQuery search's candidate table)"""
+    if not REPORT_INDEX_AVAILABLE or not report_ids:
+        return
+    try:
+        sync_bigquery_quantized(bq, project, report_ids)
+    except Exception as e:
+        print(f"[EMBEDDINGS] Could not sync the quantized embeddings table: {e}")
 
 
 def generate_report_embeddings(limit: int = 50) -> str:
     """
     Generates and stores text embeddings for new reports from CrowdSourceData
     into ReportEmbeddings table using Gemini text-embedding-004 API.
+    New reports are normally embedded by the Pub/Sub worker on ingest; this
+    backfill covers the remainder inserted since its last watermark, plus earlier
+    failures that have not used up EMBED_BACKFILL_MAX_ATTEMPTS.
     """
-    GEMINI_KEY = os.getenv("GEMINI_API_KEY")
     BQ_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c")
     DATASET = "CrowdsourceData"
     SOURCE = f"{BQ_PROJECT}.{DATASET}.CrowdSourceData"
     DEST = f"{BQ_PROJECT}.{DATASET}.ReportEmbeddings"
+    STATE = f"{BQ_PROJECT}.{DATASET}.EmbeddingBackfillState"
+    FAILURES = f"{BQ_PROJECT}.{DATASET}.EmbeddingBackfillFailures"
 
-    bq = bigquery.Client(project=BQ_PROJECT)
+    bq = instrument_bigquery_client(bigquery.Client(project=BQ_PROJECT), tag="tool.generate_report_embeddings")
+    started_at = time.perf_counter()
 
-    def get_embedding(text: str):
-        url = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
-        headers = {"Content-Type": "application/json", "x-goog-api-key": GEMINI_KEY}
-        payload = {"model": "models/text-embedding-004", "content": {"parts": [{"text": text}]}}
-        r = requests.post(url, headers=headers, json=payload)
-        r.raise_for_status()
-        return r.json()["embedding"]["values"]
-
-    # 1️⃣ Fetch unembedded reports
+    # 1️⃣ Fetch reports inserted since the watermark, and earlier failures still to retry
+    _ensure_inserted_at(bq, SOURCE)
+    _record_failures(bq, FAILURES, {})  # creates the table on first run
+    watermark = _read_watermark(bq, STATE)
+    upper = datetime.now(timezone.utc)  # the watermark moves here once every row up to it is seen
+    retry_ids = _retry_ids(bq, FAILURES, limit)
+    scan_limit = max(limit, EMBED_BACKFILL_SCAN_LIMIT)
+    # Watermark and partition bounds only, so the scan prunes CrowdSourceData's DATE(timestamp) partitions
     query = f"""
-    SELECT report_id, city, state, county, description, severity, report_type,
-        timestamp, contact_name, contact_email, contact_phone, is_anonymous
+    SELECT {BACKFILL_COLUMNS}, COALESCE(inserted_at, timestamp) AS ingested_at
     FROM `{SOURCE}`
-    WHERE report_id NOT IN (SELECT report_id FROM `{DEST}`)
-
-    LIMIT {limit}
+    WHERE timestamp > TIMESTAMP_SUB(@watermark, INTERVAL {EMBED_BACKFILL_OVERLAP_MINUTES + 60 * EMBED_BACKFILL_MAX_LATENESS_HOURS} MINUTE)
+      AND COALESCE(inserted_at, timestamp) > TIMESTAMP_SUB(@watermark, INTERVAL {EMBED_BACKFILL_OVERLAP_MINUTES} MINUTE)
+      AND COALESCE(inserted_at, timestamp) <= @upper
+      AND TRIM(IFNULL(description, '')) != ''
+    ORDER BY ingested_at
+    LIMIT @scan_limit
     """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", watermark),
+        bigquery.ScalarQueryParameter("upper", "TIMESTAMP", upper),
+        bigquery.ScalarQueryParameter("scan_limit", "INT64", scan_limit),
+    ])
+    candidates = list(bq.query(query, job_config=job_config).result())
 
-    rows = bq.query(query).result()
+    # Only these ids are checked against ReportEmbeddings (and the failure log)
+    embedded, failed_before = _known_ids(bq, DEST, FAILURES, retry_ids + [r.report_id for r in candidates])
+    pending = [i for i in retry_ids if i not in embedded]
+    retry_rows = _source_rows(bq, SOURCE, pending)
+    new_rows = [r for r in candidates if r.report_id not in embedded and r.report_id not in failed_before]
+    new_rows = list({r.report_id: r for r in new_rows}.values())  # one embedding per report, latest version
+    slots = max(limit - len(retry_rows), 0)
+    rows = retry_rows + new_rows[:slots]
+    # Embedded since they failed (e.g. by the worker) or no longer in CrowdSourceData
+    found = {r.report_id for r in retry_rows}
+    resolved = [i for i in retry_ids if i in embedded or i not in found]
 
-    rows_to_insert = []
-    success, failed = 0, 0
+    # Everything before the last row taken has been embedded or handed to the retry path
+    if len(new_rows) > slots:
+        new_watermark = max([watermark] + [r.ingested_at for r in new_rows[:slots]])
+    elif len(candidates) >= scan_limit:
+        new_watermark = max(watermark, candidates[-1].ingested_at)
+    else:
+        new_watermark = max(watermark, upper)
+    if not rows:
+        _clear_failures(bq, FAILURES, resolved)
+        _save_watermark(bq, STATE, new_watermark)
+        return f"No new reports to embed (watermark {new_watermark.isoformat()})."
 
-    for r in rows:
-        try:
-            emb = get_embedding(r.description or "")
-            rows_to_insert.append({
+    # 2️⃣ Embed descriptions in concurrent batches
+    vectors, stats = embed_texts([r.description for r in rows])
+
+    rows_to_insert = []
+    failures = {}
+    for r, emb in zip(rows, vectors):
+        if emb is None:
+            failures[r.report_id] = "embedding failed"
+            continue
+        rows_to_insert.append({
             "report_id": r.report_id,
             "city": r.city,
             "state": r.state,
@@ -57,18 +350,52 @@ def generate_report_embeddings(limit: int = 50) -> str:
             "is_anonymous": r.is_anonymous,
             "description_embedding": emb,
         })
+    failed = len(rows) - len(rows_to_insert)
 
-            success += 1
+    # 3️⃣ Insert embeddings into destination table in chunks (keeps each streaming insert request small)
+    insert_errors = []
+    inserted_ids = []
+    index = get_report_vector_index() if REPORT_INDEX_AVAILABLE else None
+    for i in range(0, len(rows_to_insert), EMBED_INSERT_CHUNK_SIZE):
+        chunk = rows_to_insert[i:i + EMBED_INSERT_CHUNK_SIZE]
+        try:
+            # insertId = report_id, the same as the worker's embedding stage
+            errors = bq.insert_rows_json(DEST, chunk, row_ids=[row["report_id"] for row in chunk])
         except Exception as e:
-            failed += 1
-            print(f"⚠️ failed {r.report_id}: {e}")
-
-    # 2️⃣ Insert embeddings into destination table
-    if rows_to_insert:
-        errors = bq.insert_rows_json(DEST, rows_to_insert)
+            errors = [{"chunk": i // EMBED_INSERT_CHUNK_SIZE, "error": str(e)}]
         if errors:
-            return f"⚠️ Insert errors: {errors}"
-    else:
-        return "No new reports to embed."
+            print(f"⚠️ insert chunk {i // EMBED_INSERT_CHUNK_SIZE} failed: {errors}")
+            insert_errors.extend(errors)
+            failures.update((row["report_id"], f"insert failed: {str(errors)[:200]}") for row in chunk)
+            continue
+        inserted_ids.extend(row["report_id"] for row in chunk)
+        if index:
+            # Searchable right away instead of after the index's next refresh
+            try:
+                index.add(chunk)
+            except Exception as e:
+                print(f"[EMBEDDINGS] Could not add chunk to the local index: {e}")
+
+    # 4️⃣ Record failures for a bounded number of retries, then advance the watermark past the batch
+    resolved += [r.report_id for r in retry_rows if r.report_id not in failures]
+    _clear_failures(bq, FAILURES, resolved)
+    try:
+        _record_failures(bq, FAILURES, failures)
+        _save_watermark(bq, STATE, new_watermark)
+    except Exception as e:
+        # Without the failure record, leave the watermark so the failed rows are seen again
+        print(f"[EMBEDDINGS] Could not record {len(failures)} failure(s): {e}")
+
+    # 5️⃣ Quantize the rows inserted by this run into the int8 candidate table
+    _sync_quantized(bq, BQ_PROJECT, inserted_ids)
+
+    elapsed = time.perf_counter() - started_at
+    throughput = f"{elapsed:.1f}s, {len(rows_to_insert) / elapsed:.1f} reports/sec" if elapsed > 0 else f"{elapsed:.1f}s"
+    print(f"[EMBEDDINGS] Embedded {len(rows_to_insert)}/{len(rows)} reports in {throughput} "
+          f"(embedding {stats['seconds']}s at {stats['texts_per_sec']} texts/sec)")
+    if insert_errors:
+        return f"⚠️ Insert errors: {insert_errors[:5]} ({len(insert_errors)} total)"
 
-    return f"✅ Generated embeddings for {success} reports, {failed} failed."
+    return (f"✅ Generated embeddings for {len(rows_to_insert)} reports, {failed} failed "
+            f"(retried up to {EMBED_BACKFILL_MAX_ATTEMPTS} times) ({throughput}). "
+            f"Watermark: {new_watermark.isoformat()}.")
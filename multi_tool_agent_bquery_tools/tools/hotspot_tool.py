@@ -0,0 +1,66 @@
+import os
+import requests
+from typing import Optional, Tuple
+
+from .semantic_query_tool import _state_values
+
+# The single-instance hotspot service (workers/bigquery_worker.py, WORKER_MODE=hotspots)
+# keeps the counters in memory
+HOTSPOT_SERVICE_URL = os.getenv("HOTSPOT_SERVICE_URL", "").rstrip("/")
+
+
+def fetch_hotspots(state: Optional[str] = None, county: Optional[str] = None, report_type: Optional[str] = None,
+                   resolution: Optional[str] = None, include_all: bool = False,
+                   limit: int = 20) -> Tuple[Optional[dict], Optional[str]]:
+    """Hotspots from the worker's detector: (response, error)"""
+    if not HOTSPOT_SERVICE_URL:
+        return None, "Hotspot detection is not configured (set HOTSPOT_SERVICE_URL to the hotspot service URL)."
+    params = {
+        "state": ",".join(_state_values(state) or []),
+        "county": county or "",
+        "report_type": report_type or "",
+        "resolution": resolution or "",
+        "all": "1" if include_all else "",
+        "limit": limit,
+    }
+    try:
+        resp = requests.get(f"{HOTSPOT_SERVICE_URL}/hotspots", params={k: v for k, v in params.items() if v},
+                            timeout=5)
+        resp.raise_for_status()
+        return resp.json(), None
+    except Exception as e:
+        return None, f"Hotspot service unavailable: {e}"
+
+
+def get_report_hotspots(county: Optional[str] = None, state: Optional[str] = None,
+                        report_type: Optional[str] = None) -> str:
+    """
+    Finds what is spiking right now in community reports: areas (county or ~5 km cell) whose report
+    count in the current hour or day is far above their own recent baseline.
+
+    Args:
+        county: Only this county (e.g. "Alameda")
+        state: Only this state (name or 2-letter code)
+        report_type: health, environmental, weather or emergency (default: all reports)
+    """
+    data, error = fetch_hotspots(state, county, report_type)
+    if error:
+        return f"⚠️ {error}"
+
+    area = ", ".join(v for v in (county, state) if v) or "any monitored area"
+    hotspots = data.get("hotspots") or []
+    if not hotspots:
+        return f"No unusual spikes in community reports for {area} right now."
+
+    lines = [f"🔥 {len(hotspots)} report spike(s) for {area}:"]
+    for h in hotspots:
+        place = h.get("county") or h.get("city") or "Unknown"
+        where = f"{place}, {h.get('state') or ''}"
+        if h["cell"].startswith("geohash:"):
+            where += f" (~5 km cell {h['cell'].split(':', 1)[1]})"
+        lines.append(
+            f"- {where} | {h['report_type'] if h['report_type'] != '*' else 'all types'} | "
+            f"{h['count']} reports this {h['resolution']} (from {h['bucket_start']}) vs ~{h['expected']} expected "
+            f"(z={h['z_score']}, p={h['p_value']:.1e})"
+        )
+    return "\n".join(lines)
@@ -2,15 +2,41 @@
 import os
 import json
 import requests
-from typing import List
+from typing import List, Optional, Tuple
 from google.cloud import bigquery
+from ..tools.common_utils import instrument_bigquery_client
+from ..embedding_cache import cached_embeddings
 
+# BigQuery fallback: candidates scored on ReportEmbeddingsQ8, this many times top_k re-ranked exactly
+BQ_RERANK_FACTOR = int(os.getenv("REPORT_INDEX_RERANK_FACTOR", "5"))
 
-def get_gemini_embedding(text: str) -> List[float]:
+try:
+    from report_vector_index_service import get_report_vector_index, quantized_candidates_sql
+    REPORT_INDEX_AVAILABLE = True
+except ImportError:
+    REPORT_INDEX_AVAILABLE = False
+
+try:
+    from report_search_service import get_report_search, since_days
+    REPORT_SEARCH_AVAILABLE = True
+except ImportError:
+    REPORT_SEARCH_AVAILABLE = False
+
+# Reports store the state as typed ("California" or "CA"), so filters match both spellings
+from .disease_tools import STATE_ABBREVIATIONS
+STATE_NAMES = {abbrev: name for name, abbrev in STATE_ABBREVIATIONS.items()}
+
+
+def get_gemini_embedding(text: str, timeout: Optional[float] = None) -> List[float]:
     """
     Generates text embeddings using the Gemini API (text-embedding-004).
     Requires an API key with access to the Generative Language API.
+    Repeated texts are served from the shared embedding cache.
     """
+    return cached_embeddings([text], lambda missing: [_request_embedding(missing[0], timeout)])[0]
+
+
+def _request_embedding(text: str, timeout: Optional[float] = None) -> List[float]:
     GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 
     url = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
@@ -21,7 +47,7 @@ def get_gemini_embedding(text: str) -> List[float]:
     }
 
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout)
         response.raise_for_status()
         data = response.json()
         return data["embedding"]["values"]
@@ -29,23 +55,96 @@ def get_gemini_embedding(text: str) -> List[float]:
         raise RuntimeError(f"Error generating embedding via Gemini API: {e}")
 
 
-def semantic_query_reports(user_query: str, top_k: int = 10) -> str:
+def _state_values(state: Optional[str]) -> Optional[List[str]]:
+    if not state:
+        return None
+    state = state.strip()
+    if state.upper() in STATE_NAMES:
+        return [state.upper(), STATE_NAMES[state.upper()]]
+    name = state.title()
+    return [name, STATE_ABBREVIATIONS[name]] if name in STATE_ABBREVIATIONS else [state]
+
+
+def _county_values(county: Optional[str]) -> Optional[List[str]]:
+    if not county:
+        return None
+    base = county.strip().lower()
+    base = base[:-len(" county")] if base.endswith(" county") else base
+    return [base, f"{base} county"]
+
+
+def search_reports(user_query: str, top_k: int = 10, state: Optional[str] = None, county: Optional[str] = None,
+                   severity: Optional[str] = None, report_type: Optional[str] = None,
+                   days: Optional[int] = None) -> Tuple[Optional[List[dict]], Optional[str]]:
     """
-    Returns semantically similar reports from BigQuery using Gemini embeddings API.
-    Works even without Vertex AI permissions.
+    Hybrid (BM25 + vector) search over embedded reports with the filters applied before ranking.
+    Returns (rows, error); rows carry report metadata plus 'similarity' when a vector ranked them.
     """
     project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "qwiklabs-gcp-00-4a7d408c735c")
     dataset = "CrowdsourceData"
-    table = "CrowdSourceData"
-    client = bigquery.Client(project=project_id)
+    states, counties = _state_values(state), _county_values(county)
 
     # 1️⃣ Generate the embedding via Gemini API key
     try:
-        qvec = get_gemini_embedding(user_query)
+        qvec, embed_error = get_gemini_embedding(user_query), None
     except Exception as e:
-        return f"⚠️ {e}"
+        qvec, embed_error = None, str(e)
+
+    # 2️⃣ Filtered hybrid search on the local index (milliseconds); BigQuery is the cold fallback
+    index = get_report_vector_index() if REPORT_INDEX_AVAILABLE else None
+    if index:
+        index.maybe_refresh(lambda: instrument_bigquery_client(
+            bigquery.Client(project=project_id), tag="tool.semantic_query_reports.index_refresh"), project_id)
+        search = get_report_search() if REPORT_SEARCH_AVAILABLE else None
+        if index.is_ready and search is not None:
+            try:
+                result = search.search(user_query, qvec, top_k, since=since_days(days), state=states,
+                                       county=counties, severity=severity, report_type=report_type)
+                return result["results"], None
+            except Exception as e:
+                print(f"[SEMANTIC SEARCH] Local hybrid search failed, using BigQuery: {e}")
+    if qvec is None:
+        return None, embed_error
 
-    qvec_str = ", ".join(str(v) for v in qvec)  # convert Python list to comma-separated floats
+    client = instrument_bigquery_client(bigquery.Client(project=project_id), tag="tool.semantic_query_reports")
+    params = [
+        bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", qvec),
+        bigquery.ScalarQueryParameter("top_k", "INT64", top_k),
+    ]
+    conditions = []
+    if states:
+        conditions.append("LOWER(state) IN UNNEST(@states)")
+        params.append(bigquery.ArrayQueryParameter("states", "STRING", [s.lower() for s in states]))
+    if counties:
+        conditions.append("LOWER(county) IN UNNEST(@counties)")
+        params.append(bigquery.ArrayQueryParameter("counties", "STRING", counties))
+    if severity:
+        conditions.append("LOWER(severity) = @severity")
+        params.append(bigquery.ScalarQueryParameter("severity", "STRING", severity.lower()))
+    if report_type:
+        conditions.append("LOWER(report_type) = @report_type")
+        params.append(bigquery.ScalarQueryParameter("report_type", "STRING", report_type.lower()))
+    if days:
+        conditions.append("timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)")
+        params.append(bigquery.ScalarQueryParameter("days", "INT64", int(days)))
+
+    # 3️⃣ Candidate stage on the int8 copy (an eighth of the bytes; kept current by the worker and the backfill).
+    # It ranks the whole table, so filtered searches skip it and score only the matching rows.
+    candidate_ids = None
+    if REPORT_INDEX_AVAILABLE and not conditions:
+        try:
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", qvec),
+                bigquery.ScalarQueryParameter("candidates", "INT64", top_k * BQ_RERANK_FACTOR),
+            ])
+            # The worker and the backfill sync can both write a report's Q8 row, so ids may repeat
+            candidate_ids = list(dict.fromkeys(row.report_id for row in client.query(
+                quantized_candidates_sql(project_id), job_config=job_config).result())) or None
+        except Exception as e:
+            print(f"[SEMANTIC SEARCH] Quantized candidate stage unavailable, scoring all embeddings: {e}")
+    if candidate_ids:
+        conditions.append("report_id IN UNNEST(@candidate_ids)")
+        params.append(bigquery.ArrayQueryParameter("candidate_ids", "STRING", candidate_ids))
 
     sql = f"""
     SELECT
@@ -57,42 +156,89 @@ def semantic_query_reports(user_query: str, top_k: int = 10) -> str:
       severity,
       report_type,
       timestamp,
-      contact_name,
-      contact_email,
-      contact_phone,
-      is_anonymous,
       (
         SELECT SUM(x * y)
         FROM UNNEST(description_embedding) AS x WITH OFFSET
-        JOIN UNNEST([{qvec_str}]) AS y WITH OFFSET
+        JOIN UNNEST(@query_embedding) AS y WITH OFFSET
         USING (offset)
       ) AS similarity
     FROM `{project_id}.{dataset}.ReportEmbeddings`
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
     ORDER BY similarity DESC
-    LIMIT {top_k}
+    LIMIT @top_k
     """
 
-
-    # 3️⃣ Query BigQuery
+    # 4️⃣ Exact scores (re-ranks the candidates, or scores every matching row without them)
     try:
-        results = client.query(sql).result()
-        rows = [dict(row) for row in results]
+        results = client.query(sql, job_config=bigquery.QueryJobConfig(query_parameters=params)).result()
+        return [dict(row) for row in results], None
     except Exception as e:
-        return f"⚠️ Error running BigQuery vector search: {e}"
+        return None, f"Error running BigQuery vector search: {e}"
 
-    # 4️⃣ Format output
-    if not rows:
-        return "No semantically similar reports found in the database."
 
-    summary = f"🔍 Top {len(rows)} semantically similar reports:\n"
+def _format_reports(rows: List[dict]) -> str:
+    lines = []
     for r in rows:
         city, state = r.get("city") or "Unknown", r.get("state") or ""
         desc = (r.get("description") or "").replace("\n", " ")
-        summary += (
-            f"- {r['timestamp']} | {city}, {state} "
-            f"({r.get('severity','N/A')}): {desc[:140]}...\n"
-        )
+        lines.append(f"- {r['timestamp']} | {city}, {state} ({r.get('severity','N/A')}): {desc[:140]}...\n")
+    return "".join(lines)
 
+
+def semantic_query_reports(user_query: str, top_k: int = 10, state: Optional[str] = None,
+                           county: Optional[str] = None, severity: Optional[str] = None,
+                           report_type: Optional[str] = None, days: Optional[int] = None) -> str:
+    """
+    Returns reports matching a question by meaning and keywords (Gemini embeddings + BM25),
+    searched in a local index of ReportEmbeddings (BigQuery when the index is not built yet).
+    Works even without Vertex AI permissions.
+
+    Args:
+        user_query: The user's question
+        top_k: Number of reports to return
+        state: Only reports from this state (name or 2-letter code)
+        county: Only reports from this county (e.g. "Alameda")
+        severity: Only reports of this severity (low, moderate, high, critical)
+        report_type: Only reports of this type (health, environmental, weather, emergency)
+        days: Only reports from the last N days
+    """
+    rows, error = search_reports(user_query, top_k, state, county, severity, report_type, days)
+    if error:
+        return f"⚠️ {error}"
+
+    # 5️⃣ Format output
+    scope = ", ".join(f"{name}={value}" for name, value in (
+        ("state", state), ("county", county), ("severity", severity), ("report_type", report_type),
+        ("last_days", days)) if value)
+    if not rows:
+        return "No semantically similar reports found in the database" + (f" for {scope}." if scope else ".")
+
+    summary = f"🔍 Top {len(rows)} semantically similar reports" + (f" ({scope})" if scope else "") + ":\n"
+    summary += _format_reports(rows)
     if len(rows) == top_k:
         summary += f"⚙️ Showing top {top_k} most similar reports.\n"
     return summary
+
+
+def find_similar_reports(description: str, state: Optional[str] = None, county: Optional[str] = None,
+                         report_type: Optional[str] = None, days: int = 7, top_k: int = 5) -> str:
+    """
+    Looks up recent community reports similar to a new observation in the same area, so the
+    resident can be told whether neighbours have already reported it.
+
+    Args:
+        description: What the resident is reporting
+        state: State of the observation
+        county: County of the observation, if known
+        report_type: health, environmental, weather or emergency
+        days: How far back to look
+        top_k: Maximum reports to return
+    """
+    rows, error = search_reports(description, top_k, state=state, county=county,
+                                 report_type=report_type, days=days)
+    if error:
+        return f"⚠️ {error}"
+    if not rows:
+        return "No similar recent reports in this area."
+    window = f" in the last {days} days" if days else ""
+    return f"📋 {len(rows)} similar report(s){window}:\n" + _format_reports(rows)
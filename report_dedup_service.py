@@ -0,0 +1,246 @@
+"""
+Report Dedup Service - near-duplicate detection for community report submissions
+
+When something visible happens (a smoke plume, a water main break) dozens of
+people describe it in nearly the same words, and every submission used to run
+its own Gemini text analysis. This service keeps a MinHash/LSH index of recent
+report descriptions in memory:
+
+- a description is normalized, split into character 5-gram shingles and
+  reduced to a `num_perm` MinHash signature
+- signatures are split into `bands` LSH bands; reports sharing any band bucket
+  are candidates, and a candidate is a duplicate when the signatures agree on
+  at least `threshold` of their positions (estimated Jaccard similarity), so a
+  lookup touches a handful of buckets regardless of how many reports are indexed
+- the index is partitioned by state, report type, severity and `window_hours`
+  time window; a report is compared with its own and the previous window, and
+  older windows are dropped. The AI analysis takes the type and severity as
+  input, so a cluster (and its shared enrichment) never mixes them
+- duplicates join the first report's cluster id; the cluster carries the AI
+  enrichment (summary, tags, confidence, status) so later duplicates reuse it
+
+The index is per process and only covers reports submitted since it started.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+SHINGLE_SIZE = 5
+# A duplicate this close to its match adds nothing to the index (the match already covers it),
+# and no bucket grows past MAX_BUCKET_SIZE entries, so floods keep lookups O(1)
+REDUNDANT_SIMILARITY = 0.95
+MAX_BUCKET_SIZE = 64
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(re.sub(r"[^\w\s]", " ", (text or '').casefold()).split())
+
+
+def _shingles(text: str) -> set:
+    text = _normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHasher:
+    """MinHash signatures from universal hash functions (a * x + b) mod p"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        hashes = [_shingle_hash(s) for s in _shingles(text)]
+        if not hashes:
+            return None
+        return tuple(min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in self.params)
+
+
+def estimated_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class _Partition:
+    """LSH buckets for one (state, report type, severity, time window)"""
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, int], deque] = {}  # newest MAX_BUCKET_SIZE report_ids per band bucket
+        self.entries: Dict[str, Tuple[Tuple[int, ...], str]] = {}  # report_id -> (signature, cluster_id)
+
+
+class ReportDeduplicator:
+    """In-memory MinHash/LSH index of recent report descriptions, partitioned by state, type, severity and time window"""
+
+    def __init__(self, num_perm: Optional[int] = None, bands: Optional[int] = None,
+                 threshold: Optional[float] = None, window_hours: Optional[float] = None,
+                 max_clusters: int = 10000):
+        """
+        Args:
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm must divide evenly); more bands find lower-similarity candidates
+            threshold: Minimum estimated Jaccard similarity of shingles for a duplicate
+            window_hours: Partition width; reports are compared with the current and previous window
+            max_clusters: Cluster enrichment records kept (oldest dropped first)
+        """
+        self.num_perm = num_perm or int(os.getenv('REPORT_DEDUP_NUM_PERM', '64'))
+        self.bands = bands or int(os.getenv('REPORT_DEDUP_BANDS', '16'))
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm ({self.num_perm}) must be a multiple of bands ({self.bands})")
+        self.rows_per_band = self.num_perm // self.bands
+        self.threshold = threshold or float(os.getenv('REPORT_DEDUP_THRESHOLD', '0.7'))
+        self.window_seconds = (window_hours or float(os.getenv('REPORT_DEDUP_WINDOW_HOURS', '6'))) * 3600
+        self.max_clusters = max_clusters
+        self.hasher = MinHasher(self.num_perm)
+        self._partitions: Dict[Tuple[str, str, str, int], _Partition] = {}
+        self._clusters: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+        self.enrichment_reused = 0
+
+    def _window(self, timestamp: Optional[datetime]) -> int:
+        seconds = timestamp.timestamp() if timestamp else time.time()
+        return int(seconds // self.window_seconds)
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        r = self.rows_per_band
+        return [(band, hash(signature[band * r:(band + 1) * r])) for band in range(self.bands)]
+
+    def _expire(self, current_window: int):
+        for key in [key for key in self._partitions if key[-1] < current_window - 1]:
+            del self._partitions[key]
+
+    def assign(self, report_id: str, description: str, state: Optional[str] = None,
+               timestamp: Optional[datetime] = None, report_type: Optional[str] = None,
+               severity: Optional[str] = None) -> Dict:
+        """
+        Index a new report and return its cluster (only reports of the same state, type and
+        severity are compared):
+            {'cluster_id', 'is_duplicate', 'duplicate_of', 'similarity', 'cluster_size', 'enrichment'}
+        enrichment is the cluster's shared AI analysis (None until set_enrichment is called).
+        """
+        signature = self.hasher.signature(description)
+        scope = (_normalize(state) or '-', _normalize(report_type) or '-', _normalize(severity) or '-')
+        window = self._window(timestamp)
+        with self._lock:
+            self.checked += 1
+            self._expire(window)
+            if signature is None:
+                cluster_id = self._new_cluster(report_id, state, report_type, severity)
+                return self._result(cluster_id, None, None)
+
+            band_keys = self._band_keys(signature)
+            best_id, best_cluster, best_similarity = None, None, 0.0
+            for key in (scope + (window,), scope + (window - 1,)):
+                partition = self._partitions.get(key)
+                if not partition:
+                    continue
+                candidates = {rid for band_key in band_keys for rid in partition.buckets.get(band_key, ())}
+                for rid in candidates:
+                    other_signature, other_cluster = partition.entries[rid]
+                    similarity = estimated_similarity(signature, other_signature)
+                    if similarity >= self.threshold and similarity > best_similarity:
+                        best_id, best_cluster, best_similarity = rid, other_cluster, similarity
+
+            if best_cluster is not None and best_cluster in self._clusters:
+                cluster_id = best_cluster
+                cluster = self._clusters[cluster_id]
+                cluster['size'] += 1
+                cluster['last_seen'] = time.time()
+                self._clusters.move_to_end(cluster_id)
+                self.duplicates += 1
+            else:
+                best_id, best_similarity = None, None
+                cluster_id = self._new_cluster(report_id, state, report_type, severity)
+
+            if best_similarity is None or best_similarity < REDUNDANT_SIMILARITY:
+                partition = self._partitions.setdefault(scope + (window,), _Partition())
+                partition.entries[report_id] = (signature, cluster_id)
+                for band_key in band_keys:
+                    partition.buckets.setdefault(band_key, deque(maxlen=MAX_BUCKET_SIZE)).append(report_id)
+            return self._result(cluster_id, best_id, best_similarity)
+
+    def _new_cluster(self, report_id: str, state: Optional[str], report_type: Optional[str],
+                     severity: Optional[str]) -> str:
+        cluster_id = uuid.uuid4().hex[:12]
+        self._clusters[cluster_id] = {'cluster_id': cluster_id, 'first_report_id': report_id, 'state': state,
+                                      'report_type': report_type, 'severity': severity,
+                                      'size': 1, 'created_at': time.time(),
+                                      'last_seen': time.time(), 'enrichment': None}
+        while len(self._clusters) > self.max_clusters:
+            self._clusters.popitem(last=False)
+        return cluster_id
+
+    def _result(self, cluster_id: str, duplicate_of: Optional[str], similarity: Optional[float]) -> Dict:
+        cluster = self._clusters[cluster_id]
+        enrichment = cluster['enrichment'] if duplicate_of else None
+        if enrichment:
+            self.enrichment_reused += 1
+        return {
+            'cluster_id': cluster_id,
+            'is_duplicate': duplicate_of is not None,
+            'duplicate_of': duplicate_of,
+            'similarity': round(similarity, 3) if similarity is not None else None,
+            'cluster_size': cluster['size'],
+            'enrichment': dict(enrichment) if enrichment else None,
+        }
+
+    def set_enrichment(self, cluster_id: str, enrichment: Dict):
+        """Attach AI analysis to a cluster (first writer wins) so later duplicates can reuse it"""
+        with self._lock:
+            cluster = self._clusters.get(cluster_id)
+            if cluster is not None and not cluster['enrichment'] and enrichment:
+                cluster['enrichment'] = dict(enrichment)
+
+    def clusters(self, state: Optional[str] = None, min_size: int = 2, limit: int = 50) -> List[Dict]:
+        """Recent clusters with at least min_size reports, largest first"""
+        with self._lock:
+            matches = [dict(c, enrichment=bool(c['enrichment'])) for c in self._clusters.values()
+                       if c['size'] >= min_size and (not state or _normalize(c['state']) == _normalize(state))]
+        return sorted(matches, key=lambda c: (c['size'], c['last_seen']), reverse=True)[:limit]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'duplicates': self.duplicates,
+                'duplicate_rate': round(self.duplicates / self.checked, 3) if self.checked else None,
+                'enrichment_reused': self.enrichment_reused,
+                'clusters': len(self._clusters),
+                'indexed_reports': sum(len(p.entries) for p in self._partitions.values()),
+                'partitions': len(self._partitions),
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                'threshold': self.threshold,
+                'window_hours': self.window_seconds / 3600,
+            }
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_report_deduplicator() -> Optional[ReportDeduplicator]:
+    """Shared deduplicator; None when REPORT_DEDUP_ENABLED=false"""
+    global _deduplicator
+    if os.getenv('REPORT_DEDUP_ENABLED', 'true').lower() == 'false':
+        return None
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = ReportDeduplicator()
+    return _deduplicator
@@ -0,0 +1,150 @@
+"""
+Report Export Service - streaming CSV / JSONL export of community reports
+
+Rows are read from BigQuery one batch at a time (through the BigQuery Storage
+Read API as Arrow record batches when google-cloud-bigquery-storage is
+installed, otherwise through paged REST results) and serialized as they
+arrive, so memory stays flat regardless of how many reports are exported.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Optional: BigQuery Storage Read API (much faster for large result sets)
+try:
+    from google.cloud import bigquery_storage
+    BQ_STORAGE_AVAILABLE = True
+except ImportError:
+    bigquery_storage = None
+    BQ_STORAGE_AVAILABLE = False
+
+DEFAULT_PAGE_SIZE = 5000
+
+STREAMING_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+_bqstorage_client = None
+
+
+def _get_bqstorage_client():
+    """Create the BigQuery Storage client once and reuse it across exports"""
+    global _bqstorage_client
+    if BQ_STORAGE_AVAILABLE and _bqstorage_client is None:
+        try:
+            _bqstorage_client = bigquery_storage.BigQueryReadClient()
+        except Exception as e:
+            print(f"[EXPORT] BigQuery Storage client unavailable, using REST paging: {e}")
+    return _bqstorage_client
+
+
+def iter_row_batches(row_iterator) -> Iterator[List[Dict]]:
+    """
+    Yield lists of row dicts from a BigQuery RowIterator, one batch at a time.
+
+    Args:
+        row_iterator: Result of `query_job.result(page_size=...)`; the page size
+            sets the batch size when the Storage API is not used
+    """
+    bqstorage_client = _get_bqstorage_client()
+    if bqstorage_client is not None:
+        started = False
+        try:
+            for record_batch in row_iterator.to_arrow_iterable(bqstorage_client=bqstorage_client):
+                started = True
+                yield record_batch.to_pylist()
+            return
+        except Exception as e:
+            # Falling back is only safe before any rows were sent
+            if started:
+                raise
+            print(f"[EXPORT] Arrow streaming failed, falling back to REST pages: {e}")
+
+    for page in row_iterator.pages:
+        yield [dict(row.items()) for row in page]
+
+
+def _serialize_value(value):
+    """Convert a BigQuery value into something csv/json can write"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (list, tuple)):
+        return [_serialize_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _serialize_value(v) for k, v in value.items()}
+    return value
+
+
+def stream_csv(batches: Iterable[List[Dict]], columns: Optional[List[str]] = None) -> Iterator[str]:
+    """Serialize row batches as CSV text chunks (header first, one chunk per batch)"""
+    buffer = io.StringIO()
+    writer = None
+
+    for batch in batches:
+        if not batch:
+            continue
+        if writer is None:
+            columns = columns or list(batch[0].keys())
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+
+        for row in batch:
+            values = []
+            for col in columns:
+                value = _serialize_value(row.get(col))
+                if isinstance(value, (list, dict)):
+                    value = json.dumps(value)
+                values.append('' if value is None else value)
+            writer.writerow(values)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if writer is None and columns:
+        # No rows - still emit a header so the file is well-formed
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+
+
+def stream_jsonl(batches: Iterable[List[Dict]]) -> Iterator[str]:
+    """Serialize row batches as JSON Lines text chunks"""
+    for batch in batches:
+        if batch:
+            yield ''.join(json.dumps(_serialize_value(row)) + '\n' for row in batch)
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Incrementally gzip a stream of text chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(batches: Iterable[List[Dict]], format: str, gzip_enabled: bool = False,
+                  columns: Optional[List[str]] = None) -> Iterator:
+    """Build the response body generator for a streaming export format"""
+    if format == 'csv':
+        chunks = stream_csv(batches, columns)
+    elif format == 'jsonl':
+        chunks = stream_jsonl(batches)
+    else:
+        raise ValueError(f"Unsupported streaming format: {format}")
+
+    if gzip_enabled:
+        return gzip_stream(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
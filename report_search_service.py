@@ -0,0 +1,244 @@
+"""
+Report Search Service - hybrid keyword + vector search over community reports
+
+`semantic_query_reports` ranked every embedded report and returned the global
+top-k, so "severe reports in Alameda County" came back with whatever was most
+similar nationwide. This service answers scoped searches from memory, on top
+of the local report vector index (report_vector_index_service):
+
+- filters first: per-field posting lists (state, county, severity,
+  report_type -> sorted row ids) are intersected, and a timestamp array gives
+  the time range, before anything is scored
+- keyword ranking: Okapi BM25 over report descriptions, from an inverted index
+  (term -> row ids and term frequencies)
+- vector ranking: exact similarity of the query embedding over the filtered
+  rows (the whole index when there are no filters)
+- the two rankings are fused with reciprocal-rank fusion,
+  score = sum(1 / (rrf_k + rank)), so neither score scale dominates
+
+Both indexes are brought up to date incrementally from the vector index's
+metadata before each search, so newly embedded reports become searchable
+without a rebuild.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    from report_vector_index_service import get_report_vector_index
+    REPORT_INDEX_AVAILABLE = True
+except ImportError:
+    REPORT_INDEX_AVAILABLE = False
+
+FILTER_FIELDS = ('state', 'county', 'severity', 'report_type')
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its of on or that the this to was were will with "
+    "there their they we our my me near any some".split()
+)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall((text or '').casefold()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _filter_key(value) -> str:
+    text = str(value or '').casefold().strip()
+    return text[:-len(' county')] if text.endswith(' county') else text
+
+
+def _epoch(value) -> float:
+    if value is None:
+        return float('nan')
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return float('nan')
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class HybridReportSearch:
+    """BM25 + vector search with reciprocal-rank fusion and filter push-down over the report vector index"""
+
+    def __init__(self, vector_index, k1: float = 1.2, b: float = 0.75, rrf_k: int = 60):
+        """
+        Args:
+            vector_index: ReportVectorIndex whose rows (metadata + embeddings) are searched
+            k1, b: BM25 term-frequency saturation and length normalization
+            rrf_k: Reciprocal-rank fusion constant (larger = flatter fusion)
+        """
+        self.vector_index = vector_index
+        self.k1 = k1
+        self.b = b
+        self.rrf_k = rrf_k
+        self._postings: Dict[str, List[List[int]]] = {}  # term -> [row ids, term frequencies]
+        self._filters: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+        self._doc_lengths: List[int] = []
+        self._timestamps: List[float] = []
+        self._total_length = 0
+        self._synced = 0
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def _sync(self) -> List[Dict]:
+        """Index metadata rows added to the vector index since the last search"""
+        metadata = self.vector_index.metadata()
+        with self._lock:
+            for row_id in range(self._synced, len(metadata)):
+                row = metadata[row_id]
+                counts = Counter(tokenize(row.get('description')))
+                for term, tf in counts.items():
+                    postings = self._postings.setdefault(term, [[], []])
+                    postings[0].append(row_id)
+                    postings[1].append(tf)
+                length = sum(counts.values())
+                self._doc_lengths.append(length)
+                self._total_length += length
+                self._timestamps.append(_epoch(row.get('timestamp')))
+                for field in FILTER_FIELDS:
+                    key = _filter_key(row.get(field))
+                    if key:
+                        self._filters[field].setdefault(key, []).append(row_id)
+            self._synced = len(metadata)
+        return metadata
+
+    def filter_rows(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    **filters: Union[str, Iterable[str], None]):
+        """
+        Sorted row ids matching every filter (a filter value may be a list of alternatives,
+        e.g. ["California", "CA"]), or None when no filter is set.
+        """
+        with self._lock:
+            rows = None
+            for field, value in filters.items():
+                if field not in FILTER_FIELDS or not value:
+                    continue
+                values = [value] if isinstance(value, str) else list(value)
+                matches = [self._filters[field].get(_filter_key(v), []) for v in values]
+                field_rows = np.unique(np.concatenate([np.asarray(m, dtype=np.int64) for m in matches]))
+                rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+            if since or until:
+                timestamps = np.asarray(self._timestamps, dtype=np.float64)
+                candidates = rows if rows is not None else np.arange(len(timestamps))
+                keep = np.ones(len(candidates), dtype=bool)
+                if since:
+                    keep &= timestamps[candidates] >= _epoch(since)
+                if until:
+                    keep &= timestamps[candidates] <= _epoch(until)
+                rows = candidates[keep]
+        return rows
+
+    def bm25(self, query: str, rows=None, limit: int = 100):
+        """(row ids, BM25 scores) of the best keyword matches, optionally only among `rows`"""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._doc_lengths)
+            if not terms or not count:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            lengths = np.asarray(self._doc_lengths, dtype=np.float64)
+            norm = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / count or 1))
+            scores = np.zeros(count)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                ids = np.asarray(postings[0], dtype=np.int64)
+                tf = np.asarray(postings[1], dtype=np.float64)
+                idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+        if rows is not None:
+            mask = np.zeros(count, dtype=bool)
+            mask[rows[rows < count]] = True
+            scores[~mask] = 0.0
+        matched = np.nonzero(scores > 0)[0]
+        best = matched[np.argsort(-scores[matched], kind='stable')[:limit]]
+        return best, scores[best]
+
+    def search(self, query: str, query_vector=None, top_k: int = 10, since: Optional[datetime] = None,
+               until: Optional[datetime] = None, candidates: int = 100, **filters) -> Dict:
+        """
+        Hybrid search. Without query_vector (embedding unavailable) only BM25 ranks.
+
+        Returns:
+            {'results': [metadata + rrf_score, keyword_rank, vector_rank, similarity], 'matched_filters',
+             'indexed', 'elapsed_ms'}
+        """
+        started_at = time.perf_counter()
+        metadata = self._sync()
+        rows = self.filter_rows(since=since, until=until, **filters)
+        limit = max(candidates, top_k)
+
+        keyword_rows, _ = self.bm25(query, rows, limit)
+        vector_rows, similarities = (np.empty(0, dtype=np.int64), np.empty(0))
+        if query_vector is not None and (rows is None or len(rows)):
+            vector_rows, similarities = self.vector_index.search_rows(query_vector, limit, rows=rows)
+
+        fused: Dict[int, Dict] = {}
+        for rank, row_id in enumerate(keyword_rows.tolist(), start=1):
+            entry = fused.setdefault(row_id, {'rrf_score': 0.0, 'keyword_rank': None, 'vector_rank': None, 'similarity': None})
+            entry['rrf_score'] += 1.0 / (self.rrf_k + rank)
+            entry['keyword_rank'] = rank
+        for rank, (row_id, similarity) in enumerate(zip(vector_rows.tolist(), similarities.tolist()), start=1):
+            entry = fused.setdefault(row_id, {'rrf_score': 0.0, 'keyword_rank': None, 'vector_rank': None, 'similarity': None})
+            entry['rrf_score'] += 1.0 / (self.rrf_k + rank)
+            entry['vector_rank'] = rank
+            entry['similarity'] = round(float(similarity), 4)
+
+        best = sorted(fused.items(), key=lambda item: item[1]['rrf_score'], reverse=True)[:top_k]
+        results = [dict(metadata[row_id], **dict(entry, rrf_score=round(entry['rrf_score'], 5))) for row_id, entry in best]
+        with self._lock:
+            self.searches += 1
+        return {
+            'results': results,
+            'matched_filters': None if rows is None else int(len(rows)),
+            'indexed': len(metadata),
+            'elapsed_ms': round((time.perf_counter() - started_at) * 1000, 2),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'indexed': self._synced,
+                'terms': len(self._postings),
+                'avg_description_terms': round(self._total_length / self._synced, 1) if self._synced else None,
+                'filter_values': {field: len(values) for field, values in self._filters.items()},
+                'searches': self.searches,
+            }
+
+
+def since_days(days: Optional[float]) -> Optional[datetime]:
+    return datetime.now(timezone.utc) - timedelta(days=days) if days else None
+
+
+_report_search = None
+_report_search_lock = threading.Lock()
+
+
+def get_report_search() -> Optional[HybridReportSearch]:
+    """Shared hybrid search over the shared report vector index; None when the index is unavailable"""
+    global _report_search
+    if not NUMPY_AVAILABLE or not REPORT_INDEX_AVAILABLE:
+        return None
+    index = get_report_vector_index()
+    if index is None:
+        return None
+    with _report_search_lock:
+        if _report_search is None or _report_search.vector_index is not index:
+            _report_search = HybridReportSearch(index)
+    return _report_search
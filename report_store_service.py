@@ -0,0 +1,346 @@
+"""
+Community Report Store - materialized latest-version table for community reports
+
+`/api/update-report` never UPDATEs rows (the streaming buffer forbids it); it
+inserts a whole new version of the report instead. Reads then had to
+deduplicate every version with ROW_NUMBER() over the full history table.
+
+This service keeps a second table, `<reports table>_current`, holding exactly one
+row per report_id (its latest version). A periodic compaction job MERGEs new
+versions into it, and read paths query the current table plus the small delta of
+versions written since the last compaction.
+
+"Since the last compaction" is measured in insertion time (`inserted_at`, stamped
+by every writer), not report time: an update or a Pub/Sub retry can land long
+after its `timestamp`. The compaction high-water mark is persisted in
+`<current table>_watermark` and passed to queries as a scalar parameter, and the
+delta also bounds `timestamp` (the partition column) so old partitions are pruned.
+
+Only one process builds and compacts the current table: the scheduled
+`/api/officials/compact-reports` call, this module's CLI, or an instance started
+with REPORT_COMPACTION_ENABLED. Serving instances `attach()` to it read-only and
+re-read the high-water mark every REPORT_HIGH_WATER_REFRESH seconds.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from google.cloud import bigquery
+
+
+# Versions inserted after (high-water mark - overlap) are re-read on every compaction
+# and read, so rows that become visible late (streaming buffer, clock skew between
+# writers) are still picked up.
+DEFAULT_OVERLAP_MINUTES = 60
+DEFAULT_COMPACTION_INTERVAL = 900  # 15 minutes
+# Oldest report timestamp a newly inserted version can carry (Pub/Sub retains
+# undelivered messages for 7 days); bounds the partitions the delta scans
+DEFAULT_MAX_LATENESS_HOURS = int(os.getenv('REPORT_MAX_LATENESS_HOURS', '168'))
+# How often a serving instance re-reads the high-water mark (or retries attach) between reads
+DEFAULT_HIGH_WATER_REFRESH = int(os.getenv('REPORT_HIGH_WATER_REFRESH', '300'))
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def utc_now_string() -> str:
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class CommunityReportStore:
+    """Latest-version view of the community reports history table"""
+
+    def __init__(self, bq_client: bigquery.Client, project_id: str, dataset_id: str, table_id: str,
+                 current_table_id: Optional[str] = None, overlap_minutes: int = DEFAULT_OVERLAP_MINUTES,
+                 max_lateness_hours: int = DEFAULT_MAX_LATENESS_HOURS,
+                 high_water_refresh: int = DEFAULT_HIGH_WATER_REFRESH):
+        self.bq_client = bq_client
+        self.history_table = f"{project_id}.{dataset_id}.{table_id}"
+        self.current_table = f"{project_id}.{dataset_id}.{current_table_id or table_id + '_current'}"
+        self.watermark_table = f"{self.current_table}_watermark"
+        self.overlap_minutes = overlap_minutes
+        self.max_lateness_hours = max_lateness_hours
+        self.high_water_refresh = high_water_refresh
+
+        self.columns: List[str] = []
+        self.current_table_ready = False
+        self.inserted_at_ready = False
+        self.high_water = EPOCH  # insertion time up to which the current table is complete
+        self.last_compaction = None  # {'started_at', 'elapsed', 'rows_affected', 'error'}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._compaction_thread = None
+
+    def _load_columns(self) -> List[str]:
+        """Read the history table schema (cached after the first call)"""
+        if not self.columns:
+            table = self.bq_client.get_table(self.history_table)
+            self.columns = [field.name for field in table.schema]
+        return self.columns
+
+    def _sync_schema(self):
+        """Add any columns that were added to the history table since the current table was built"""
+        history = self.bq_client.get_table(self.history_table)
+        current = self.bq_client.get_table(self.current_table)
+        existing = {field.name for field in current.schema}
+        missing = [field for field in history.schema if field.name not in existing]
+        if missing:
+            current.schema = list(current.schema) + missing
+            self.bq_client.update_table(current, ['schema'])
+            print(f"[COMPACTION] Added {len(missing)} new column(s) to {self.current_table}")
+        self.columns = [field.name for field in history.schema]
+
+    def ensure_inserted_at(self):
+        """Add the history table's inserted_at column if missing (metadata-only DDL)"""
+        if not self.inserted_at_ready:
+            self.bq_client.query(
+                f"ALTER TABLE `{self.history_table}` ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMP"
+            ).result()
+            self.columns = []
+            self.inserted_at_ready = True
+
+    def stamp(self, row: dict) -> dict:
+        """Set a row's insertion time before it is written to the history table"""
+        if self.inserted_at_ready or 'inserted_at' in row:
+            row['inserted_at'] = utc_now_string()
+        return row
+
+    def _load_high_water(self):
+        rows = list(self.bq_client.query(f"SELECT MAX(high_water) AS high_water FROM `{self.watermark_table}`").result())
+        if rows and rows[0].high_water:
+            self.high_water = rows[0].high_water
+
+    def _save_high_water(self, high_water: datetime):
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("high_water", "TIMESTAMP", high_water)
+        ])
+        self.bq_client.query(
+            f"CREATE OR REPLACE TABLE `{self.watermark_table}` AS "
+            f"SELECT @high_water AS high_water, CURRENT_TIMESTAMP() AS updated_at",
+            job_config=job_config
+        ).result()
+        self.high_water = high_water
+
+    def ensure_current_table(self) -> bool:
+        """Create and fully build the current table if it does not exist yet"""
+        try:
+            self.ensure_inserted_at()
+            built_at = datetime.now(timezone.utc)
+            columns = ", ".join(f"`{c}`" for c in self._load_columns())
+            query = f"""
+            CREATE TABLE IF NOT EXISTS `{self.current_table}` AS
+            SELECT {columns}
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) AS rn
+                FROM `{self.history_table}`
+            )
+            WHERE rn = 1
+            """
+            created = self.bq_client.query(query)
+            created.result()
+            self._sync_schema()
+            self.bq_client.query(
+                f"CREATE TABLE IF NOT EXISTS `{self.watermark_table}` (high_water TIMESTAMP, updated_at TIMESTAMP)"
+            ).result()
+            self._load_high_water()
+            if self.high_water == EPOCH and created.ddl_operation_performed == 'CREATE':
+                self._save_high_water(built_at)  # The fresh build already holds everything inserted so far
+            self.current_table_ready = True
+            print(f"[COMPACTION] Current reports table ready: {self.current_table}")
+            return True
+        except Exception as e:
+            print(f"[COMPACTION] Current reports table unavailable, reads use full history: {e}")
+            self.current_table_ready = False
+            return False
+
+    def attach(self) -> bool:
+        """Use the current table if the compaction job has built it (read-only, no DDL)"""
+        self._refreshed_at = time.time()
+        try:
+            history = [field.name for field in self.bq_client.get_table(self.history_table).schema]
+            current = {field.name for field in self.bq_client.get_table(self.current_table).schema}
+            self._load_high_water()
+            # Columns added to the history table since the last compaction are not read until it syncs them
+            self.columns = [c for c in history if c in current]
+            self.inserted_at_ready = 'inserted_at' in history
+            self.current_table_ready = True
+            print(f"[COMPACTION] Reading current reports table: {self.current_table}")
+            return True
+        except Exception as e:
+            print(f"[COMPACTION] Current reports table not built yet, reads use full history: {e}")
+            self.current_table_ready = False
+            return False
+
+    def refresh(self):
+        """
+        Re-read the high-water mark (or retry attach) at most every high_water_refresh seconds.
+        Call before building a query, so latest_reports_cte() and query_parameters() agree.
+        """
+        if self.bq_client is None or time.time() - self._refreshed_at < self.high_water_refresh or not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if not self.current_table_ready:
+                self.attach()
+                return
+            self._refreshed_at = time.time()
+            self._load_high_water()
+        except Exception as e:
+            print(f"[COMPACTION] Could not refresh the high-water mark: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _delta_bounds(self, high_water: datetime):
+        """(insertion-time lower bound, report-timestamp partition floor) of the not-yet-compacted delta"""
+        since = max(high_water - timedelta(minutes=self.overlap_minutes), EPOCH)
+        return since, max(since - timedelta(hours=self.max_lateness_hours), EPOCH)
+
+    def _delta_parameters(self, high_water: datetime) -> List[bigquery.ScalarQueryParameter]:
+        since, floor = self._delta_bounds(high_water)
+        return [
+            bigquery.ScalarQueryParameter("report_delta_since", "TIMESTAMP", since),
+            bigquery.ScalarQueryParameter("report_delta_floor", "TIMESTAMP", floor),
+        ]
+
+    def query_parameters(self) -> List[bigquery.ScalarQueryParameter]:
+        """Parameters referenced by latest_reports_cte(); add them to the query's job config"""
+        return self._delta_parameters(self.high_water) if self.current_table_ready else []
+
+    @staticmethod
+    def _delta_condition() -> str:
+        # Rows without inserted_at were written before the column existed; their report time is their insertion time
+        return ("timestamp > @report_delta_floor "
+                "AND COALESCE(inserted_at, timestamp) > @report_delta_since")
+
+    def compact(self) -> dict:
+        """MERGE versions written since the last compaction into the current table"""
+        with self._lock:
+            started_at = time.time()
+            try:
+                if not self.current_table_ready and not self.ensure_current_table():
+                    raise RuntimeError("current reports table could not be created")
+                self.ensure_inserted_at()
+                self._sync_schema()
+                self._load_high_water()  # Another instance may have compacted meanwhile
+                upper = datetime.now(timezone.utc)
+
+                columns = self.columns
+                column_list = ", ".join(f"`{c}`" for c in columns)
+                update_list = ", ".join(f"`{c}` = S.`{c}`" for c in columns if c != 'report_id')
+                source_list = ", ".join(f"S.`{c}`" for c in columns)
+
+                query = f"""
+                MERGE `{self.current_table}` T
+                USING (
+                    SELECT {column_list}
+                    FROM (
+                        SELECT *, ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) AS rn
+                        FROM `{self.history_table}`
+                        WHERE {self._delta_condition()}
+                          AND COALESCE(inserted_at, timestamp) <= @report_delta_upper
+                    )
+                    WHERE rn = 1
+                ) S
+                ON T.report_id = S.report_id
+                WHEN MATCHED AND S.timestamp >= T.timestamp THEN
+                    UPDATE SET {update_list}
+                WHEN NOT MATCHED THEN
+                    INSERT ({column_list}) VALUES ({source_list})
+                """
+                job_config = bigquery.QueryJobConfig(query_parameters=self._delta_parameters(self.high_water) + [
+                    bigquery.ScalarQueryParameter("report_delta_upper", "TIMESTAMP", upper)
+                ])
+                job = self.bq_client.query(query, job_config=job_config)
+                job.result()
+                self._save_high_water(upper)
+
+                self.last_compaction = {
+                    'started_at': started_at,
+                    'elapsed': round(time.time() - started_at, 2),
+                    'rows_affected': job.num_dml_affected_rows,
+                    'error': None
+                }
+                print(f"[COMPACTION] Merged {job.num_dml_affected_rows} report version(s) in {self.last_compaction['elapsed']}s")
+            except Exception as e:
+                self.last_compaction = {
+                    'started_at': started_at,
+                    'elapsed': round(time.time() - started_at, 2),
+                    'rows_affected': 0,
+                    'error': str(e)
+                }
+                print(f"[COMPACTION ERROR] {e}")
+            return self.last_compaction
+
+    def latest_reports_cte(self, columns: Optional[List[str]] = None) -> str:
+        """
+        Return a `LatestReports AS (...)` CTE with one row (the latest version) per report.
+
+        Uses the compacted table plus the delta of recently inserted versions when
+        available (the query must then carry query_parameters()), otherwise falls
+        back to deduplicating the full history table.
+        """
+        if columns is None:
+            columns = self.columns
+        column_list = ", ".join(columns) if columns else "* EXCEPT(rn)"
+
+        if not self.current_table_ready:
+            return f"""LatestReports AS (
+            SELECT {column_list}
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) AS rn
+                FROM `{self.history_table}`
+            )
+            WHERE rn = 1
+        )"""
+
+        # A late-arriving delta version can be older than the compacted row, so it
+        # only replaces its compacted counterpart when it is at least as new
+        return f"""DeltaReports AS (
+            SELECT {column_list}
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) AS rn
+                FROM `{self.history_table}`
+                WHERE {self._delta_condition()}
+            ) D
+            WHERE rn = 1
+              AND NOT EXISTS (
+                  SELECT 1 FROM `{self.current_table}` C
+                  WHERE C.report_id = D.report_id AND C.timestamp > D.timestamp
+              )
+        ),
+        LatestReports AS (
+            SELECT {column_list}
+            FROM `{self.current_table}`
+            WHERE report_id NOT IN (SELECT report_id FROM DeltaReports)
+            UNION ALL
+            SELECT {column_list} FROM DeltaReports
+        )"""
+
+    def start_periodic_compaction(self, interval: int = DEFAULT_COMPACTION_INTERVAL):
+        """Run compaction in a background daemon thread every `interval` seconds"""
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+
+        def run():
+            while True:
+                self.compact()
+                time.sleep(interval)
+
+        self._compaction_thread = threading.Thread(target=run, daemon=True, name="report-compaction")
+        self._compaction_thread.start()
+        print(f"[COMPACTION] Periodic compaction every {interval}s")
+
+
+if __name__ == '__main__':
+    # One-off compaction, e.g. from Cloud Scheduler / a cron job
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+    store = CommunityReportStore(
+        bigquery.Client(project=project_id),
+        project_id,
+        os.getenv('BIGQUERY_DATASET', 'CrowdsourceData'),
+        os.getenv('BIGQUERY_TABLE_REPORTS', 'CrowdSourceData'),
+    )
+    print(store.compact())
@@ -0,0 +1,642 @@
+"""
+Report Vector Index Service - in-process nearest-neighbor search over report embeddings
+
+`semantic_query_reports` used to score every row of CrowdsourceData.ReportEmbeddings
+in BigQuery SQL for each search: a full-table scan plus seconds of job latency.
+This service keeps a local copy of the embeddings and answers searches in
+milliseconds:
+
+- vectors are stored as one raw float32 file (`vectors.f32`, row-major) opened
+  with np.memmap, report metadata as JSON lines (`reports.jsonl`, no contact
+  details), and a small manifest holding the row count and dimension; appends
+  only write the new rows and the manifest is updated last, so an interrupted
+  append is truncated away on the next load
+- up to `brute_force_max` vectors a search is one matrix-vector product; beyond
+  that an IVF index (k-means centroids, `nprobe` lists scanned) is built in
+  memory and retrained when the index has doubled since training
+- in IVF mode, candidates are scored on an int8 copy with one float32 scale per
+  vector (`vectors.i8`, `scales.f32`; a quarter of the float32 bytes, an eighth
+  of the FLOAT64 column) and the best `rerank_factor * top_k` are re-ranked with
+  the exact float32 vectors, so only those rows of `vectors.f32` are read; below
+  `brute_force_max` the single float32 product is faster, so the codes are only
+  kept up to date for when the index outgrows it;
+  `python report_vector_index_service.py --benchmark` measures recall@10 and
+  memory against exact float search
+- `refresh()` fetches only embeddings whose report_id is not indexed yet;
+  `maybe_refresh()` runs it in a background thread at most every
+  `refresh_interval` seconds, and generate_report_embeddings adds the rows it
+  inserts directly
+
+Scores are dot products, the same as the BigQuery search, which stays the
+fallback while the index is empty or numpy is unavailable.
+
+The BigQuery fallback has the same two stages: ReportEmbeddingsQ8 holds int8
+codes as BYTES plus the scale, candidates are scored there and only they are
+re-ranked against ReportEmbeddings. The Pub/Sub worker writes the Q8 row next to
+each embedding it inserts, generate_report_embeddings quantizes the report_ids it
+inserts with `sync_bigquery_quantized()`, and `--sync-bigquery` tops up anything
+still missing (and clusters ReportEmbeddings on report_id).
+
+Build (or top up) the index with:
+    python report_vector_index_service.py [--sync-bigquery] [--benchmark]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Optional: numpy provides the vector store and search
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    from bigquery_metrics_service import instrument_bigquery_client
+    BIGQUERY_METRICS_AVAILABLE = True
+except ImportError:
+    BIGQUERY_METRICS_AVAILABLE = False
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'report_vectors')
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.f32'
+QUANTIZED_FILE = 'vectors.i8'
+SCALES_FILE = 'scales.f32'
+METADATA_FILE = 'reports.jsonl'
+SOURCE_TABLE = 'CrowdsourceData.ReportEmbeddings'
+QUANTIZED_TABLE = 'CrowdsourceData.ReportEmbeddingsQ8'
+METADATA_COLUMNS = ['report_id', 'city', 'state', 'county', 'description', 'severity', 'report_type', 'timestamp']
+FETCH_CHUNK = 1000
+SCORE_BLOCK = 2048  # rows dequantized at a time; small enough to stay in cache
+LATENCY_WINDOW = 200
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+
+def _top_k(scores, top_k: int):
+    """Indexes of the top_k scores, best first"""
+    if len(scores) <= top_k:
+        return np.argsort(-scores)
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    return best[np.argsort(-scores[best])]
+
+
+def quantize_int8(vectors):
+    """Symmetric per-vector int8 codes: vector ~= codes * scale, scale = max|v| / 127"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _quantized_scores(codes, scales, query, rows=None):
+    """Approximate dot products from int8 codes, for all rows or the given row indexes"""
+    if rows is not None:
+        return (codes[rows].astype(np.float32) @ query) * scales[rows]
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), SCORE_BLOCK):
+        block = np.asarray(codes[start:start + SCORE_BLOCK], dtype=np.float32)
+        scores[start:start + SCORE_BLOCK] = (block @ query) * scales[start:start + SCORE_BLOCK]
+    return scores
+
+
+class IVFIndex:
+    """Inverted-file index: vectors grouped by nearest k-means centroid, searched over the nprobe best lists"""
+
+    def __init__(self, vectors, nlist: int, iterations: int = 8, sample_size: int = 50000, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, min(count, sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.centroids = centroids
+        self.trained_count = count
+        self.lists: List[List] = [[] for _ in range(nlist)]
+        self.add(vectors, 0)
+
+    def add(self, vectors, start: int):
+        for offset in range(0, len(vectors), 65536):
+            block = np.asarray(vectors[offset:offset + 65536])
+            assignment = np.argmax(block @ self.centroids.T, axis=1)
+            for cluster in np.unique(assignment):
+                self.lists[cluster].append(np.nonzero(assignment == cluster)[0] + start + offset)
+        self.lists = [[np.concatenate(parts)] if len(parts) > 1 else parts for parts in self.lists]
+
+    def candidates(self, query, nprobe: int):
+        probes = _top_k(self.centroids @ query, nprobe)
+        parts = [self.lists[cluster][0] for cluster in probes if self.lists[cluster]]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+class ReportVectorIndex:
+    """Local, incrementally refreshed copy of ReportEmbeddings with brute-force/IVF search"""
+
+    def __init__(self, index_dir: Optional[str] = None, brute_force_max: Optional[int] = None,
+                 nprobe: Optional[int] = None, refresh_interval: Optional[float] = None,
+                 quantized: Optional[bool] = None, rerank_factor: Optional[int] = None):
+        """
+        Args:
+            index_dir: Directory for the vector, metadata and manifest files
+            brute_force_max: Largest index searched exhaustively; above it an IVF index is used
+            nprobe: IVF lists scanned per search (more = better recall, slower)
+            refresh_interval: Minimum seconds between background refreshes from BigQuery
+            quantized: In IVF mode, score candidates on int8 codes and re-rank exactly (False = float32 only)
+            rerank_factor: Candidates re-ranked per search, as a multiple of top_k
+        """
+        self.index_dir = index_dir or os.getenv('REPORT_INDEX_DIR', DEFAULT_INDEX_DIR)
+        self.brute_force_max = brute_force_max or int(os.getenv('REPORT_INDEX_BRUTE_FORCE_MAX', '20000'))
+        self.nprobe = nprobe or int(os.getenv('REPORT_INDEX_NPROBE', '16'))
+        self.refresh_interval = refresh_interval or float(os.getenv('REPORT_INDEX_REFRESH_SECONDS', '300'))
+        self.quantized = quantized if quantized is not None else \
+            os.getenv('REPORT_INDEX_QUANTIZED', 'true').lower() != 'false'
+        self.rerank_factor = rerank_factor or int(os.getenv('REPORT_INDEX_RERANK_FACTOR', '5'))
+        self.dim = None
+        self._vectors = None  # np.memmap (count x dim) of the persisted rows
+        self._codes = None  # np.memmap (count x dim) int8 codes, when quantized
+        self._scales = None  # float32 scale per row, when quantized
+        self._metadata: List[Dict] = []
+        self._ids = set()
+        self._ivf: Optional[IVFIndex] = None
+        self._ivf_building = False
+        self._lock = threading.RLock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.last_refresh_at = 0.0
+        self.last_refresh_error = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.searches = 0
+        self._load()
+
+    # --- storage ---
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _load(self):
+        """Open the persisted index; rows beyond the manifest count (interrupted append) are dropped"""
+        if not NUMPY_AVAILABLE or not os.path.exists(self._path(MANIFEST_FILE)):
+            return
+        try:
+            with open(self._path(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            count, dim = manifest['count'], manifest['dim']
+            with open(self._path(METADATA_FILE), 'r', encoding='utf-8') as f:
+                metadata = [json.loads(line) for line, _ in zip(f, range(count))]
+            if len(metadata) < count:
+                raise ValueError(f"metadata has {len(metadata)} rows, manifest {count}")
+            self._truncate(count, dim, metadata)
+            vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(count, dim)) if count else None
+            codes, scales = self._load_quantized(vectors, count, dim) if self.quantized and count else (None, None)
+            with self._lock:
+                self.dim = dim
+                self._metadata = metadata
+                self._ids = {row['report_id'] for row in metadata}
+                self._vectors, self._codes, self._scales = vectors, codes, scales
+                self.last_refresh_at = manifest.get('refreshed_at', 0.0)
+            print(f"[REPORT INDEX] Loaded {count} report embeddings ({dim} dims) from {self.index_dir}")
+            self._maybe_build_ivf()
+        except Exception as e:
+            print(f"[REPORT INDEX] Failed to load index, starting empty: {e}")
+            self.dim, self._vectors, self._metadata, self._ids = None, None, [], set()
+
+    def _truncate(self, count: int, dim: int, metadata: List[Dict]):
+        for name, size in ((VECTORS_FILE, count * dim * 4), (QUANTIZED_FILE, count * dim), (SCALES_FILE, count * 4)):
+            if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) > size:
+                with open(self._path(name), 'r+b') as f:
+                    f.truncate(size)
+        with open(self._path(METADATA_FILE), 'r', encoding='utf-8') as f:
+            extra = sum(1 for _ in f) > count
+        if extra:
+            with open(self._path(METADATA_FILE), 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(row) + '\n' for row in metadata)
+
+    def _load_quantized(self, vectors, count: int, dim: int):
+        """int8 codes and scales for the persisted rows, (re)built from vectors.f32 when missing or short"""
+        complete = (os.path.exists(self._path(QUANTIZED_FILE)) and os.path.exists(self._path(SCALES_FILE))
+                    and os.path.getsize(self._path(QUANTIZED_FILE)) == count * dim
+                    and os.path.getsize(self._path(SCALES_FILE)) == count * 4)
+        if not complete:
+            started_at = time.time()
+            with open(self._path(QUANTIZED_FILE), 'wb') as codes_file, open(self._path(SCALES_FILE), 'wb') as scales_file:
+                for start in range(0, count, SCORE_BLOCK):
+                    codes, scales = quantize_int8(vectors[start:start + SCORE_BLOCK])
+                    codes_file.write(codes.tobytes())
+                    scales_file.write(scales.tobytes())
+            print(f"[REPORT INDEX] Quantized {count} vectors to int8 in {time.time() - started_at:.1f}s")
+        return (np.memmap(self._path(QUANTIZED_FILE), dtype=np.int8, mode='r', shape=(count, dim)),
+                np.fromfile(self._path(SCALES_FILE), dtype=np.float32, count=count))
+
+    def _write_manifest(self, count: int):
+        manifest = {'source_table': SOURCE_TABLE, 'count': count, 'dim': self.dim, 'quantized': self.quantized,
+                    'refreshed_at': self.last_refresh_at, 'updated_at': datetime.utcnow().isoformat()}
+        tmp_path = self._path(MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._path(MANIFEST_FILE))
+
+    def add(self, rows: List[Dict]) -> int:
+        """
+        Append reports to the index; rows need report_id and description_embedding plus
+        any METADATA_COLUMNS. Already indexed report_ids are skipped. Returns rows added.
+        """
+        if not NUMPY_AVAILABLE:
+            return 0
+        with self._lock:
+            new_rows = [row for row in rows if row.get('report_id') not in self._ids
+                        and row.get('description_embedding') is not None and len(row['description_embedding'])]
+            new_rows = list({row['report_id']: row for row in new_rows}.values())
+            if not new_rows:
+                return 0
+            vectors = np.asarray([row['description_embedding'] for row in new_rows], dtype=np.float32)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dims, index has {self.dim}")
+
+            metadata = []
+            for row in new_rows:
+                entry = {column: row.get(column) for column in METADATA_COLUMNS}
+                if hasattr(entry['timestamp'], 'isoformat'):
+                    entry['timestamp'] = entry['timestamp'].isoformat()
+                metadata.append(entry)
+
+            os.makedirs(self.index_dir, exist_ok=True)
+            start = len(self._metadata)
+            with open(self._path(VECTORS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+            if self.quantized:
+                codes, scales = quantize_int8(vectors)
+                with open(self._path(QUANTIZED_FILE), 'ab') as f:
+                    f.write(codes.tobytes())
+                with open(self._path(SCALES_FILE), 'ab') as f:
+                    f.write(scales.tobytes())
+            with open(self._path(METADATA_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, default=str) + '\n' for entry in metadata)
+            count = start + len(new_rows)
+            self._write_manifest(count)
+
+            self._metadata = self._metadata + metadata
+            self._ids.update(entry['report_id'] for entry in metadata)
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(count, self.dim))
+            if self.quantized:
+                self._codes = np.memmap(self._path(QUANTIZED_FILE), dtype=np.int8, mode='r', shape=(count, self.dim))
+                self._scales = np.concatenate([self._scales, scales]) if self._scales is not None else scales
+            if self._ivf is not None:
+                if count >= 2 * self._ivf.trained_count:
+                    self._ivf = None  # retrain below
+                else:
+                    self._ivf.add(vectors, start)
+        self._maybe_build_ivf()
+        return len(new_rows)
+
+    # --- IVF ---
+    def _maybe_build_ivf(self):
+        """Train the IVF index in the background once the index outgrows brute force"""
+        with self._lock:
+            count = len(self._metadata)
+            if self._ivf is not None or self._ivf_building or count <= self.brute_force_max:
+                return
+            self._ivf_building = True
+            vectors = self._vectors
+
+        def build():
+            started_at = time.time()
+            try:
+                nlist = max(16, int(4 * count ** 0.5))
+                ivf = IVFIndex(vectors, nlist)
+                with self._lock:
+                    if len(self._metadata) > count:
+                        ivf.add(self._vectors[count:], count)  # rows added while training
+                    self._ivf = ivf
+                print(f"[REPORT INDEX] Built IVF index ({nlist} lists) over {count} vectors "
+                      f"in {time.time() - started_at:.1f}s")
+            except Exception as e:
+                print(f"[REPORT INDEX] IVF build failed, using brute force: {e}")
+            finally:
+                self._ivf_building = False
+
+        threading.Thread(target=build, name='report-index-ivf', daemon=True).start()
+
+    # --- search ---
+    @property
+    def count(self) -> int:
+        return len(self._metadata)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._vectors is not None and self.count > 0
+
+    def _search_rows(self, query, top_k: int, quantized: Optional[bool] = None, rerank: bool = True, rows=None):
+        """(row indexes, exact scores) of the top_k rows, best first; `rows` restricts the search to those rows"""
+        with self._lock:
+            vectors, codes, scales, ivf = self._vectors, self._codes, self._scales, self._ivf
+        if quantized is None:
+            # Brute force is one float32 product over a small index; int8 scoring only pays off behind IVF
+            quantized = self.quantized and ivf is not None and rows is None
+        if rows is not None:
+            candidates = np.unique(np.asarray(rows, dtype=np.int64))  # a filtered subset is scanned exactly
+            candidates = candidates[candidates < len(vectors)]
+            if not len(candidates):
+                return candidates, np.empty(0, dtype=np.float32)
+        elif ivf is not None:
+            candidates = np.sort(ivf.candidates(query, self.nprobe))  # sorted: sequential memmap reads
+        else:
+            candidates = None
+        if quantized and codes is not None and len(codes) == len(vectors):
+            approx = _quantized_scores(codes, scales, query, candidates)
+            shortlist = _top_k(approx, top_k * self.rerank_factor if rerank else top_k)
+            rows = shortlist if candidates is None else candidates[shortlist]
+            if not rerank:
+                return rows, approx[shortlist]
+            rows = np.sort(rows)
+        else:
+            rows = candidates
+        scores = (vectors[rows] if rows is not None else vectors) @ query
+        order = _top_k(scores, top_k)
+        return (order if rows is None else rows[order]), scores[order]
+
+    def search_rows(self, query_vector, top_k: int = 10, rows=None):
+        """(row indexes, similarities) of the best rows, optionally only among `rows`; rows index metadata()"""
+        return self._search_rows(np.asarray(query_vector, dtype=np.float32), top_k, rows=rows)
+
+    def metadata(self) -> List[Dict]:
+        """Report metadata by row (the list only grows; rows are never reordered)"""
+        with self._lock:
+            return self._metadata
+
+    def search(self, query_vector, top_k: int = 10) -> List[Dict]:
+        """Top-k reports by dot product with the query embedding (metadata dicts plus 'similarity')"""
+        started_at = time.perf_counter()
+        best, best_scores = self._search_rows(np.asarray(query_vector, dtype=np.float32), top_k)
+        with self._lock:
+            metadata = self._metadata  # read after the vectors; it only grows, so it covers every row
+        results = [dict(metadata[i], similarity=float(score)) for i, score in zip(best, best_scores)]
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self.searches += 1
+            self._latencies.append(elapsed * 1000)
+        return results
+
+    # --- refresh from BigQuery ---
+    def refresh(self, bq_client, project_id: Optional[str] = None) -> int:
+        """Fetch embeddings whose report_id is not indexed yet; returns rows added"""
+        from google.cloud import bigquery
+
+        table = f"`{project_id or bq_client.project}.{SOURCE_TABLE}`"
+        started_at = time.time()
+        try:
+            remote_ids = {row.report_id for row in bq_client.query(f"SELECT report_id FROM {table}").result()}
+            with self._lock:
+                missing = sorted(remote_ids - self._ids)
+            added = 0
+            for i in range(0, len(missing), FETCH_CHUNK):
+                query = f"""
+                SELECT {', '.join(METADATA_COLUMNS)}, description_embedding
+                FROM {table}
+                WHERE report_id IN UNNEST(@report_ids)
+                """
+                job_config = bigquery.QueryJobConfig(query_parameters=[
+                    bigquery.ArrayQueryParameter('report_ids', 'STRING', missing[i:i + FETCH_CHUNK])
+                ])
+                added += self.add([dict(row) for row in bq_client.query(query, job_config=job_config).result()])
+            with self._lock:
+                self.last_refresh_at = time.time()
+                self.last_refresh_error = None
+                if self.dim is not None:
+                    self._write_manifest(self.count)
+            print(f"[REPORT INDEX] Refreshed: {added} new report embeddings, {self.count} total "
+                  f"({time.time() - started_at:.1f}s)")
+            return added
+        except Exception as e:
+            self.last_refresh_error = str(e)
+            print(f"[REPORT INDEX] Refresh failed: {e}")
+            raise
+
+    def maybe_refresh(self, client_factory: Callable[[], object], project_id: Optional[str] = None) -> bool:
+        """Start a background refresh if the last one is older than refresh_interval; True if started"""
+        with self._lock:
+            running = self._refresh_thread is not None and self._refresh_thread.is_alive()
+            if running or time.time() - self.last_refresh_at < self.refresh_interval:
+                return False
+            self.last_refresh_at = time.time()  # also rate-limits retries after a failure
+
+            def run():
+                try:
+                    self.refresh(client_factory(), project_id)
+                except Exception:
+                    pass  # logged by refresh(); the next search after refresh_interval retries
+
+            self._refresh_thread = threading.Thread(target=run, name='report-index-refresh', daemon=True)
+            self._refresh_thread.start()
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                'count': self.count,
+                'dim': self.dim,
+                'mode': 'ivf' if self._ivf is not None else 'brute_force',
+                'ivf_lists': len(self._ivf.centroids) if self._ivf is not None else None,
+                'nprobe': self.nprobe,
+                'quantized': self._codes is not None,
+                'int8_scoring': self.quantized and self._codes is not None and self._ivf is not None,
+                'rerank_factor': self.rerank_factor,
+                'float32_bytes': self.count * (self.dim or 0) * 4,
+                'int8_bytes': (self.count * ((self.dim or 0) + 4)) if self._codes is not None else None,
+                'float64_column_bytes': self.count * (self.dim or 0) * 8,
+                'searches': self.searches,
+                'search_ms_p50': _percentile(latencies, 50),
+                'search_ms_p95': _percentile(latencies, 95),
+                'last_refresh_at': self.last_refresh_at or None,
+                'last_refresh_error': self.last_refresh_error,
+            }
+
+
+    def benchmark(self, queries: int = 200, top_k: int = 10, seed: int = 0) -> Dict:
+        """
+        Recall@top_k and latency of quantized search (with and without exact re-ranking)
+        against exact float32 search, using indexed vectors as queries
+        """
+        with self._lock:
+            vectors, count = self._vectors, self.count
+        if not count:
+            return {'count': 0}
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(count, min(queries, count), replace=False)
+        modes = {'float32': dict(quantized=False), 'int8_rerank': dict(quantized=True),
+                 'int8_only': dict(quantized=True, rerank=False)}
+        results = {}
+        truth = {}
+        for mode, options in modes.items():
+            latencies, hits = [], 0
+            for i in sample:
+                query = np.asarray(vectors[i], dtype=np.float32)
+                started_at = time.perf_counter()
+                rows, _ = self._search_rows(query, top_k, **options)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+                if mode == 'float32':
+                    truth[i] = set(_top_k(np.asarray(vectors @ query), top_k).tolist())
+                hits += len(truth[i] & set(rows.tolist()))
+            results[mode] = {'recall_at_k': round(hits / (len(sample) * top_k), 4),
+                             'search_ms_p50': _percentile(latencies, 50), 'search_ms_p95': _percentile(latencies, 95)}
+        stats = self.stats()
+        return {'count': count, 'dim': self.dim, 'k': top_k, 'queries': len(sample),
+                'mode': stats['mode'], 'rerank_factor': self.rerank_factor, 'results': results,
+                'float32_bytes': stats['float32_bytes'], 'int8_bytes': count * (self.dim + 4),
+                'float64_column_bytes': stats['float64_column_bytes']}
+
+
+_quantized_table_ready = set()
+
+
+def cluster_source_table(bq_client, project_id: Optional[str] = None) -> bool:
+    """Cluster ReportEmbeddings on report_id if it is not clustered yet (CLI only; applies to newly written data)"""
+    project_id = project_id or bq_client.project
+    source = f"{project_id}.{SOURCE_TABLE}"
+    source_table = bq_client.get_table(source)
+    if source_table.clustering_fields:
+        return False
+    source_table.clustering_fields = ['report_id']
+    bq_client.update_table(source_table, ['clustering_fields'])
+    print(f"[REPORT INDEX] Clustered {source} on report_id (applies to newly written data)")
+    return True
+
+
+def sync_bigquery_quantized(bq_client, project_id: Optional[str] = None, report_ids: Optional[List[str]] = None,
+                            chunk_size: int = 10000) -> int:
+    """
+    Add ReportEmbeddingsQ8 rows (int8 codes + 128 as BYTES, one FLOAT64 scale per row) for
+    `report_ids`, or for every ReportEmbeddings row still missing one when report_ids is None;
+    returns rows inserted. The table is clustered on report_id, so the re-rank lookup prunes blocks.
+
+    The full top-up finds missing rows by report_id (an anti-join that reads only the report_id
+    columns), not by timestamp, so embeddings backfilled for old reports are picked up too.
+    """
+    from google.cloud import bigquery
+
+    if report_ids is not None and not report_ids:
+        return 0
+    project_id = project_id or bq_client.project
+    source, target = f"{project_id}.{SOURCE_TABLE}", f"{project_id}.{QUANTIZED_TABLE}"
+    if target not in _quantized_table_ready:
+        table = bigquery.Table(target, schema=[
+            bigquery.SchemaField('report_id', 'STRING'),
+            bigquery.SchemaField('timestamp', 'TIMESTAMP'),
+            bigquery.SchemaField('embedding_q8', 'BYTES'),
+            bigquery.SchemaField('embedding_scale', 'FLOAT64'),
+        ])
+        table.clustering_fields = ['report_id']
+        bq_client.create_table(table, exists_ok=True)
+        _quantized_table_ready.add(target)
+
+    if report_ids is None:
+        report_ids = [row.report_id for row in bq_client.query(f"""
+        SELECT DISTINCT report_id
+        FROM `{source}` S
+        WHERE NOT EXISTS (SELECT 1 FROM `{target}` T WHERE T.report_id = S.report_id)
+        """).result()]
+
+    query = f"""
+    INSERT INTO `{target}` (report_id, timestamp, embedding_q8, embedding_scale)
+    SELECT
+      report_id,
+      timestamp,
+      CODE_POINTS_TO_BYTES(ARRAY(
+        SELECT CAST(ROUND(x / scale) AS INT64) + 128
+        FROM UNNEST(description_embedding) AS x WITH OFFSET AS o ORDER BY o
+      )),
+      scale
+    FROM (
+      SELECT report_id, timestamp, description_embedding,
+        IFNULL(NULLIF((SELECT MAX(ABS(x)) FROM UNNEST(description_embedding) AS x), 0), 127) / 127 AS scale
+      FROM `{source}`
+      WHERE report_id IN UNNEST(@report_ids)
+        AND report_id NOT IN (SELECT report_id FROM `{target}` WHERE report_id IN UNNEST(@report_ids))
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY timestamp DESC) = 1
+    )
+    """
+    inserted = 0
+    for i in range(0, len(report_ids), chunk_size):
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter("report_ids", "STRING", report_ids[i:i + chunk_size])])
+        job = bq_client.query(query, job_config=job_config)
+        job.result()
+        inserted += job.num_dml_affected_rows or 0
+    print(f"[REPORT INDEX] Quantized {inserted} new embeddings into {target}")
+    return inserted
+
+
+def quantized_candidates_sql(project_id: str) -> str:
+    """BigQuery candidate stage over ReportEmbeddingsQ8 (params: @query_embedding, @candidates)"""
+    return f"""
+    SELECT report_id,
+      embedding_scale * (
+        SELECT SUM((c - 128) * y)
+        FROM UNNEST(TO_CODE_POINTS(embedding_q8)) AS c WITH OFFSET
+        JOIN UNNEST(@query_embedding) AS y WITH OFFSET
+        USING (offset)
+      ) AS approx_similarity
+    FROM `{project_id}.{QUANTIZED_TABLE}`
+    ORDER BY approx_similarity DESC
+    LIMIT @candidates
+    """
+
+
+_report_index = None
+_report_index_lock = threading.Lock()
+
+
+def get_report_vector_index() -> Optional[ReportVectorIndex]:
+    """Shared index instance; None when numpy is missing or the index is disabled"""
+    global _report_index
+    if not NUMPY_AVAILABLE or os.getenv('REPORT_INDEX_ENABLED', 'true').lower() == 'false':
+        return None
+    with _report_index_lock:
+        if _report_index is None:
+            _report_index = ReportVectorIndex()
+    return _report_index
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from google.cloud import bigquery
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Build or top up the local report embedding index')
+    parser.add_argument('--index-dir', help=f'Output directory (default: {DEFAULT_INDEX_DIR})')
+    parser.add_argument('--sync-bigquery', action='store_true', help=f'Also top up {QUANTIZED_TABLE} and cluster {SOURCE_TABLE} on report_id')
+    parser.add_argument('--benchmark', action='store_true', help='Measure quantized vs float recall@10 and memory')
+    parser.add_argument('--no-refresh', action='store_true', help='Use the local index as is')
+    args = parser.parse_args()
+
+    index = ReportVectorIndex(args.index_dir)
+    client = bigquery.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT'))
+    if BIGQUERY_METRICS_AVAILABLE:
+        client = instrument_bigquery_client(client, tag='cli.report_vector_index')
+    if not args.no_refresh:
+        index.refresh(client)
+    if args.sync_bigquery:
+        cluster_source_table(client)
+        sync_bigquery_quantized(client)
+    print(f"[REPORT INDEX] Done: {index.stats()}")
+    if args.benchmark:
+        while index._ivf_building:
+            time.sleep(0.5)
+        print(json.dumps(index.benchmark(), indent=2))
@@ -2656,6 +2656,8 @@ async function askAIStream(question) {
         const decoder = new TextDecoder();
         let buffer = '';
         let finalResponse = '';
+        let streamedText = '';
+        const streamingText = loadingMsg ? loadingMsg.querySelector('p') : null;
         
         while (true) {
             const { value, done } = await reader.read();
@@ -2675,8 +2677,29 @@ async function askAIStream(question) {
                 if (line.startsWith('data: ')) {
                     try {
                         const eventData = JSON.parse(line.substring(6));
+                        
+                        // Token deltas: grow the pending message as the model writes
+                        if (eventData.type === 'token') {
+                            streamedText += eventData.content || '';
+                            if (streamingText) {
+                                streamingText.textContent = streamedText;
+                                chatMessages.scrollTop = chatMessages.scrollHeight;
+                            }
+                            continue;
+                        }
+                        
+                        if (eventData.type === 'metrics') {
+                            console.log('[Stream Metrics]', eventData);
+                            continue;
+                        }
+                        
                         console.log('[Stream Event]', eventData);
                         
+                        // A different agent starts a new answer
+                        if (eventData.type === 'agent_active') {
+                            streamedText = '';
+                        }
+                        
                         // Add to workflow visualization
                         addAgentStep(eventData);
                         
@@ -67,6 +67,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentPage = 1;
     const rowsPerPage = 20;
     let totalReports = 0;
+    let pageCursors = [null];  // keyset cursor for each visited page (index = page - 1)
+    let hasMoreReports = false;
+    let lastFilterKey = null;
     let allReports = [];
     let chartGranularity = 'day'; // 'hour' or 'day'
     let locationGroupBy = 'zipcode'; // 'zipcode', 'city', 'county', or 'state'
@@ -365,9 +368,18 @@ document.addEventListener('DOMContentLoaded', function() {
             if (currentFilters.status) params.append('status', currentFilters.status);
             if (currentFilters.timeframe) params.append('timeframe', currentFilters.timeframe);
             
-            // Add pagination
+            // Cursors are only valid for the filter set that produced them
+            const filterKey = params.toString();
+            if (filterKey !== lastFilterKey || currentPage === 1) {
+                currentPage = 1;
+                pageCursors = [null];
+                lastFilterKey = filterKey;
+            }
+            
+            // Add pagination (keyset cursor instead of offset)
             params.append('limit', rowsPerPage);
-            params.append('offset', (currentPage - 1) * rowsPerPage);
+            const cursor = pageCursors[currentPage - 1];
+            if (cursor) params.append('cursor', cursor);
             
             console.log('Fetching reports with params:', params.toString());
             
@@ -376,10 +388,16 @@ document.addEventListener('DOMContentLoaded', function() {
             
            if (data.success) {
                 allReports = data.reports;
-                totalReports = data.stats.total_reports; // Use new stats object
+                hasMoreReports = data.has_more;
+                pageCursors[currentPage] = data.next_cursor;
                 
-                // 1. Update top stat cards
-                updateQuickStats(data.stats); // <-- Renamed to avoid confusion
+                // Stats only come back with the first page; keep the previous totals otherwise
+                if (data.stats) {
+                    totalReports = data.stats.total_reports; // Use new stats object
+                    
+                    // 1. Update top stat cards
+                    updateQuickStats(data.stats); // <-- Renamed to avoid confusion
+                }
                 
                 // 2. Update critical alerts list
                 updateCriticalAlertsList(allReports);
@@ -649,7 +667,7 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('currentPageInfo').textContent = `Page ${currentPage} of ${totalPages} (${totalReports} total reports)`;
         
         document.getElementById('prevPageBtn').disabled = currentPage === 1;
-        document.getElementById('nextPageBtn').disabled = currentPage >= totalPages;
+        document.getElementById('nextPageBtn').disabled = currentPage >= totalPages || !hasMoreReports;
     }
     
     // Change page
@@ -851,6 +869,18 @@ document.addEventListener('DOMContentLoaded', function() {
             exportBtn.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Exporting...';
             exportBtn.disabled = true;
             
+            if (format === 'pdf' || format === 'xlsx') {
+                // Large documents are built by a background export job
+                try {
+                    const downloadUrl = await runExportJob(format, params, exportBtn);
+                    window.location.href = downloadUrl;
+                } finally {
+                    exportBtn.innerHTML = originalHTML;
+                    exportBtn.disabled = false;
+                }
+                return;
+            }
+            
             // Open download in new window
             window.location.href = `/api/export-reports/${format}?${params}`;
             
@@ -866,6 +896,33 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Submit an export job and poll it until the file is ready; returns the download URL
+    async function runExportJob(format, params, exportBtn) {
+        const response = await fetch('/api/export-jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ format, filters: Object.fromEntries(params) })
+        });
+        let job = await response.json();
+        if (!response.ok || !job.success) {
+            throw new Error(job.error || 'Failed to start export');
+        }
+        
+        while (job.status !== 'completed') {
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Export failed');
+            }
+            exportBtn.innerHTML = `<i class="fas fa-spinner fa-spin mr-2"></i>Exporting ${job.progress || 0}%`;
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const statusResponse = await fetch(job.status_url);
+            job = await statusResponse.json();
+            if (!statusResponse.ok) {
+                throw new Error(job.error || 'Export job not found');
+            }
+        }
+        return job.download_url;
+    }
+    
     // View report details (modal)
     window.viewReportDetails = function(report) {
         const modal = document.getElementById('reportDetailModal');
@@ -0,0 +1,122 @@
+"""
+Benchmark: worker throughput with per-message inserts vs micro-batched inserts
+
+A simulated BigQuery client replaces insert_rows_json: each call costs a fixed
+round trip plus a small per-row cost, and rows whose description contains
+"INVALID" are rejected the way insertAll rejects them (that row 'invalid', every
+other row in the request 'stopped'). Messages are delivered like the Pub/Sub
+streaming pull: a callback pool, with at most `max_outstanding` messages
+unacknowledged at a time (flow control).
+
+Per-message mode is the previous worker (flow control of 10, one insert per
+message); batched mode uses InsertStage with the worker's configured flow control.
+
+Usage (from workers/, with requirements.txt installed):
+    python benchmark_insert_batching.py [--messages 2000] [--rtt-ms 60] [--invalid-rate 0.01]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bigquery_worker as worker
+
+
+class SimulatedBigQuery:
+    """insert_rows_json with a round-trip delay and insertAll's per-row error format"""
+
+    def __init__(self, rtt_ms: float, row_ms: float):
+        self.rtt = rtt_ms / 1000
+        self.row = row_ms / 1000
+        self.calls = 0
+        self.rows = {}  # insertId -> row (a retried insertId is not duplicated)
+        self._lock = threading.Lock()
+
+    def insert_rows_json(self, table_ref, rows, row_ids=None):
+        time.sleep(self.rtt + self.row * len(rows))
+        invalid = {i for i, row in enumerate(rows) if 'INVALID' in row.get('description', '')}
+        with self._lock:
+            self.calls += 1
+            if invalid:
+                return [{"index": i, "errors": [{"reason": "invalid" if i in invalid else "stopped"}]}
+                        for i in range(len(rows))]
+            for row_id, row in zip(row_ids or [None] * len(rows), rows):
+                self.rows[row_id or id(row)] = row
+        return []
+
+
+class SimulatedMessage:
+    def __init__(self, report: dict, done):
+        self.data = json.dumps(report).encode('utf-8')
+        self._done = done
+
+    def ack(self):
+        self._done('ack')
+
+    def nack(self):
+        self._done('nack')
+
+
+def run(mode: str, messages: int, rtt_ms: float, row_ms: float, invalid_rate: float,
+        max_outstanding: int, callback_threads: int = 10) -> dict:
+    client = SimulatedBigQuery(rtt_ms, row_ms)
+    worker.bigquery_client = client
+    worker.embedding_stage = worker.hotspot_detector = None
+    worker.insert_stage = (worker.InsertStage(client, 'benchmark.table', on_inserted=worker.after_insert)
+                           if mode == 'batched' else None)
+
+    rng = random.Random(0)
+    outstanding = threading.BoundedSemaphore(max_outstanding)
+    results = {'ack': 0, 'nack': 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def deliver(i: int, description: str):
+        started_at = time.time()
+
+        def done(outcome: str):
+            with lock:
+                results[outcome] += 1
+                latencies.append(time.time() - started_at)
+            outstanding.release()
+
+        worker.process_message(SimulatedMessage({'report_id': f'r{i}', 'description': description}, done))
+
+    started_at = time.time()
+    with ThreadPoolExecutor(callback_threads) as pool:
+        for i in range(messages):
+            outstanding.acquire()
+            pool.submit(deliver, i, 'INVALID row' if rng.random() < invalid_rate else f'smoke near school {i}')
+    while results['ack'] + results['nack'] < messages:
+        time.sleep(0.01)
+    elapsed = time.time() - started_at
+    if worker.insert_stage:
+        worker.insert_stage.stop()
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'messages_per_sec': round(messages / elapsed, 1),
+        'insert_calls': client.calls,
+        'acked': results['ack'],
+        'nacked': results['nack'],
+        'rows_written': len(client.rows),
+        'p50_ack_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ack_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--rtt-ms', type=float, default=60.0, help='insertAll round trip')
+    parser.add_argument('--row-ms', type=float, default=0.2, help='additional cost per row')
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help='fraction of rows BigQuery rejects')
+    args = parser.parse_args()
+
+    print(f"{args.messages} messages, {args.rtt_ms:.0f}ms insert round trip, batch {worker.INSERT_BATCH_SIZE} / "
+          f"{worker.INSERT_MAX_WAIT * 1000:.0f}ms, invalid rate {args.invalid_rate}")
+    for mode, max_outstanding in (('per-message', 10), ('batched', worker.MAX_OUTSTANDING_MESSAGES)):
+        print(run(mode, args.messages, args.rtt_ms, args.row_ms, args.invalid_rate, max_outstanding))
@@ -1,18 +1,34 @@
 """
 BigQuery Worker for Cloud Run
 Consumes messages from community-reports-submitted topic
-Inserts reports into BigQuery (same table as current direct insert)
+Inserts reports into BigQuery (same table as current direct insert) in
+micro-batches: one insertAll call per WORKER_INSERT_BATCH_SIZE reports or
+WORKER_INSERT_MAX_WAIT_MS, each message acked or nacked by its own row result
+Optionally embeds each report description and writes it to ReportEmbeddings
+(set GEMINI_API_KEY; disable with WORKER_EMBEDDINGS_ENABLED=false)
+Hotspot detection (report counts per geohash/county cell and hour/day, served
+from memory at GET /hotspots) runs as its own single-instance deployment with
+WORKER_MODE=hotspots: it does not subscribe, it polls the reports table by
+insertion time, so it sees every report once however many ingest workers run
+and also reports the app inserts directly when USE_PUBSUB=false
 """
 import os
 import sys
+import base64
 import json
+import math
 import logging
+import random
 import threading
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 from google.cloud import pubsub_v1, bigquery
 from concurrent import futures
+import requests
 import signal
 import time
+from datetime import datetime, timedelta, timezone
+from hotspot_detector import HotspotDetector
 
 # Configure logging
 logging.basicConfig(
@@ -27,11 +43,43 @@ PROJECT_ID = os.getenv('GOOGLE_CLOUD_PROJECT', 'qwiklabs-gcp-00-4a7d408c735c')
 SUBSCRIPTION_NAME = os.getenv('SUBSCRIPTION_NAME', 'bigquery-writer-sub')
 DATASET_ID = os.getenv('BIGQUERY_DATASET', 'CrowdsourceData')
 TABLE_ID = os.getenv('BIGQUERY_TABLE_REPORTS', 'CrowdSourceData')
+EMBEDDINGS_TABLE_ID = os.getenv('BIGQUERY_TABLE_EMBEDDINGS', 'ReportEmbeddings')
+# int8 copy used as the candidate stage of the BigQuery semantic search (see report_vector_index_service.py)
+QUANTIZED_TABLE_ID = os.getenv('BIGQUERY_TABLE_EMBEDDINGS_Q8', 'ReportEmbeddingsQ8')
+
+# Insert micro-batching (WORKER_INSERT_BATCH_SIZE=1 inserts every message on its own)
+INSERT_BATCH_SIZE = max(1, min(int(os.getenv('WORKER_INSERT_BATCH_SIZE', '100')), 500))
+INSERT_MAX_WAIT = float(os.getenv('WORKER_INSERT_MAX_WAIT_MS', '200')) / 1000
+MAX_OUTSTANDING_MESSAGES = int(os.getenv('WORKER_MAX_OUTSTANDING_MESSAGES', str(max(10, INSERT_BATCH_SIZE * 2))))
+
+# Embedding stage (same model and columns as generate_report_embeddings)
+EMBEDDINGS_ENABLED = os.getenv('WORKER_EMBEDDINGS_ENABLED', 'true').lower() != 'false'
+EMBEDDING_MODEL = "models/text-embedding-004"
+BATCH_EMBED_URL = f"https://generativelanguage.googleapis.com/v1beta/{EMBEDDING_MODEL}:batchEmbedContents"
+EMBED_BATCH_SIZE = min(int(os.getenv('WORKER_EMBED_BATCH_SIZE', '50')), 100)  # API maximum is 100
+EMBED_MAX_WAIT = float(os.getenv('WORKER_EMBED_MAX_WAIT', '2'))  # seconds a report waits for its batch to fill
+EMBED_MAX_RETRIES = int(os.getenv('WORKER_EMBED_MAX_RETRIES', '3'))
+EMBEDDING_COLUMNS = ['report_id', 'city', 'state', 'county', 'description', 'severity', 'report_type',
+                     'timestamp', 'contact_name', 'contact_email', 'contact_phone', 'is_anonymous']
+
+# Hotspot counters live in process memory, so exactly one process may keep them:
+# WORKER_MODE=hotspots (deployed with --max-instances 1) feeds them from BigQuery and serves
+# /hotspots; ingest workers scale out and leave them off. WORKER_HOTSPOTS_ENABLED=true counts
+# in an ingest worker instead, which is only correct with a single instance and USE_PUBSUB=true.
+WORKER_MODE = os.getenv('WORKER_MODE', 'ingest').lower()
+HOTSPOTS_ENABLED = WORKER_MODE == 'hotspots' or os.getenv('WORKER_HOTSPOTS_ENABLED', 'false').lower() == 'true'
+HOTSPOT_WARMUP_DAYS = int(os.getenv('HOTSPOT_WARMUP_DAYS', '14'))  # history replayed at startup
+HOTSPOT_POLL_INTERVAL = int(os.getenv('HOTSPOT_POLL_INTERVAL', '60'))  # seconds between table polls
+HOTSPOT_POLL_OVERLAP_MINUTES = 10  # rows still in the streaming buffer or stamped by a skewed clock
 
 # Global clients
 subscriber = None
 bigquery_client = None
 subscription_path = None
+insert_stage = None
+stamp_inserted_at = False  # set once CrowdSourceData.inserted_at is known to exist
+embedding_stage = None
+hotspot_detector = None
 health_status = {"healthy": False, "messages_processed": 0}
 
 # Simple HTTP health check server for Cloud Run
@@ -42,16 +90,43 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
         """Suppress HTTP logs"""
         pass
     
+    def _send_json(self, status: int, body: dict):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
     def do_GET(self):
         """Respond to GET requests"""
-        if self.path in ['/', '/health', '/healthz']:
+        url = urlparse(self.path)
+        if url.path == '/hotspots':
+            # ?state=CA,California&county=Alameda&report_type=&resolution=hour|day&all=1&limit=20
+            if not hotspot_detector:
+                self._send_json(503, {"success": False, "error": "Hotspot detection not enabled"})
+                return
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            started_at = time.time()
+            hotspots = hotspot_detector.hotspots(
+                state=[s for s in params.get('state', '').split(',') if s] or None,
+                county=params.get('county'),
+                report_type=params.get('report_type'),
+                resolution=params.get('resolution'),
+                include_all=params.get('all') in ('1', 'true'),
+                limit=min(int(params.get('limit', '20')), 200),
+            )
+            self._send_json(200, {"success": True, "hotspots": hotspots, "stats": hotspot_detector.stats(),
+                                  "elapsed_ms": round((time.time() - started_at) * 1000, 2)})
+        elif self.path in ['/', '/health', '/healthz']:
             if health_status["healthy"]:
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
                 response = json.dumps({
                     "status": "healthy",
-                    "messages_processed": health_status["messages_processed"]
+                    "messages_processed": health_status["messages_processed"],
+                    "inserts": insert_stage.stats() if insert_stage else None,
+                    "embeddings": embedding_stage.stats() if embedding_stage else None,
+                    "hotspots": hotspot_detector.stats() if hotspot_detector else None
                 })
                 self.wfile.write(response.encode())
             else:
@@ -79,6 +154,9 @@ def initialize_clients():
         subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_NAME)
         logger.info(f"[INIT] Subscriber initialized: {subscription_path}")
         
+        # Not wrapped by bigquery_metrics_service.instrument_bigquery_client: the worker image is built
+        # from workers/ alone, and its BigQuery traffic is streaming inserts (no query jobs to meter)
+        # apart from the startup DDL and the hotspot warm-up/poll, visible in INFORMATION_SCHEMA.JOBS
         bigquery_client = bigquery.Client(project=PROJECT_ID)
         logger.info(f"[INIT] BigQuery client initialized: {PROJECT_ID}")
         
@@ -88,6 +166,30 @@ def initialize_clients():
         logger.error(f"[INIT] Failed to initialize clients: {e}")
         return False
 
+def ensure_inserted_at_column() -> bool:
+    """
+    Add CrowdSourceData.inserted_at (metadata-only DDL) so rows carry their insertion time.
+    The report store's compaction delta (report_store_service.py) is bounded by it, as are the
+    embedding backfill and hotspot polling: a report that sat in the Pub/Sub backlog is
+    inserted long after its own timestamp, and without the column such a version would fall
+    behind the compaction high-water mark.
+    """
+    try:
+        bigquery_client.query(
+            f"ALTER TABLE `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}` ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMP"
+        ).result()
+        return True
+    except Exception as e:
+        logger.warning(f"[INIT] Could not ensure inserted_at column, rows will not carry it: {e}")
+        return False
+
+
+def with_inserted_at(report_data: dict) -> dict:
+    if not stamp_inserted_at:
+        return report_data
+    return dict(report_data, inserted_at=datetime.now(timezone.utc).isoformat())
+
+
 def insert_to_bigquery(report_data: dict) -> bool:
     """
     Insert report data to BigQuery
@@ -104,7 +206,8 @@ def insert_to_bigquery(report_data: dict) -> bool:
         table_ref = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
         
         # Same insert method as app_local.py line 2270
-        errors = bigquery_client.insert_rows_json(table_ref, [report_data])
+        errors = bigquery_client.insert_rows_json(table_ref, [with_inserted_at(report_data)],
+                                                  row_ids=[report_data.get('report_id')])
         
         if errors:
             logger.error(f"[BIGQUERY] Insert errors: {errors}")
@@ -117,6 +220,313 @@ def insert_to_bigquery(report_data: dict) -> bool:
         logger.error(f"[BIGQUERY] Insert failed: {e}", exc_info=True)
         return False
 
+class InsertStage:
+    """
+    Buffers Pub/Sub messages and inserts their reports in micro-batches.
+
+    A batch is flushed when it reaches `batch_size` rows or its oldest message has
+    waited `max_wait` seconds, with one insert_rows_json call and insertId =
+    report_id per row (redelivered messages do not create duplicate rows). Each
+    message is then acked or nacked on its own row's result: rows BigQuery only
+    stopped because another row in the request was invalid are retried once
+    without the invalid rows.
+    """
+
+    def __init__(self, client, table_ref: str, batch_size: int = INSERT_BATCH_SIZE,
+                 max_wait: float = INSERT_MAX_WAIT, on_inserted=None):
+        """
+        Args:
+            client: BigQuery client (anything with insert_rows_json)
+            table_ref: project.dataset.table to insert into
+            batch_size: Rows per insert call
+            max_wait: Seconds the first message of a batch waits for it to fill
+            on_inserted: Called with each inserted report after its message is acked
+        """
+        self.client = client
+        self.table_ref = table_ref
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.on_inserted = on_inserted
+        self._pending = []  # (message, report_data, enqueued_at)
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.inserted = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.batches = 0
+        self.insert_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name='insert-stage', daemon=True)
+        self._thread.start()
+
+    def submit(self, message, report_data: dict):
+        with self._cond:
+            if self._stopping:
+                self.rejected += 1
+                message.nack()  # shutting down: another instance will take it
+                return
+            self._pending.append((message, report_data, time.time()))
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()  # first message starts the max_wait clock; a full batch flushes now
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                while 0 < len(self._pending) < self.batch_size and not self._stopping:
+                    remaining = self._pending[0][2] + self.max_wait - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)  # let the batch fill
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                if not batch and self._stopping:
+                    return
+            if batch:
+                self._flush(batch)
+
+    def _insert(self, batch):
+        """Insert a batch; returns {index: errors} for the rows that were not inserted"""
+        rows = [with_inserted_at(report) for _, report, _ in batch]
+        started_at = time.time()
+        try:
+            errors = self.client.insert_rows_json(self.table_ref, rows,
+                                                  row_ids=[r.get('report_id') for r in rows])
+        except Exception as e:
+            logger.error(f"[BIGQUERY] Insert of {len(rows)} row(s) failed: {e}")
+            errors = [{"index": i, "errors": [{"reason": "request_failed", "message": str(e)}]}
+                      for i in range(len(rows))]
+        self.insert_seconds += time.time() - started_at
+        return {e["index"]: e["errors"] for e in errors or []}
+
+    def _flush(self, batch):
+        started_at = time.time()
+        failed = self._insert(batch)
+        stopped = [i for i, errors in failed.items() if all(e.get("reason") == "stopped" for e in errors)]
+        if stopped and len(stopped) < len(batch):
+            # Valid rows held back by an invalid one: retry them on their own
+            self.retried += len(stopped)
+            retry_failed = self._insert([batch[i] for i in stopped])
+            for position, i in enumerate(stopped):
+                if position in retry_failed:
+                    failed[i] = retry_failed[position]
+                else:
+                    del failed[i]
+
+        self.batches += 1
+        for i, (message, report, _) in enumerate(batch):
+            if i in failed:
+                self.failed += 1
+                message.nack()  # redelivered; insertId keeps a retry from duplicating the row
+                logger.warning(f"[RETRY] Report {report.get('report_id')} will be retried: {failed[i][:2]}")
+                continue
+            message.ack()
+            self.inserted += 1
+            if self.on_inserted:
+                try:
+                    self.on_inserted(report)
+                except Exception as e:
+                    logger.warning(f"[WORKER] Post-insert step failed for {report.get('report_id')}: {e}")
+        logger.info(f"[BIGQUERY] Batch of {len(batch)}: {len(batch) - len(failed)} inserted, {len(failed)} nacked "
+                    f"in {time.time() - started_at:.2f}s")
+
+    def stop(self, timeout: float = 20):
+        """Stop accepting messages and flush the buffered ones"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"inserted": self.inserted, "failed": self.failed, "retried": self.retried,
+                "rejected_on_shutdown": self.rejected, "batches": self.batches,
+                "avg_batch_size": round((self.inserted + self.failed) / self.batches, 1) if self.batches else None,
+                "avg_insert_ms": round(self.insert_seconds / self.batches * 1000, 1) if self.batches else None,
+                "pending": len(self._pending), "batch_size": self.batch_size}
+
+
+def quantize_q8(vector) -> tuple:
+    """(base64 int8 codes + 128, scale): the encoding sync_bigquery_quantized writes to ReportEmbeddingsQ8"""
+    scale = (max(abs(x) for x in vector) or 127) / 127
+    codes = bytes(int(math.copysign(math.floor(abs(x) / scale + 0.5), x)) + 128 for x in vector)
+    return base64.b64encode(codes).decode('ascii'), scale
+
+
+class EmbeddingStage:
+    """
+    Embeds reports after their main insert and writes them to ReportEmbeddings.
+
+    Reports are queued and embedded in batches (up to EMBED_BATCH_SIZE texts per
+    batchEmbedContents call, or whatever arrived within EMBED_MAX_WAIT seconds).
+    The stage never blocks or fails a message: a report that cannot be embedded
+    here is left to the generate_report_embeddings backfill.
+
+    Each embedding's int8 copy is written to ReportEmbeddingsQ8 as well, so the
+    BigQuery search's candidate stage sees the report right away; a Q8 row that
+    fails is added by the backfill's sync instead.
+    """
+
+    def __init__(self, api_key: str, table_ref: str, q8_table_ref: str = None,
+                 batch_size: int = EMBED_BATCH_SIZE, max_wait: float = EMBED_MAX_WAIT):
+        self.api_key = api_key
+        self.table_ref = table_ref
+        self.q8_table_ref = q8_table_ref
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.session = requests.Session()
+        self._pending = []  # (report_data, enqueued_at)
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.embedded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.q8_failed = 0
+        self._thread = threading.Thread(target=self._run, name='embedding-stage', daemon=True)
+        self._thread.start()
+
+    def submit(self, report_data: dict):
+        if not (report_data.get('description') or '').strip():
+            self.skipped += 1
+            return
+        with self._cond:
+            self._pending.append((report_data, time.time()))
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()  # first report starts the max_wait clock; a full batch flushes now
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                while 0 < len(self._pending) < self.batch_size and not self._stopping:
+                    remaining = self._pending[0][1] + self.max_wait - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)  # let the batch fill
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                if not batch and self._stopping:
+                    return
+            if batch:
+                self._flush([report for report, _ in batch])
+
+    def _embed(self, texts):
+        payload = {"requests": [{"model": EMBEDDING_MODEL, "content": {"parts": [{"text": t}]}} for t in texts]}
+        headers = {"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            response = self.session.post(BATCH_EMBED_URL, headers=headers, data=json.dumps(payload), timeout=30)
+            if response.status_code not in (429, 500, 502, 503, 504) or attempt == EMBED_MAX_RETRIES:
+                response.raise_for_status()
+                return [e["values"] for e in response.json()["embeddings"]]
+            time.sleep(min(2 ** attempt, 10) * (0.5 + random.random()))
+
+    def _flush(self, batch):
+        started_at = time.time()
+        try:
+            vectors = self._embed([r['description'] for r in batch])
+            rows = [dict({c: r.get(c) for c in EMBEDDING_COLUMNS}, description_embedding=v)
+                    for r, v in zip(batch, vectors)]
+            # insertId = report_id, so a redelivered message does not create a second row
+            errors = bigquery_client.insert_rows_json(self.table_ref, rows, row_ids=[r['report_id'] for r in rows])
+            if errors:
+                raise RuntimeError(f"insert errors: {errors[:3]}")
+            self.embedded += len(batch)
+            self.batches += 1
+            logger.info(f"[EMBEDDINGS] Embedded {len(batch)} report(s) in {time.time() - started_at:.2f}s")
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"[EMBEDDINGS] Batch of {len(batch)} failed, left for backfill: {e}")
+            return
+        if self.q8_table_ref:
+            self._insert_quantized(rows)
+
+    def _insert_quantized(self, rows):
+        q8_rows = []
+        for row in rows:
+            codes, scale = quantize_q8(row['description_embedding'])
+            q8_rows.append({'report_id': row['report_id'], 'timestamp': row['timestamp'],
+                            'embedding_q8': codes, 'embedding_scale': scale})
+        try:
+            errors = bigquery_client.insert_rows_json(self.q8_table_ref, q8_rows,
+                                                      row_ids=[r['report_id'] for r in q8_rows])
+            if errors:
+                raise RuntimeError(f"insert errors: {errors[:3]}")
+        except Exception as e:
+            self.q8_failed += len(q8_rows)
+            logger.warning(f"[EMBEDDINGS] Q8 rows for {len(q8_rows)} report(s) failed, left for the backfill sync: {e}")
+
+    def stop(self, timeout: float = 10):
+        """Flush queued reports before shutdown"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"embedded": self.embedded, "failed": self.failed, "skipped_empty": self.skipped,
+                "q8_failed": self.q8_failed, "batches": self.batches, "pending": len(self._pending)}
+
+
+def warm_hotspot_detector(detector: HotspotDetector) -> int:
+    """Replay recent reports (oldest first) so baselines exist before live messages arrive"""
+    sql = f"""
+    SELECT report_id, timestamp, state, county, city, report_type, latitude, longitude
+    FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)
+    ORDER BY timestamp
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("days", "INT64", HOTSPOT_WARMUP_DAYS)])
+    started_at = time.time()
+    count = detector.observe_many(dict(row) for row in bigquery_client.query(sql, job_config=job_config).result())
+    logger.info(f"[HOTSPOTS] Warmed baselines from {count} report(s) in {time.time() - started_at:.1f}s")
+    return count
+
+
+def poll_hotspot_reports(detector: HotspotDetector, since: datetime) -> datetime:
+    """
+    Count reports inserted after `since` (minus the overlap; the detector drops report_ids it
+    has seen). Returns the insertion time to poll from next.
+    """
+    ingested_at = "COALESCE(inserted_at, timestamp)" if stamp_inserted_at else "timestamp"
+    sql = f"""
+    SELECT report_id, timestamp, state, county, city, report_type, latitude, longitude,
+      {ingested_at} AS ingested_at
+    FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+    WHERE timestamp >= @floor AND {ingested_at} > @since
+    ORDER BY timestamp
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("since", "TIMESTAMP", since - timedelta(minutes=HOTSPOT_POLL_OVERLAP_MINUTES)),
+        # Older reports cannot move the current hour/day buckets; also prunes partitions
+        bigquery.ScalarQueryParameter("floor", "TIMESTAMP", datetime.now(timezone.utc) - timedelta(days=2)),
+    ])
+    latest = since
+    for row in bigquery_client.query(sql, job_config=job_config).result():
+        detector.observe(dict(row))
+        latest = max(latest, row.ingested_at)
+    return latest
+
+
+def run_hotspot_service(detector: HotspotDetector, since: datetime):
+    """WORKER_MODE=hotspots: keep the detector current from the reports table (blocks until shutdown)"""
+    while True:
+        time.sleep(HOTSPOT_POLL_INTERVAL)
+        try:
+            since = poll_hotspot_reports(detector, since)
+        except Exception as e:
+            logger.warning(f"[HOTSPOTS] Poll failed, retrying in {HOTSPOT_POLL_INTERVAL}s: {e}")
+
+
+def after_insert(report_data: dict):
+    """Downstream steps for a report whose row is in BigQuery"""
+    health_status["messages_processed"] += 1
+    if embedding_stage:
+        embedding_stage.submit(report_data)
+    if hotspot_detector:
+        hotspot_detector.observe(report_data)
+
+
 def process_message(message: pubsub_v1.subscriber.message.Message):
     """
     Process a single Pub/Sub message
@@ -132,7 +542,12 @@ def process_message(message: pubsub_v1.subscriber.message.Message):
         message_data = message.data.decode('utf-8')
         report_data = json.loads(message_data)
         report_id = report_data.get('report_id', 'unknown')
-        
+
+        if insert_stage:
+            # Acked or nacked by the insert stage once its batch is written
+            insert_stage.submit(message, report_data)
+            return
+
         logger.info(f"[WORKER] Processing report {report_id}")
         
         # Insert to BigQuery (same as app_local.py)
@@ -141,9 +556,7 @@ def process_message(message: pubsub_v1.subscriber.message.Message):
         if success:
             # Acknowledge message (will not be redelivered)
             message.ack()
-            
-            # Update health status
-            health_status["messages_processed"] += 1
+            after_insert(report_data)
             
             elapsed = time.time() - start_time
             logger.info(f"[SUCCESS] Report {report_id} processed in {elapsed:.2f}s")
@@ -162,9 +575,42 @@ def process_message(message: pubsub_v1.subscriber.message.Message):
         # Nack to retry
         message.nack()
 
+def create_hotspot_detector() -> HotspotDetector:
+    detector = HotspotDetector(
+        geohash_precision=int(os.getenv('HOTSPOT_GEOHASH_PRECISION', '5')),
+        z_threshold=float(os.getenv('HOTSPOT_Z_THRESHOLD', '3')),
+        min_count=int(os.getenv('HOTSPOT_MIN_COUNT', '3')),
+        origin=time.time() - HOTSPOT_WARMUP_DAYS * 86400,
+    )
+    try:
+        warm_hotspot_detector(detector)
+    except Exception as e:
+        detector.origin = time.time()  # no history: flag only once baselines have built up live
+        logger.warning(f"[HOTSPOTS] Warm-up failed, starting with empty baselines: {e}")
+    return detector
+
+
+def run_hotspots_mode():
+    """Serve /hotspots from a detector fed by polling the reports table (no subscription)"""
+    global hotspot_detector
+    since = datetime.now(timezone.utc)  # the warm-up replays everything before this
+    hotspot_detector = create_hotspot_detector()
+    health_status["healthy"] = True
+    logger.info(f"[WORKER] Hotspot service ready, polling every {HOTSPOT_POLL_INTERVAL}s "
+                "(run exactly one instance)")
+
+    def signal_handler(signum, frame):
+        logger.info("[WORKER] Received shutdown signal")
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGINT, signal_handler)
+    run_hotspot_service(hotspot_detector, since)
+
+
 def main():
     """Main worker loop"""
-    logger.info("[WORKER] Starting BigQuery Worker")
+    logger.info(f"[WORKER] Starting BigQuery Worker (mode: {WORKER_MODE})")
     logger.info(f"[WORKER] Target: {PROJECT_ID}.{DATASET_ID}.{TABLE_ID}")
     
     # Start health check server in background thread
@@ -175,14 +621,44 @@ def main():
     if not initialize_clients():
         logger.error("[WORKER] Failed to initialize, exiting")
         sys.exit(1)
+
+    # Insertion time on every row (report store compaction delta, embedding backfill and hotspot polling)
+    global stamp_inserted_at
+    stamp_inserted_at = ensure_inserted_at_column()
+
+    if WORKER_MODE == 'hotspots':
+        run_hotspots_mode()
+        return
     
+    # Optional embedding stage
+    global embedding_stage
+    api_key = os.getenv('GEMINI_API_KEY')
+    if EMBEDDINGS_ENABLED and api_key:
+        embedding_stage = EmbeddingStage(api_key, f"{PROJECT_ID}.{DATASET_ID}.{EMBEDDINGS_TABLE_ID}",
+                                         f"{PROJECT_ID}.{DATASET_ID}.{QUANTIZED_TABLE_ID}")
+        logger.info(f"[WORKER] Embedding stage enabled (batch {EMBED_BATCH_SIZE}, max wait {EMBED_MAX_WAIT}s)")
+    else:
+        logger.info("[WORKER] Embedding stage disabled (set GEMINI_API_KEY to enable)")
+
+    # Hotspot detection in this (single-instance) worker, warmed before subscribing so
+    # replayed history precedes live reports
+    global hotspot_detector
+    if HOTSPOTS_ENABLED:
+        hotspot_detector = create_hotspot_detector()
+
+    # Micro-batched inserts
+    global insert_stage
+    if INSERT_BATCH_SIZE > 1:
+        insert_stage = InsertStage(bigquery_client, f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}", on_inserted=after_insert)
+        logger.info(f"[WORKER] Insert batching enabled (batch {INSERT_BATCH_SIZE}, max wait {INSERT_MAX_WAIT * 1000:.0f}ms)")
+
     # Mark as healthy
     health_status["healthy"] = True
     logger.info("[WORKER] Worker is healthy and ready")
     
     # Configure flow control
     flow_control = pubsub_v1.types.FlowControl(
-        max_messages=10,  # Process 10 messages concurrently
+        max_messages=MAX_OUTSTANDING_MESSAGES,  # enough outstanding messages to fill insert batches
         max_bytes=10 * 1024 * 1024,  # 10 MB
     )
     
@@ -198,7 +674,11 @@ def main():
     # Handle graceful shutdown
     def signal_handler(signum, frame):
         logger.info("[WORKER] Received shutdown signal")
+        if insert_stage:
+            insert_stage.stop()  # flush and ack buffered reports while the stream can still send acks
         streaming_pull_future.cancel()
+        if embedding_stage:
+            embedding_stage.stop()
         logger.info("[WORKER] Shutdown complete")
         sys.exit(0)
     
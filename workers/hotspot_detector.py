@@ -0,0 +1,304 @@
+"""
+Hotspot Detector - incremental spatiotemporal anomaly detection over community reports
+
+Fed by the BigQuery worker as reports arrive. Every report increments counters
+keyed by (resolution, cell, report_type):
+
+- resolution: 'hour' and 'day' time buckets
+- cell: a geohash cell when the report has coordinates, plus its county
+  (reports submitted through the web form carry a county but no coordinates)
+- report_type: the report's own type and '*' (all types)
+
+Each key keeps the count of its current bucket and an EWMA mean/variance of the
+counts of earlier buckets (empty buckets fold in as zeros), so the baseline is
+updated in O(1) per report and nothing is rescanned. A bucket is scored
+against its baseline with a Poisson tail probability and a z-score
+(x - mean) / sqrt(max(variance, mean)); cells with at least `min_count`
+reports, `z >= z_threshold` and enough history are flagged as hotspots.
+
+Stdlib only, so it ships with the worker image unchanged.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RESOLUTIONS = {
+    # width in seconds, EWMA alpha (about 1/alpha buckets of memory), buckets of history before flagging
+    'hour': (3600, 0.02, 24),
+    'day': (86400, 0.1, 7),
+}
+MIN_RATE = 0.1  # expected count floor per bucket, so a never-seen cell does not divide by zero
+MAX_ZERO_FOLDS = 1000  # empty buckets folded per roll; the baseline is ~0 long before this
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Reports carry the state as typed ("California" or "CA"); cells use the 2-letter code
+STATE_CODES = dict(pair.replace('_', ' ').split(':') for pair in (
+    "alabama:al alaska:ak arizona:az arkansas:ar california:ca colorado:co connecticut:ct delaware:de "
+    "florida:fl georgia:ga hawaii:hi idaho:id illinois:il indiana:in iowa:ia kansas:ks kentucky:ky "
+    "louisiana:la maine:me maryland:md massachusetts:ma michigan:mi minnesota:mn mississippi:ms "
+    "missouri:mo montana:mt nebraska:ne nevada:nv new_hampshire:nh new_jersey:nj new_mexico:nm "
+    "new_york:ny north_carolina:nc north_dakota:nd ohio:oh oklahoma:ok oregon:or pennsylvania:pa "
+    "rhode_island:ri south_carolina:sc south_dakota:sd tennessee:tn texas:tx utah:ut vermont:vt "
+    "virginia:va washington:wa west_virginia:wv wisconsin:wi wyoming:wy district_of_columbia:dc"
+).split())
+
+
+def geohash(latitude: float, longitude: float, precision: int = 5) -> str:
+    """Standard base-32 geohash (precision 5 is about 5 km x 5 km)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, rng = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def normalize_place(value) -> str:
+    text = ' '.join(str(value or '').casefold().split())
+    return text[:-len(' county')] if text.endswith(' county') else text
+
+
+def normalize_state(value) -> str:
+    text = normalize_place(value)
+    return STATE_CODES.get(text, text)
+
+
+def poisson_tail(count: int, rate: float) -> float:
+    """P(X >= count) for X ~ Poisson(rate)"""
+    if count <= 0:
+        return 1.0
+    term = math.exp(-rate)
+    cdf = term
+    for k in range(1, count):
+        term *= rate / k
+        cdf += term
+    return max(0.0, 1.0 - cdf)
+
+
+def _epoch(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class _CellSeries:
+    """Current bucket count and EWMA baseline for one (resolution, cell, report_type)"""
+    __slots__ = ('bucket', 'count', 'mean', 'var', 'first_bucket', 'closed')
+
+    def __init__(self, bucket: int, first_bucket: int):
+        self.bucket = bucket
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.first_bucket = first_bucket  # history before this key's first report counts as zeros
+        self.closed = None  # (bucket, count, mean, var) of the last bucket rolled into the baseline
+
+    def _fold(self, x: float, alpha: float):
+        diff = x - self.mean
+        incr = alpha * diff
+        self.mean += incr
+        self.var = (1 - alpha) * (self.var + diff * incr)
+
+    def roll(self, bucket: int, alpha: float):
+        if bucket <= self.bucket:
+            return
+        self.closed = (self.bucket, self.count, self.mean, self.var)
+        self._fold(self.count, alpha)
+        for _ in range(min(bucket - self.bucket - 1, MAX_ZERO_FOLDS)):
+            self._fold(0, alpha)
+        self.bucket, self.count = bucket, 0
+
+
+class HotspotDetector:
+    """Rolling per-cell report counts with EWMA baselines, scored for anomalies on demand"""
+
+    def __init__(self, geohash_precision: int = 5, z_threshold: float = 3.0, min_count: int = 3,
+                 retention_days: float = 60, origin: Optional[float] = None):
+        """
+        Args:
+            geohash_precision: Geohash length of the spatial cells
+            z_threshold: Minimum z-score for a hotspot
+            min_count: Minimum reports in the bucket for a hotspot
+            retention_days: Keys without reports for this long are dropped
+            origin: Epoch seconds the detector's history starts at (default now); buckets
+                between the origin and a cell's first report count as zero-report history
+        """
+        self.geohash_precision = geohash_precision
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.retention_seconds = retention_days * 86400
+        self.origin = origin if origin is not None else time.time()
+        self._series: Dict[Tuple[str, str, str], _CellSeries] = {}
+        self._labels: Dict[str, Dict] = {}  # cell -> {'state', 'county', 'city'}
+        self._seen: "OrderedDict[str, None]" = OrderedDict()  # recent report_ids (redelivery)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.observed = 0
+        self.duplicates = 0
+        self.late = 0
+        self.unlocated = 0
+
+    def _cells(self, report: Dict) -> List[str]:
+        cells = []
+        state, county = normalize_state(report.get('state')), normalize_place(report.get('county'))
+        labels = {'state': report.get('state'), 'county': report.get('county'), 'city': report.get('city')}
+        if county:
+            cell = f"county:{state}/{county}"
+            cells.append(cell)
+            self._labels.setdefault(cell, labels)
+        try:
+            latitude, longitude = float(report.get('latitude')), float(report.get('longitude'))
+        except (TypeError, ValueError):
+            latitude = longitude = None
+        if latitude is not None and (latitude or longitude):
+            cell = f"geohash:{geohash(latitude, longitude, self.geohash_precision)}"
+            cells.append(cell)
+            self._labels.setdefault(cell, labels)
+        return cells
+
+    def observe(self, report: Dict) -> int:
+        """Count one report (needs timestamp plus county and/or latitude/longitude). Returns keys updated."""
+        ts = _epoch(report.get('timestamp')) or time.time()
+        report_id = report.get('report_id')
+        report_type = normalize_place(report.get('report_type')) or 'unknown'
+        updated = 0
+        with self._lock:
+            if report_id:
+                if report_id in self._seen:
+                    self.duplicates += 1
+                    return 0
+                self._seen[report_id] = None
+                if len(self._seen) > 50000:
+                    self._seen.popitem(last=False)
+            cells = self._cells(report)
+            if not cells:
+                self.unlocated += 1
+                return 0
+            self.observed += 1
+            for resolution, (width, alpha, _) in RESOLUTIONS.items():
+                bucket = int(ts // width)
+                for cell in cells:
+                    for rtype in (report_type, '*'):
+                        key = (resolution, cell, rtype)
+                        series = self._series.get(key)
+                        if series is None:
+                            series = self._series[key] = _CellSeries(bucket, int(self.origin // width))
+                        series.roll(bucket, alpha)
+                        if bucket < series.bucket:
+                            self.late += 1
+                            continue
+                        series.count += 1
+                        updated += 1
+            if ts - self._last_prune > 3600:
+                self._prune(ts)
+        return updated
+
+    def observe_many(self, reports: Iterable[Dict]) -> int:
+        """Replay reports (e.g. the last days from BigQuery, oldest first) to warm the baselines"""
+        return sum(1 for report in reports if self.observe(report))
+
+    def _prune(self, now: float):
+        self._last_prune = now
+        for key in [k for k, s in self._series.items()
+                    if now - s.bucket * RESOLUTIONS[k[0]][0] > self.retention_seconds]:
+            del self._series[key]
+        live_cells = {cell for _, cell, _ in self._series}
+        for cell in [cell for cell in self._labels if cell not in live_cells]:
+            del self._labels[cell]
+
+    def _score(self, resolution: str, series: _CellSeries, now_bucket: int) -> Optional[Dict]:
+        """Score the most anomalous of the current and just-closed bucket (None if neither is recent)"""
+        _, _, min_history = RESOLUTIONS[resolution]
+        windows = []
+        if series.bucket in (now_bucket, now_bucket - 1):
+            windows.append((series.bucket, series.count, series.mean, series.var))
+        if series.closed and series.closed[0] == now_bucket - 1 and series.bucket == now_bucket:
+            windows.append(series.closed)
+        best = None
+        for bucket, count, mean, var in windows:
+            expected = max(mean, MIN_RATE)
+            z = (count - expected) / math.sqrt(max(var, expected))
+            if best is None or z > best['z_score']:
+                best = {
+                    'bucket_start': datetime.fromtimestamp(bucket * RESOLUTIONS[resolution][0], timezone.utc).isoformat(),
+                    'count': count,
+                    'expected': round(mean, 3),
+                    'z_score': round(z, 2),
+                    'p_value': poisson_tail(count, expected),
+                    'history_buckets': bucket - series.first_bucket,
+                    'in_progress': bucket == now_bucket,
+                }
+        if best is not None:
+            best['is_hotspot'] = (best['count'] >= self.min_count and best['z_score'] >= self.z_threshold
+                                  and best['history_buckets'] >= min_history)
+        return best
+
+    def hotspots(self, state: Optional[Iterable[str]] = None, county: Optional[str] = None,
+                 report_type: Optional[str] = None, resolution: Optional[str] = None,
+                 include_all: bool = False, limit: int = 20, now: Optional[float] = None) -> List[Dict]:
+        """
+        Recent buckets scored against their baselines, most anomalous first.
+
+        Args:
+            state: State name(s) as reported (alternatives, e.g. ["CA", "California"])
+            county: County name ("Alameda" or "Alameda County")
+            report_type: health/environmental/weather/emergency; default all types combined
+            resolution: 'hour' or 'day'; default both
+            include_all: Also return recent cells that are not flagged
+        """
+        now = now if now is not None else time.time()
+        states = {normalize_state(s) for s in ([state] if isinstance(state, str) else state or []) if s}
+        county_key = normalize_place(county)
+        rtype = normalize_place(report_type) or '*'
+        results = []
+        with self._lock:
+            for (res, cell, key_type), series in self._series.items():
+                if key_type != rtype or (resolution and res != resolution):
+                    continue
+                labels = self._labels.get(cell, {})
+                if states and normalize_state(labels.get('state')) not in states:
+                    continue
+                if county_key and normalize_place(labels.get('county')) != county_key:
+                    continue
+                score = self._score(res, series, int(now // RESOLUTIONS[res][0]))
+                if score and (include_all or score['is_hotspot']):
+                    results.append(dict(score, resolution=res, cell=cell, report_type=key_type, **labels))
+        results.sort(key=lambda r: (r['is_hotspot'], r['z_score']), reverse=True)
+        return results[:limit]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'observed': self.observed,
+                'duplicates': self.duplicates,
+                'late': self.late,
+                'unlocated': self.unlocated,
+                'series': len(self._series),
+                'cells': len(self._labels),
+                'z_threshold': self.z_threshold,
+                'min_count': self.min_count,
+            }
@@ -0,0 +1,170 @@
+"""
+Tests for the worker's batching stages (no GCP access needed)
+
+Usage (from workers/, with requirements.txt installed):
+    python -m unittest test_worker_stages
+"""
+import threading
+import time
+import unittest
+
+import bigquery_worker as worker
+
+
+class FakeBigQuery:
+    def __init__(self):
+        self.calls = []
+
+    def insert_rows_json(self, table_ref, rows, row_ids=None):
+        self.calls.append((table_ref, list(rows), row_ids))
+        return []
+
+
+class FakeMessage:
+    def __init__(self):
+        self.outcome = None
+        self.done = threading.Event()
+
+    def ack(self):
+        self.outcome = 'ack'
+        self.done.set()
+
+    def nack(self):
+        self.outcome = 'nack'
+        self.done.set()
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, count):
+        self._count = count
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"embeddings": [{"values": [0.1, 0.2]} for _ in range(self._count)]}
+
+
+class FakeSession:
+    def post(self, url, headers=None, data=None, timeout=None):
+        import json
+        return FakeResponse(len(json.loads(data)["requests"]))
+
+
+class InsertStageTest(unittest.TestCase):
+    def test_single_message_is_acked_within_max_wait(self):
+        client = FakeBigQuery()
+        stage = worker.InsertStage(client, 'p.d.t', batch_size=100, max_wait=0.2)
+        try:
+            time.sleep(0.1)  # stage idle before the first message
+            message = FakeMessage()
+            started_at = time.time()
+            stage.submit(message, {'report_id': 'r1', 'description': 'smoke'})
+            self.assertTrue(message.done.wait(1.0))
+            self.assertEqual(message.outcome, 'ack')
+            self.assertLess(time.time() - started_at, 0.2 + 0.15)
+            self.assertEqual(client.calls[0][2], ['r1'])
+        finally:
+            stage.stop()
+
+    def test_trickle_after_idle_is_flushed(self):
+        stage = worker.InsertStage(FakeBigQuery(), 'p.d.t', batch_size=100, max_wait=0.1)
+        try:
+            for report_id in ('r1', 'r2'):
+                message = FakeMessage()
+                stage.submit(message, {'report_id': report_id})
+                self.assertTrue(message.done.wait(0.5))
+                time.sleep(0.2)
+        finally:
+            stage.stop()
+
+    def test_invalid_row_only_nacks_itself(self):
+        class RejectingBigQuery(FakeBigQuery):
+            def insert_rows_json(self, table_ref, rows, row_ids=None):
+                super().insert_rows_json(table_ref, rows, row_ids)
+                bad = [i for i, row in enumerate(rows) if row.get('bad')]
+                if not bad:
+                    return []
+                return [{"index": i, "errors": [{"reason": "invalid" if i in bad else "stopped"}]}
+                        for i in range(len(rows))]
+
+        stage = worker.InsertStage(RejectingBigQuery(), 'p.d.t', batch_size=3, max_wait=5)
+        messages = [FakeMessage() for _ in range(3)]
+        for i, message in enumerate(messages):
+            stage.submit(message, {'report_id': f'r{i}', 'bad': i == 1})
+        for message in messages:
+            self.assertTrue(message.done.wait(1.0))
+        stage.stop()
+        self.assertEqual([m.outcome for m in messages], ['ack', 'nack', 'ack'])
+
+    def test_stop_flushes_buffered_messages(self):
+        stage = worker.InsertStage(FakeBigQuery(), 'p.d.t', batch_size=100, max_wait=60)
+        message = FakeMessage()
+        stage.submit(message, {'report_id': 'r1'})
+        stage.stop()
+        self.assertEqual(message.outcome, 'ack')
+        late = FakeMessage()
+        stage.submit(late, {'report_id': 'r2'})
+        self.assertEqual(late.outcome, 'nack')
+
+
+class EmbeddingStageTest(unittest.TestCase):
+    def test_single_report_is_embedded_within_max_wait(self):
+        client = FakeBigQuery()
+        worker.bigquery_client = client
+        stage = worker.EmbeddingStage('key', 'p.d.e', 'p.d.q8', batch_size=50, max_wait=0.2)
+        stage.session = FakeSession()
+        try:
+            time.sleep(0.1)
+            stage.submit({'report_id': 'r1', 'description': 'smoke near school'})
+            deadline = time.time() + 1.0
+            while stage.embedded == 0 and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(stage.embedded, 1)
+            self.assertEqual(client.calls[0][2], ['r1'])
+            deadline = time.time() + 1.0
+            while len(client.calls) < 2 and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(client.calls[1][0], 'p.d.q8')
+            self.assertEqual(client.calls[1][2], ['r1'])
+        finally:
+            stage.stop()
+
+    def test_quantize_q8_matches_the_bigquery_encoding(self):
+        import base64
+        codes, scale = worker.quantize_q8([0.5, -0.25, 0.0, -0.5])
+        self.assertAlmostEqual(scale, 0.5 / 127)
+        # ROUND(x / scale) + 128, halves rounded away from zero
+        self.assertEqual(list(base64.b64decode(codes)), [255, 64, 128, 1])
+        self.assertEqual(list(base64.b64decode(worker.quantize_q8([0.0, 0.0])[0])), [128, 128])
+
+
+class HotspotPollTest(unittest.TestCase):
+    def test_poll_counts_new_rows_once_and_advances(self):
+        from datetime import datetime, timedelta, timezone
+        from types import SimpleNamespace
+        now = datetime.now(timezone.utc)
+        row = {'report_id': 'r1', 'timestamp': now, 'state': 'CA', 'county': 'Alameda', 'city': None,
+               'report_type': 'health', 'latitude': None, 'longitude': None, 'ingested_at': now}
+
+        class Row(dict):
+            def __getattr__(self, name):
+                return self[name]
+
+        class PollingBigQuery:
+            def query(self, sql, job_config=None):
+                return SimpleNamespace(result=lambda: [Row(row)])
+
+        worker.bigquery_client = PollingBigQuery()
+        detector = worker.HotspotDetector()
+        since = now - timedelta(minutes=1)
+        since = worker.poll_hotspot_reports(detector, since)
+        self.assertEqual(since, now)
+        self.assertEqual(worker.poll_hotspot_reports(detector, since), now)  # overlap re-reads r1
+        self.assertEqual(detector.stats()['observed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()